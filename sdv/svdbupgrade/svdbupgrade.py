@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This script contains test for the 'file' table encoding done when upgrading an existing database (see sddbobj.upgrade_file_table()).
+
+Note
+    This test doesn't need a running Synda (it only uses 'synda' folder modules)
+"""
+
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+
+sys.path.append("../../synda")
+
+import sddbobj
+
+def run():
+    test_value_shared_by_two_columns()
+    test_rollback_on_error()
+
+    print 'Test complete successfully !'
+
+def test_value_shared_by_two_columns():
+    conn=create_old_database()
+
+    # project and model share the same value, url and local_path prefixes are both ''
+    add_old_file(conn,1,url='a.nc',local_path='b.nc',project='E3SM',model='E3SM',variable='E3SM')
+    add_old_file(conn,2,url='http://dn/c.nc',local_path='E3SM/c.nc',project='E3SM',model='E3SM',variable='tas',status='done')
+
+    assert sddbobj.upgrade_file_table(conn)
+
+    assert sddbobj.is_view('file',conn)
+    assert conn.execute("select count(1) from dictionary where value='E3SM'").fetchone()[0]==1
+    assert conn.execute("select count(1) from dictionary where value=''").fetchone()[0]==1
+
+    rows=conn.execute("select file_id,url,local_path,project,model,variable from file order by file_id").fetchall()
+    assert rows==[(1,'a.nc','b.nc','E3SM','E3SM','E3SM'),(2,'http://dn/c.nc','E3SM/c.nc','E3SM','E3SM','tas')]
+
+    assert conn.execute("select dataset_id,total,done from dataset_counter").fetchall()==[(1,2,1)]
+
+    # database can be used as usual after the upgrade
+    sddbobj.create_tables(conn)
+    sddbobj.create_indexes(conn)
+    sddbobj.create_triggers(conn)
+
+    close_database(conn)
+
+def test_rollback_on_error():
+    conn=create_old_database()
+
+    add_old_file(conn,1,url='http://dn/a.nc',local_path='E3SM/a.nc',project='E3SM',model='E3SM',variable='tas')
+
+    populate_counters=sddbobj.populate_counters
+    def failing_populate_counters(conn,commit=True):
+        raise Exception('simulated error')
+    sddbobj.populate_counters=failing_populate_counters
+    try:
+        try:
+            sddbobj.upgrade_file_table(conn)
+            assert False # exception expected
+        except Exception,e:
+            assert str(e)=='simulated error'
+    finally:
+        sddbobj.populate_counters=populate_counters
+
+    # old 'file' table is left unchanged
+    assert sddbobj.is_table('file',conn)
+    assert not sddbobj.is_table('file_data',conn)
+    assert conn.execute("select file_id,url from file").fetchall()==[(1,'http://dn/a.nc')]
+
+    # next upgrade succeeds
+    assert sddbobj.upgrade_file_table(conn)
+    assert conn.execute("select file_id,url from file").fetchall()==[(1,'http://dn/a.nc')]
+
+    close_database(conn)
+
+def create_old_database():
+    """Create a database with the 'file' table layout used before 'file_data' table."""
+    global tmpdir
+
+    tmpdir=tempfile.mkdtemp()
+    conn=sqlite3.connect(os.path.join(tmpdir,'sdt.db'))
+
+    conn.execute("create table file (file_id INTEGER PRIMARY KEY, url TEXT, file_functional_id TEXT, filename TEXT, local_path TEXT, data_node TEXT, checksum TEXT, checksum_type TEXT, duration INT, size INT, rate INT, start_date TEXT, end_date TEXT, crea_date TEXT, status TEXT, error_msg TEXT, sdget_status TEXT, sdget_error_msg TEXT, priority INT, tracking_id TEXT, model TEXT, project TEXT, variable TEXT, last_access_date TEXT, dataset_id INT, insertion_group_id INT, timestamp TEXT)")
+    conn.execute("create unique index idx_file_4 on file (file_functional_id)")
+    conn.execute("create        index idx_file_5 on file (dataset_id)")
+    conn.execute("create unique index idx_file_12 on file (local_path)")
+    conn.commit()
+
+    return conn
+
+def add_old_file(conn,file_id,url,local_path,project,model,variable,status='waiting'):
+    conn.execute("insert into file (file_id,url,file_functional_id,filename,local_path,data_node,status,model,project,variable,dataset_id) values (?,?,?,?,?,?,?,?,?,?,?)",(file_id,url,'f%d'%file_id,os.path.basename(local_path),local_path,'dn',status,model,project,variable,1))
+    conn.commit()
+
+def close_database(conn):
+    conn.close()
+    shutil.rmtree(tmpdir)
+
+# init.
+
+tmpdir=None
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This script contains test for the search-API HTTP client (see sdnetutils), using a local HTTP stub.
+
+Requirement
+    Synda must be configured (the 'index' section of sdt.conf is used)
+"""
+
+import sys
+import json
+
+sys.path.append("..")
+sys.path.append("../../synda")
+
+from testlib.svhttpstub import HTTPStub, get_unused_port
+import requests
+import sdnetutils
+import sdexception
+
+BODY=json.dumps({'response':{'numFound':0,'docs':[]}})
+
+def run():
+    test_gzip()
+    test_connection_reuse()
+    test_client_error()
+    test_server_error()
+    test_connection_refused()
+
+    print 'Test complete successfully !'
+
+def test_gzip():
+    stub=HTTPStub(body=BODY)
+
+    assert sdnetutils.HTTP_GET(stub.get_url('/gzip'))==BODY
+    assert ''.join(sdnetutils.HTTP_GET_stream(stub.get_url('/gzip_stream'),read_size=10))==BODY
+
+    for r in stub.requests:
+        assert 'gzip' in r.headers['accept-encoding']
+
+    stub.stop()
+
+def test_connection_reuse():
+    stub=HTTPStub(body=BODY)
+
+    for i in range(3):
+        sdnetutils.HTTP_GET(stub.get_url('/reuse'))
+    for buf in sdnetutils.HTTP_GET_stream(stub.get_url('/reuse_stream')):
+        pass
+
+    assert len(stub.requests)==4
+    assert len(set(r.client_port for r in stub.requests))==1 # all requests use the same connection
+
+    stub.stop()
+
+def test_client_error():
+    stub=HTTPStub(status=404,body='not found')
+
+    e=get_exception(stub.get_url('/4xx'))
+    assert type(e) is sdexception.SDException # not retried later
+    assert len(stub.requests)==1
+
+    stub.stop()
+
+def test_server_error():
+    stub=HTTPStub(status=503,body='unavailable')
+
+    e=get_exception(stub.get_url('/5xx'))
+    assert isinstance(e,sdexception.ServerErrorException)
+    assert len(stub.requests)==1 # 5xx are not retried by the HTTP client (they are retried by the caller, see sdproxy_mt)
+
+    stub.stop()
+
+def test_connection_refused():
+    port=get_unused_port()
+
+    # count connection attempts
+    connection=requests.packages.urllib3.util.connection
+    create_connection=connection.create_connection
+    attempts=[]
+    def counting_create_connection(address,*args,**kw):
+        if address[1]==port:
+            attempts.append(address)
+        return create_connection(address,*args,**kw)
+
+    connection.create_connection=counting_create_connection
+    try:
+        e=get_exception('http://127.0.0.1:%i/refused'%port)
+    finally:
+        connection.create_connection=create_connection
+
+    assert isinstance(e,sdexception.ConnectionErrorException)
+    assert len(attempts)==sdnetutils.http_retry+1 # first attempt + retries
+
+def get_exception(url):
+    try:
+        sdnetutils.HTTP_GET(url)
+    except sdexception.SDException,e:
+        return e
+
+    assert False # exception expected
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This script contains a local HTTP stub (used to test Synda HTTP client without network access)."""
+
+import gzip
+import socket
+import StringIO
+import threading
+import BaseHTTPServer
+import SocketServer
+
+class Request(object):
+    def __init__(self,path,headers,client_port):
+        self.path=path
+        self.headers=headers
+        self.client_port=client_port # same value for two requests means the connection has been reused
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version='HTTP/1.1' # keep-alive
+
+    def do_GET(self):
+        stub=self.server.stub
+
+        stub.requests.append(Request(self.path,dict(self.headers.items()),self.client_address[1]))
+
+        body=stub.body
+        gzipped='gzip' in self.headers.get('Accept-Encoding','')
+        if gzipped:
+            body=compress(body)
+
+        self.send_response(stub.status)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding','gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,*args):
+        pass # no output on stderr
+
+class Server(SocketServer.ThreadingMixIn,BaseHTTPServer.HTTPServer):
+    daemon_threads=True
+
+class HTTPStub(object):
+    """HTTP server running on localhost, in a background thread.
+
+    Attributes
+        status: HTTP status returned for each request
+        body: body returned for each request (gzip compressed if the client accepts it)
+        requests: received requests (Request objects)
+    """
+
+    def __init__(self,status=200,body=''):
+        self.status=status
+        self.body=body
+        self.requests=[]
+
+        self.server=Server(('127.0.0.1',0),Handler)
+        self.server.stub=self
+
+        self.thread=threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def get_url(self,path='/'):
+        return 'http://127.0.0.1:%i%s'%(self.server.server_port,path)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def compress(buf):
+    f=StringIO.StringIO()
+    g=gzip.GzipFile(fileobj=f,mode='wb')
+    g.write(buf)
+    g.close()
+    return f.getvalue()
+
+def get_unused_port():
+    """Return a local port with no server listening (i.e. 'connection refused')."""
+    s=socket.socket()
+    s.bind(('127.0.0.1',0))
+    port=s.getsockname()[1]
+    s.close()
+    return port
@@ -19,9 +19,9 @@ TAG543J53K45JK34
 Notes
     - 'sdadddsattr' means "SynDa ADD DataSet ATTRibutes"
     - this module retrieves datasets attributes in batch mode.
+    - only fields used in 'local_path_drs_template' are retrieved (TAGJ43JK55J8K78 and TAG3JKWW93K4J4JKDZS)
 TODO
     - merge this module with 'sdbatchtimestamp' module to prevent download datasets twice (TBC)
-    - only retrieve fields used in 'local_path_drs_template' (TAGJ43JK55J8K78 and TAG3JKWW93K4J4JKDZS)
 """
 
 import argparse
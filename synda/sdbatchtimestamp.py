@@ -9,15 +9,31 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module retrieves timestamp in batch mode."""
+"""This module retrieves timestamp in batch mode.
+
+Notes
+    - run() sets files dataset timestamp during discovery
+    - fill_missing_dataset_timestamps() sets timestamp of datasets already
+      in the database (datasets ids are grouped in OR-queries, and batches
+      are run concurrently)
+    - batch size is limited by the url length (see sdremotequtils)
+"""
 
 import copy
+import argparse
 import sdapp
 import sdrun
 import sdlog
 import sdconst
+import sddb
+import sddatasetdao
+import sdremotequtils
+import sdtimestamp
 import sdpipelineprocessing
-from sdexception import MissingDatasetTimestampUrlException,MissingTimestampException
+from sdexception import SDException,MissingDatasetTimestampUrlException,MissingTimestampException
+
+BATCH_SIZE=200        # max. datasets count per query
+MAX_URL_LENGTH=3000   # max. url length per query (keep room for index host and pagination parameters)
 
 def run(squeries,metadata,parallel):
     datasets_timestamps=None
@@ -103,3 +119,131 @@ def get_timestamp(instance_id,d):
         raise MissingTimestampException() # just in case (should be always set for 'install' action)
 
     return timestamp
+
+def fill_missing_dataset_timestamps(datasets,commit=True):
+    """Set timestamp of datasets stored in the database.
+
+    Notes
+        - datasets not found in ESGF are left untouched
+        - only the dataset 'timestamp' attribute is used ('_timestamp' is
+          ignored, as in sdtimestamp). If it is missing, one of its files
+          timestamp is used (one query per dataset, see sdtimestamp)
+        - database is updated once per batch, and changes are committed after
+          each batch if 'commit' is True
+
+    Returns
+        number of datasets updated
+    """
+    if len(datasets)==0:
+        return 0
+
+    batches=get_batches([d.dataset_functional_id for d in datasets])
+
+    sdlog.info("SYNDABTI-400","Retrieve timestamp (datasets-count=%d,batches-count=%d)"%(len(datasets),len(batches)))
+
+    queries=[{'url':build_url(batch)} for batch in batches]
+    metadata=sdrun.run(queries,parallel=True)
+
+    # transform to dict for quick random access
+    #
+    # note: a dataset may be returned many times (replicas), the first
+    # timestamp found is kept
+    #
+    found={}
+    timestamps={}
+    for d in metadata.get_files(): # warning: load list in memory
+        instance_id=d['instance_id']
+        found[instance_id]=d
+
+        if instance_id not in timestamps and 'timestamp' in d:
+            timestamps[instance_id]=d['timestamp']
+
+    count=0
+    for batch in batches:
+        li=[]
+
+        for dataset_functional_id in batch:
+            if dataset_functional_id in timestamps:
+                li.append((dataset_functional_id,timestamps[dataset_functional_id]))
+            elif dataset_functional_id in found:
+                timestamp=get_file_timestamp(found[dataset_functional_id])
+                if timestamp is not None:
+                    li.append((dataset_functional_id,timestamp))
+            else:
+                sdlog.info("SYNDABTI-402","Timestamp not set as dataset does not exist in ESGF (or the index used does not list it) (%s)"%dataset_functional_id)
+
+        sddatasetdao.update_timestamps(li,commit=False)
+        if commit:
+            sddb.conn.commit()
+
+        count+=len(li)
+
+    sdlog.info("SYNDABTI-404","Timestamp set for %d dataset(s)"%count)
+
+    return count
+
+def get_file_timestamp(d):
+    """Return the timestamp of one of the dataset's files (None if not found)."""
+    try:
+        sdtimestamp.use_file_timestamp_if_dataset_timestamp_is_missing(d)
+        return d['timestamp']
+    except SDException, e:
+        if e.code in ['SDTIMEST-011','SDTIMEST-008']:
+            sdlog.info("SYNDABTI-406","Timestamp not set for '%s' dataset (%s)"%(d['instance_id'],str(e)))
+            return None
+        else:
+            raise
+
+def get_batches(dataset_functional_ids):
+    """Group datasets ids (each group fits in one query url)."""
+    batches=[]
+    batch=[]
+    url_length=len(build_url([]))
+
+    for dataset_functional_id in dataset_functional_ids:
+        length=len('&instance_id=')+len(dataset_functional_id)
+
+        if len(batch)>0:
+            if len(batch)>=BATCH_SIZE or url_length+length>MAX_URL_LENGTH:
+                batches.append(batch)
+                batch=[]
+                url_length=len(build_url([]))
+
+        batch.append(dataset_functional_id)
+        url_length+=length
+
+    if len(batch)>0:
+        batches.append(batch)
+
+    return batches
+
+def build_url(dataset_functional_ids):
+    """Return timestamp query for the given datasets ('OR' operator is used between instance_id values)."""
+
+    # Note
+    #     We do not filter replica in the query below in case the master host is not up
+    facets={'type':[sdconst.SA_TYPE_DATASET],
+            'instance_id':dataset_functional_ids,
+            'fields':sdconst.TIMESTAMP_FIELDS}
+
+    return sdremotequtils.build_url(facets,None)
+
+# init.
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p','--project',default=None)
+    parser.add_argument('-y','--dry_run',action='store_true')
+    args = parser.parse_args()
+
+    search_constraints={'timestamp':None}
+    if args.project is not None:
+        search_constraints['project']=args.project
+
+    datasets=sddatasetdao.get_datasets(**search_constraints) # retrieve datasets with timestamp not set
+
+    if args.dry_run:
+        for batch in get_batches([d.dataset_functional_id for d in datasets]):
+            print build_url(batch)
+    else:
+        print "%d dataset(s) updated"%fill_missing_dataset_timestamps(datasets)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module benchmarks the queue layer on a large synthetic database.
+
+Usage
+    sdbenchmark.py generate /tmp/bench.db -n 1000000
+    sdbenchmark.py run /tmp/bench.db -o 3.9.json
+    sdbenchmark.py compare 3.8.json 3.9.json
+
+Notes
+    - this runs fully offline (no search-API request, no download)
+    - the real DAO funcs used by the daemon and by 'synda queue' / 'synda
+      watch' are timed
+    - the synthetic database is opened in place of the Synda database
+      ('sdconfig.db_file' is overridden before 'sddb' is imported, this is
+      why DAO modules are imported inside funcs and why 'generate' and 'run'
+      must be executed in a new process)
+    - the same seed always generates the same database, so results from
+      different versions can be compared
+    - 'run' modifies the synthetic database (claimed transfers are set to
+      'done'), so for accurate comparisons, generate a new database before
+      each run
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import sqlite3
+import sdapp
+import sdconfig
+import sdconst
+from sdtools import print_stderr
+from sdexception import SDException
+
+PROJECTS=[('CMIP6',0.6),('CMIP5',0.3),('CORDEX',0.1)]
+DATA_NODES=['esgf-data%i.example.org'%i for i in range(25)]
+MODELS=['model-%02i'%i for i in range(60)]
+VARIABLES=['tas','pr','ua','va','ta','hus','zg','psl','tasmax','tasmin','huss','rlds','rsds','sfcWind','clt','evspsbl','mrro','mrso','snw','tos','sos','uo','vo','thetao','so','zos','siconc','sithick','co2','o3','ps','hfls','hfss','rlut','rsut','rsdt','prc','prsn','ts','cl']
+
+INSERT_CHUNK_SIZE=50000 # files count per transaction (generation)
+RUNNING_TRANSFERS=10
+ENQUEUE_BATCH_SIZE=100 # files count per 'enqueue' iteration
+
+def generate(db_file,files_count,seed=0,verbose=False):
+    """Create a synthetic database.
+
+    Returns
+        (datasets_count,files_count)
+    """
+    if os.path.exists(db_file):
+        raise SDException("SDBENCHM-001","File already exists (%s)"%db_file)
+
+    conn=open_database(db_file)
+
+    import sddbobj
+
+    rng=random.Random(seed)
+
+    sddbobj.drop_counter_triggers(conn) # counters are computed once at the end (much faster)
+    conn.execute("create temp table synthetic_file as select * from file where 0") # same layout as 'file' view (rows are encoded when copied to 'file_data')
+
+    datasets=[]
+    files=[]
+    count=0
+    dataset_id=0
+
+    while count<files_count:
+        dataset_id+=1
+        (d,dataset_files)=build_dataset(rng,dataset_id,files_count-count)
+
+        datasets.append(d)
+        files.extend(dataset_files)
+        count+=len(dataset_files)
+
+        if len(files)>=INSERT_CHUNK_SIZE or count>=files_count:
+            insert_chunk(conn,datasets,files)
+            datasets=[]
+            files=[]
+
+            if verbose:
+                print_stderr("%i/%i file(s) inserted"%(count,files_count))
+
+    # some transfers are running
+    conn.execute("update file_data set status=? where file_id in (select file_id from file_data where status=? limit ?)",(sdconst.TRANSFER_STATUS_RUNNING,sdconst.TRANSFER_STATUS_WAITING,RUNNING_TRANSFERS))
+    conn.commit()
+
+    sddbobj.create_triggers(conn)
+    sddbobj.populate_counters(conn)
+
+    conn.execute("analyze")
+    conn.commit()
+
+    return (dataset_id,count)
+
+def build_dataset(rng,dataset_id,max_files_count):
+    """Return one dataset and its files (as tuples with the same columns order as insert_chunk())."""
+
+    project=weighted_choice(rng,PROJECTS)
+    model=rng.choice(MODELS)
+    data_node=rng.choice(DATA_NODES)
+    version='v%i'%(20100101+dataset_id)
+
+    dataset_path_without_version='%s.output.%s.exp%02i.mon.r%ii1p1'%(project,model,dataset_id%20,dataset_id)
+    dataset_path='%s.%s'%(dataset_path_without_version,version)
+    dataset_local_path=dataset_path.replace('.','/')
+
+    # dataset transfer state (all done, partially done, or not started)
+    r=rng.random()
+    if r<0.6:
+        (dataset_status,done_ratio,error_ratio)=(sdconst.DATASET_STATUS_COMPLETE,1.0,0.0)
+    elif r<0.85:
+        (dataset_status,done_ratio,error_ratio)=(sdconst.DATASET_STATUS_IN_PROGRESS,0.5,0.05)
+    else:
+        (dataset_status,done_ratio,error_ratio)=(sdconst.DATASET_STATUS_EMPTY,0.0,0.0)
+
+    priority=rng.choice([sdconst.DEFAULT_PRIORITY]*9+[sdconst.DEFAULT_PRIORITY*2])
+    insertion_group_id=dataset_id/100+1
+    crea_date='2017-01-01 00:00:00.000000'
+
+    d=(dataset_id,dataset_path,dataset_status,crea_date,dataset_path,dataset_path_without_version,version,dataset_local_path,crea_date,1,crea_date,None,model,project,'',None)
+
+    files=[]
+    for variable in rng.sample(VARIABLES,rng.randint(1,4)):
+        for i in range(rng.randint(1,15)):
+
+            if len(files)>=max_files_count:
+                break
+
+            filename='%s_Amon_%s_exp%02i_r%ii1p1_%04i01-%04i12.nc'%(variable,model,dataset_id%20,dataset_id,1850+i*10,1859+i*10)
+            local_path='%s/%s/%s'%(dataset_local_path,variable,filename)
+            url='http://%s/thredds/fileServer/%s'%(data_node,local_path)
+
+            r=rng.random()
+            if r<done_ratio:
+                status=sdconst.TRANSFER_STATUS_DONE
+            elif r<done_ratio+error_ratio:
+                status=sdconst.TRANSFER_STATUS_ERROR
+            else:
+                status=sdconst.TRANSFER_STATUS_WAITING
+
+            checksum='%032x'%rng.getrandbits(128)
+            tracking_id='hdl:21.14100/%032x'%rng.getrandbits(128)
+            size=rng.randint(1000000,2000000000)
+
+            files.append((url,'%s.%s'%(dataset_path,filename),filename,local_path,data_node,checksum,'md5',size,crea_date,status,priority,tracking_id,model,project,variable,dataset_id,insertion_group_id))
+
+    return (d,files)
+
+def insert_chunk(conn,datasets,files):
+    import sddbobj
+
+    conn.executemany("insert into dataset (dataset_id,dataset_functional_id,status,crea_date,path,path_without_version,version,local_path,last_mod_date,latest,latest_date,last_done_transfer_date,model,project,template,timestamp) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",datasets)
+    conn.executemany("insert into synthetic_file (url,file_functional_id,filename,local_path,data_node,checksum,checksum_type,size,crea_date,status,priority,tracking_id,model,project,variable,dataset_id,insertion_group_id) values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",files)
+
+    sddbobj.insert_file_data('synthetic_file',conn)
+    conn.execute("delete from synthetic_file")
+    conn.commit()
+
+def run(db_file,iterations=50,seed=0):
+    """Time DAO funcs used by the daemon and by the queue related commands.
+
+    Returns
+        benchmark result (dict)
+    """
+    if not os.path.exists(db_file):
+        raise SDException("SDBENCHM-002","File not found (%s)"%db_file)
+
+    conn=open_database(db_file)
+
+    import sdfilequery
+    import sddatasetdao
+
+    rng=random.Random(seed)
+
+    result={'version':sdapp.version,
+            'date':time.strftime('%Y-%m-%d %H:%M:%S'),
+            'sqlite_version':sqlite3.sqlite_version,
+            'iterations':iterations,
+            'database':{'files_count':conn.execute("select count(1) from file_data").fetchone()[0],
+                        'datasets_count':conn.execute("select count(1) from dataset").fetchone()[0],
+                        'size':os.path.getsize(db_file)},
+            'timings':{}}
+
+    dataset_ids=[rs[0] for rs in conn.execute("select dataset_id from dataset")]
+    variables=[(rs[0],rs[1]) for rs in conn.execute("select dataset_id,variable from variable_counter")]
+
+    claimed=[]
+
+    benchmarks=[('claim_waiting_transfer',lambda: claimed.append(claim_waiting_transfer())),
+                ('end_of_transfer',lambda: end_of_transfer(claimed.pop(0),conn)),
+                ('dataset_completion_check',lambda: dataset_completion_check(sddatasetdao.get_dataset(dataset_id=rng.choice(dataset_ids)),rng.choice(variables))),
+                ('queue',lambda: sdfilequery.get_download_status()),
+                ('queue_project',lambda: sdfilequery.get_download_status('CMIP6')),
+                ('watch',lambda: watch()),
+                ('enqueue',lambda: enqueue(rng,conn))]
+
+    for (name,func) in benchmarks:
+        durations=[]
+        for i in range(iterations):
+            start_time=time.time()
+            func()
+            durations.append(time.time()-start_time)
+
+        result['timings'][name]=get_statistics(durations)
+
+    return result
+
+def claim_waiting_transfer():
+    """Same DAO calls as 'sdtask.transfers_begin()'."""
+    import sddao
+    import sdfairshare
+    import sdfilequery
+    import sdfiledao
+    import sdtime
+
+    sdfilequery.transfer_running_count()
+
+    if sdconfig.config.getboolean('download','fairshare'):
+        tr=sdfairshare.get_one_waiting_transfer()
+    else:
+        tr=sddao.get_one_waiting_transfer()
+
+    tr.status=sdconst.TRANSFER_STATUS_RUNNING
+    tr.start_date=sdtime.now()
+    tr.end_date=None
+    tr.error_msg=None
+    sdfiledao.update_file(tr)
+
+    return tr
+
+def end_of_transfer(tr,conn):
+    """Same DAO calls as 'sddmdefault.end_of_transfer()' (batch of one transfer)."""
+    import sdfiledao
+    import sdevent
+    import sdtime
+
+    tr.status=sdconst.TRANSFER_STATUS_DONE
+    tr.end_date=sdtime.now()
+    tr.duration=1
+    tr.rate=tr.size
+    sdfiledao.update_file(tr,commit=False)
+    sdevent.file_complete_event(tr,commit=False)
+    conn.commit()
+
+def dataset_completion_check(d,variable):
+    import sddatasetflag
+    import sdvariable
+
+    sddatasetflag.compute_dataset_status(d)
+    sdvariable.is_variable_complete(*variable)
+
+def watch():
+    """Same DAO call as 'synda watch'."""
+    import sdfiledao
+
+    return sdfiledao.get_files(status=sdconst.TRANSFER_STATUS_RUNNING)
+
+def enqueue(rng,conn):
+    """Add one batch of new files in a new dataset (rollbacked afterwards).
+
+    Note
+        same DAO calls as 'sdenqueue.add_file()' ('sdenqueue' is not used
+        directly, as it imports search-API modules, which need network
+        access to initialize)
+    """
+    import sdfiledao
+    import sddatasetdao
+    import sdtime
+    from sdtypes import Dataset,File
+
+    path='BENCHMARK.output.model.exp.mon.r%ii1p1.v1'%rng.randint(0,1000000)
+    local_path=path.replace('.','/')
+
+    dataset_id=None
+    for i in range(ENQUEUE_BATCH_SIZE):
+        filename='tas_%04i.nc'%i
+
+        f=File(url='http://%s/thredds/fileServer/%s/%s'%(DATA_NODES[0],local_path,filename),file_functional_id='%s.%s'%(path,filename),
+               filename=filename,local_path='%s/%s'%(local_path,filename),data_node=DATA_NODES[0],checksum='%032x'%rng.getrandbits(128),
+               checksum_type='md5',size=1000000,priority=sdconst.DEFAULT_PRIORITY,tracking_id=None,model='model',project='BENCHMARK',
+               variable='tas',insertion_group_id=None,timestamp=None)
+
+        d=sddatasetdao.get_dataset(dataset_functional_id=path)
+        if d is None:
+            d=Dataset(local_path=local_path,path=path,path_without_version=path.rsplit('.',1)[0],dataset_functional_id=path,template='',
+                      version='v1',project=f.project,status=sdconst.DATASET_STATUS_EMPTY,latest=False,crea_date=sdtime.now(),
+                      last_mod_date=sdtime.now(),timestamp=None,model=f.model)
+            dataset_id=sddatasetdao.add_dataset(d,commit=False)
+        else:
+            d.last_mod_date=sdtime.now()
+            sddatasetdao.update_dataset(d,commit=False)
+
+        f.dataset_id=dataset_id
+        f.status=sdconst.TRANSFER_STATUS_WAITING
+        f.crea_date=sdtime.now()
+        sdfiledao.add_file(f,commit=False)
+
+    conn.rollback()
+
+def compare(old,new):
+    """Print timings ratio between two benchmark results."""
+    print "%-28s %12s %12s %8s"%('benchmark','old (ms)','new (ms)','ratio')
+    for name in sorted(new['timings']):
+        new_median=new['timings'][name]['median']
+        if name in old['timings']:
+            old_median=old['timings'][name]['median']
+            ratio='%.2f'%(new_median/old_median) if old_median>0 else '-'
+            print "%-28s %12.3f %12.3f %8s"%(name,old_median,new_median,ratio)
+        else:
+            print "%-28s %12s %12.3f %8s"%(name,'-',new_median,'-')
+
+def get_statistics(durations):
+    """Return min/median/mean/max in milliseconds."""
+    li=sorted(durations)
+    return {'min':li[0]*1000,
+            'median':li[len(li)/2]*1000,
+            'mean':sum(li)/len(li)*1000,
+            'max':li[-1]*1000}
+
+def weighted_choice(rng,choices):
+    r=rng.random()
+    for (value,weight) in choices:
+        if r<weight:
+            return value
+        r-=weight
+    return choices[-1][0]
+
+def open_database(db_file):
+    """Open the synthetic database in place of the Synda database."""
+    if 'sddb' in sys.modules:
+        raise SDException("SDBENCHM-003","Synda database is already opened (benchmark must be run in a new process)")
+
+    sdconfig.db_file=os.path.abspath(db_file)
+
+    import sddb # do not move at the top (connection is opened on import)
+
+    return sddb.conn
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='action')
+
+    subparser=subparsers.add_parser('generate',help='Create a synthetic database')
+    subparser.add_argument('db_file')
+    subparser.add_argument('-n','--files_count',type=int,default=1000000)
+    subparser.add_argument('-s','--seed',type=int,default=0)
+
+    subparser=subparsers.add_parser('run',help='Run benchmark on a synthetic database')
+    subparser.add_argument('db_file')
+    subparser.add_argument('-i','--iterations',type=int,default=50)
+    subparser.add_argument('-o','--output',help='JSON result file (default: stdout)')
+    subparser.add_argument('-s','--seed',type=int,default=0)
+
+    subparser=subparsers.add_parser('compare',help='Compare two benchmark results')
+    subparser.add_argument('old')
+    subparser.add_argument('new')
+
+    args = parser.parse_args()
+
+    if args.action=='generate':
+        (datasets_count,files_count)=generate(args.db_file,args.files_count,args.seed,verbose=True)
+        print_stderr("%i dataset(s) and %i file(s) created"%(datasets_count,files_count))
+    elif args.action=='run':
+        result=run(args.db_file,args.iterations,args.seed)
+        buf=json.dumps(result,indent=4,sort_keys=True)
+        if args.output is None:
+            print buf
+        else:
+            with open(args.output,'w') as fh:
+                fh.write(buf+'\n')
+    elif args.action=='compare':
+        with open(args.old) as fh:
+            old=json.load(fh)
+        with open(args.new) as fh:
+            new=json.load(fh)
+        compare(old,new)
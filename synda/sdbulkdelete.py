@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module removes files marked for deletion (data and metadata) in bulk.
+
+Files are processed in chunks: for each chunk, local files are removed in
+parallel, then metadata of removed files are deleted in one transaction.
+Empty files and directories are removed at the end, in one pass.
+
+Notes
+    - as the database is only locked during each chunk transaction, the
+      daemon is not blocked during the whole deletion
+    - this is safe to interrupt: files marked for deletion stay marked until
+      they are removed, so the next run resumes where the previous one
+      stopped
+    - if a local file cannot be removed, its metadata is kept (so data and
+      metadata stay synced)
+    - if a local file is missing, its metadata is removed. As files are all in
+      'delete' status here (the previous status is overwritten when the file is
+      marked for deletion), a 'done' file with missing data cannot be told
+      apart from a 'waiting' or 'error' file, so missing data are only logged
+"""
+
+import os
+import itertools
+import argparse
+from multiprocessing.pool import ThreadPool
+import sdapp
+import sdconst
+import sdlog
+import sddb
+import sdfiledao
+import sdfilequery
+import sddeletequery
+import sdcleanup
+from sdtools import print_stderr
+from sdexception import SDException
+
+CHUNK_SIZE=1000   # files count per transaction
+UNLINK_WORKERS=4  # parallel unlink
+
+UNLINK_REMOVED=0
+UNLINK_NOT_FOUND=1
+UNLINK_ERROR=2
+
+def run(remove_all=True,limit=None,verbose=False):
+    """Remove files marked for deletion.
+
+    Args
+        remove_all: if False, only metadata are removed
+        limit: maximum number of files to process (all files if None)
+        verbose: if True, print progress on stderr
+
+    Returns
+        Number of removed files.
+    """
+    total=sdfilequery.transfer_status_count(status=sdconst.TRANSFER_STATUS_DELETE)
+    if limit is not None:
+        total=min(total,limit)
+
+    if total==0:
+        return 0
+
+    sdlog.info("SDBULKDE-001","Delete files (count=%i,remove_all=%s)"%(total,remove_all))
+
+    count=0
+    errors=0
+    dirs=set() # folders which may be empty after deletion
+
+    pool=ThreadPool(UNLINK_WORKERS) if remove_all else None
+
+    try:
+        files=sdfiledao.get_files_pagination(status=sdconst.TRANSFER_STATUS_DELETE) # keyset pagination (rows can be deleted while looping)
+        if limit is not None:
+            files=itertools.islice(files,limit)
+
+        while True:
+            chunk=list(itertools.islice(files,CHUNK_SIZE))
+            if len(chunk)==0:
+                break
+
+            if remove_all:
+                results=pool.map(unlink,[f.get_full_local_path() for f in chunk])
+            else:
+                results=[UNLINK_REMOVED]*len(chunk)
+
+            file_ids=[]
+            for f,result in zip(chunk,results):
+                if result==UNLINK_ERROR:
+                    errors+=1 # note: metadata is kept
+                else:
+                    file_ids.append(f.file_id)
+
+                    if remove_all:
+                        dirs.add(os.path.dirname(f.get_full_local_path()))
+
+            sddeletequery.delete_files(file_ids)
+            sddb.conn.commit() # one transaction per chunk
+
+            count+=len(file_ids)
+
+            sdlog.info("SDBULKDE-002","Delete progress: %i/%i"%(count+errors,total))
+            if verbose:
+                print_stderr("%i/%i file(s) processed"%(count+errors,total))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+        # cleanup is also done when interrupted (only for folders from files already removed)
+        if len(dirs)>0:
+            sdcleanup.part_cleanup(dirs)
+
+    sdlog.info("SDBULKDE-003","%i file(s) removed"%count)
+
+    if errors>0:
+        raise SDException("SDBULKDE-004","%i file(s) cannot be removed (see log file for details)"%errors)
+
+    return count
+
+def unlink(path):
+    """
+    Note
+        this func runs in a worker thread, so it must not access the database
+    """
+    try:
+        os.remove(path)
+        sdlog.debug("SDBULKDE-005","File removed (%s)"%path)
+        return UNLINK_REMOVED
+    except OSError as e:
+        if not os.path.lexists(path):
+            sdlog.debug("SDBULKDE-123","File not found (%s)"%path) # normal case for files which were in 'waiting' or 'error' status (no data)
+            return UNLINK_NOT_FOUND
+
+        sdlog.error("SDBULKDE-528","Error occurs during file suppression (%s,%s)"%(path,str(e)))
+        return UNLINK_ERROR
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-l','--limit',type=int,default=None)
+    parser.add_argument('-m','--metadata_only',action='store_true',help='Keep local files (only remove metadata)')
+    args = parser.parse_args()
+
+    count=run(remove_all=(not args.metadata_only),limit=args.limit,verbose=True)
+
+    print_stderr("%i file(s) removed"%count)
@@ -30,7 +30,7 @@ def run(host=None,reload=False,project=None):
 
     # default
     if host is None:
-        host=sdindex.get_default_index()
+        host=sdindex.get_best_index()
 
     if reload:
         sdsqlutils.truncate_table('param')
@@ -41,6 +41,7 @@ def create_configuration_file_sample(path):
     config.add_section('module')
     config.set('module', 'download', 'true')
     config.set('module', 'post_processing', 'false')
+    config.set('module', 'queue_service', 'false')
     config.set('module', 'globustransfer', 'false')
 
     config.add_section('log')
@@ -69,10 +70,20 @@ def create_configuration_file_sample(path):
     config.set('behaviour', 'nearest_mode', 'geolocation')
     config.set('behaviour', 'lfae_mode', 'abort')
     config.set('behaviour', 'incorrect_checksum_action', 'remove')
+    config.set('behaviour', 'full_discovery_interval', '7')
 
     config.add_section('index')
     config.set('index', 'indexes', 'esgf-data.dkrz.de')
     config.set('index', 'default_index', 'esgf-data.dkrz.de')
+    config.set('index', 'max_parallel_call', '4')
+    config.set('index', 'connect_timeout', '30')
+    config.set('index', 'http_retry', '3')
+    config.set('index', 'search_cache', 'false')
+    config.set('index', 'search_cache_ttl', '604800')
+    config.set('index', 'fanout', 'false')
+    config.set('index', 'fanout_timeout', '300')
+    config.set('index', 'health_routing', 'true')
+    config.set('index', 'health_probe_interval', '300')
 
     config.add_section('locale')
     config.set('locale', 'country', '')
@@ -82,14 +93,26 @@ def create_configuration_file_sample(path):
     config.set('download', 'hpss', '1')
     config.set('download', 'http_fallback', 'false')
     config.set('download', 'gridftp_opt', '')
+    config.set('download', 'dedup_mode', 'none')
+    config.set('download', 'fairshare', 'false')
+    config.set('download', 'fairshare_project_weights', '')
+    config.set('download', 'fairshare_selection_weights', '')
+    config.set('download', 'locality_ordering', 'false')
+    config.set('download', 'max_active_directories', '8')
 
     config.add_section('post_processing')
     config.set('post_processing', 'host', 'localhost')
     config.set('post_processing', 'port', '18290')
 
+    config.add_section('queue_service')
+    config.set('queue_service', 'host', 'localhost')
+    config.set('queue_service', 'port', '18291')
+    config.set('queue_service', 'lease_duration', '300')
+
     config.add_section('globustransfer')
     config.set('globustransfer', 'esgf_endpoints', '/esg/config/esgf_endpoints.xml')
     config.set('globustransfer', 'destination_endpoint', 'destination#endpoint')
+    config.set('globustransfer', 'max_running_files', '1000')
 
     with open(path, 'w') as fh:
         config.write(fh)
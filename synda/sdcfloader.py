@@ -39,6 +39,7 @@ default_options={'max_parallel_download':'8',
                  'hpss':'0',
                  'download':'true',
                  'post_processing':'false',
+                 'queue_service':'false',
                  'globustransfer':'false',
                  'data_path':'',
                  'sandbox_path':'',
@@ -54,17 +55,35 @@ default_options={'max_parallel_download':'8',
                  'default_listing_size':'small',
                  'http_fallback':'false',
                  'gridftp_opt':'',
+                 'dedup_mode':'none',
+                 'fairshare':'false',
+                 'fairshare_project_weights':'',
+                 'fairshare_selection_weights':'',
+                 'locality_ordering':'false',
+                 'max_active_directories':'8',
+                 'lease_duration':'300',
+                 'max_running_files':'1000',
                  'check_parameter':'1',
                  'verbosity_level':'info',
                  'scheduler_profiling':'0',
                  'lfae_mode':'abort',
                  'indexes':'esgf-node.ipsl.fr,esgf-data.dkrz.de,esgf-index1.ceda.ac.uk',
                  'default_index':'esgf-node.ipsl.fr',
+                 'max_parallel_call':'4',
+                 'connect_timeout':'30',
+                 'http_retry':'3',
+                 'search_cache':'false',
+                 'search_cache_ttl':'604800',
+                 'fanout':'false',
+                 'fanout_timeout':'300',
+                 'health_routing':'true',
+                 'health_probe_interval':'300',
                  'nearest':'false',
                  'nearest_mode':'geolocation',
                  'openid':'https://esgf-node.ipsl.fr/esgf-idp/openid/foo',
                  'password':'foobar',
-                 'incorrect_checksum_action':'remove'}
+                 'incorrect_checksum_action':'remove',
+                 'full_discovery_interval':'7'}
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
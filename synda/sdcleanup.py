@@ -12,6 +12,7 @@
 """Contains cleanup routines."""
 
 import os
+import heapq
 import argparse
 import sdapp
 import sdconfig
@@ -27,18 +28,18 @@ def ignore(f):
         return True
 
 def remove_empty_files(path):
-    for p in sdtools.walk_backward_without_sibling(path):
-        for name in os.listdir(p):
-            f = '%s/%s' % (p,name)
-            if not ignore(f): # this is not to remove files at top of the tree, not related with synda (e.g. every hidden file in HOME dir)
-                if os.path.isfile(f):
-                    if not os.path.islink(f):
-                        if os.path.getsize(f)==0:
-                            try:
-                                sdlog.info("SYNCLEAN-090","Remove empty file (%s)"%(f,))
-                                os.remove(f)
-                            except Exception as e:
-                                sdlog.warning("SYNCLEAN-040","Error occurs during file deletion (%s,%s)"%(f,str(e)))
+    """Remove empty netcdf files in folder (not recursive)."""
+    for name in os.listdir(path):
+        f='%s/%s'%(path,name)
+        if not ignore(f):
+            if os.path.isfile(f):
+                if not os.path.islink(f):
+                    if os.path.getsize(f)==0:
+                        try:
+                            sdlog.info("SYNCLEAN-090","Remove empty file (%s)"%(f,))
+                            os.remove(f)
+                        except Exception as e:
+                            sdlog.warning("SYNCLEAN-040","Error occurs during file deletion (%s,%s)"%(f,str(e)))
 
 def full_cleanup():
     """Remove empty files and folders."""
@@ -55,31 +56,54 @@ def full_cleanup():
     sdlog.info("SYNCLEAN-010","Cleanup done.")
 
 def part_cleanup(paths):
-    """Remove empty files and folders."""
+    """Remove empty files and folders (and parent folders which become empty) in one pass.
+
+    Returns
+        Number of removed folders.
+
+    Notes
+        - folders are processed deepest first, so each folder is checked only once
+        - folders outside the data folder are never removed
+        - paths are not resolved, so symlinked subtrees inside the data folder
+          are also cleaned (the symlink itself is kept)
+    """
+    top=os.path.normpath(sdconfig.data_folder)
+    count=0
+
+    heap=[]
+    for p in set(os.path.normpath(p) for p in paths):
+        heapq.heappush(heap,(-p.count('/'),p))
 
-    sdlog.info("SYNCLEAN-018","Cleanup begin")
+    done=set()
+    while len(heap)>0:
+        (depth,p)=heapq.heappop(heap)
 
-    paths=sorted(paths, reverse=True) # maybe overkill (idea is that reverse order may allow the suppression of empty sibling, but as all paths to be removed will go through a os.removedirs call it should work anyway)
+        if p in done:
+            continue
+        done.add(p)
 
-    for p in paths:
-        sdlog.info("SYNCLEAN-060","Check for empty file and directory in %s"%p)
+        if not p.startswith(top+'/'):
+            continue
+
+        if os.path.islink(p) or not os.path.isdir(p):
+            continue
 
-        # remove empty files
-        sdlog.debug("SYNCLEAN-120","Remove empty files (%s)"%(p,))
         remove_empty_files(p)
 
-        # remove empty directories starting from leaves
-        sdlog.debug("SYNCLEAN-140","Remove empty dirs (%s)"%(p,))
         try:
-            os.removedirs(p)
+            os.rmdir(p)
         except OSError as e:
-            pass # Neutralize exception (needed as removedirs raise exception at first non empty dir).
+            continue # not empty or already removed
+
+        count+=1
+        sdlog.debug("SYNCLEAN-150","Empty directory removed (%s)"%(p,))
+
+        parent=os.path.dirname(p)
+        heapq.heappush(heap,(-parent.count('/'),parent))
 
-    # as the previous command may also remove 'data' folder (when all data have been removed), we re-create 'data' if missing
-    if not os.path.isdir(sdconfig.data_folder):
-        os.makedirs(sdconfig.data_folder)
+    sdlog.info("SYNCLEAN-160","%i empty directories removed"%count)
 
-    sdlog.info("SYNCLEAN-020","Cleanup done.")
+    return count
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
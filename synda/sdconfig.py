@@ -206,6 +206,7 @@ openid=config.get('esgf_credential','openid')
 password=config.get('esgf_credential','password')
 progress=config.getboolean('interface','progress')
 download=config.getboolean('module','download')
+queue_service=config.getboolean('module','queue_service')
 metadata_server_type=config.get('core','metadata_server_type')
 
 default_folder=get_path('default_path',default_folder_default_path)
@@ -221,6 +222,8 @@ cleanup_tree_script="%s/sdcleanup_tree.sh"%bin_folder
 
 default_selection_file="%s/default.txt"%default_folder
 db_file="%s/sdt.db"%db_folder
+search_cache_file="%s/search_cache.db"%db_folder
+index_health_file="%s/index_health.json"%db_folder
 
 check_path(selection_folder)
 check_path(data_folder)
@@ -145,9 +145,15 @@ SEARCH_API_CHUNKSIZE=9000
 PROCESSING_CHUNKSIZE=5000 # as list maybe duplicated in memory at some point in the pipeline, we use a lower value here than SEARCH_API_CHUNKSIZE
 PROCESSING_FETCH_MODE_GENERATOR='generator'
 
+SEARCH_API_READ_SIZE=65536     # search-API response is read (and parsed) by blocks of this size (bytes)
+SEARCH_API_STORE_BATCH_SIZE=500 # parsed files are added to the response store by batches of this size
+
 SEARCH_API_HTTP_TIMEOUT=300 # Search-API HTTP timeout (time to wait for HTTP response)
 DIRECT_DOWNLOAD_HTTP_TIMEOUT=30 # Direct download HTTP timeout (time to wait for HTTP response)
 ASYNC_DOWNLOAD_HTTP_TIMEOUT=360 # Async download HTTP timeout (time to wait for HTTP response)
+
+HTTP_POOL_COUNT=10                          # search-API client: max number of index hosts with persistent connections
+HTTP_RETRY_BACKOFF_FACTOR=0.5               # search-API client: delay before connection retry is 0.5s, 1s, 2s..
 #
 PARAM_TYPE_CONTROLLED='param_type_controlled'
 PARAM_TYPE_FREE='param_type_free'
@@ -209,6 +215,18 @@ VARIABLE_FIELDS=['title','instance_id','variable']+REQUIRED_FIELDS
 
 DATASET_VERSION_FIELDS=['master_id','version','timestamp']+REQUIRED_FIELDS
 
+# Pipeline fields are the attributes used downstream of the search-API call
+# (pipelines, database insertion, listing), so to only retrieve those (see sdfields.get_fields).
+#
+# Notes
+#     - file pipeline: 'title' becomes 'filename', 'dataset_id' becomes 'dataset_functional_id', 'url' is split by protocol
+#     - file insertion: 'tracking_id', 'checksum', 'checksum_type', 'project', 'model' and 'timestamp' are stored in the database
+#     - '_timestamp' is used by the incremental discovery (see sdwatermark) and by the search-API cache (see sdsearchcache)
+#     - keys used in 'local_path_drs_template' are added when using the custom local path format
+#
+FILE_PIPELINE_FIELDS=['instance_id','id','title','dataset_id','dataset_id_template_','url','tracking_id','checksum','checksum_type','variable','data_node','project','model','timestamp','_timestamp']+REQUIRED_FIELDS
+DATASET_PIPELINE_FIELDS=['instance_id','id','dataset_id_template_','variable','data_node','_timestamp']+REQUIRED_FIELDS
+
 
 POST_PIPELINE_MODES=['file','dataset','generic',None]
 
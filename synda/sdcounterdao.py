@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""Contains dataset and variable counters SQL queries.
+
+Note
+    Counters are maintained by triggers (see sddbobj.create_triggers()), so
+    this module only READ them (except for the rebuild routine).
+"""
+
+import argparse
+import sdapp
+import sddb
+import sddbobj
+
+def get_dataset_counter(dataset_id,conn=sddb.conn):
+    """Return (total,done) files count for the dataset."""
+    c = conn.cursor()
+    c.execute("select total,done from dataset_counter where dataset_id=?",(dataset_id,))
+    rs=c.fetchone()
+    c.close()
+
+    if rs is None:
+        return (0,0) # no file yet for this dataset
+    else:
+        return (rs[0],rs[1])
+
+def get_variable_counter(dataset_id,variable,conn=sddb.conn):
+    """Return (total,done) files count for the variable of the dataset."""
+    c = conn.cursor()
+    c.execute("select total,done from variable_counter where dataset_id=? and variable=?",(dataset_id,variable if variable is not None else ''))
+    rs=c.fetchone()
+    c.close()
+
+    if rs is None:
+        return (0,0) # variable doesn't exist for this dataset
+    else:
+        return (rs[0],rs[1])
+
+def exists_one_complete_variable(dataset_id,conn=sddb.conn):
+    c = conn.cursor()
+    c.execute("select 1 from variable_counter where dataset_id=? and total>0 and total=done limit 1",(dataset_id,))
+    rs=c.fetchone()
+    c.close()
+
+    return rs is not None
+
+def rebuild_counters(conn=sddb.conn):
+    sddbobj.populate_counters(conn)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d','--dataset_id',type=int)
+    parser.add_argument('-v','--variable')
+    parser.add_argument('-r','--rebuild',action='store_true',help='Recompute all counters from scratch')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild_counters()
+    elif args.variable is not None:
+        print get_variable_counter(args.dataset_id,args.variable)
+    else:
+        print get_dataset_counter(args.dataset_id)
@@ -16,7 +16,8 @@ import sdapp
 from sdexception import SDException
 import sddb
 import sdsqlutils
-from sdtypes import Dataset
+import sddbpagination
+from sdtypes import Dataset,DatasetRow
 
 def add_dataset(dataset,commit=True,conn=sddb.conn):
     keys_to_insert=['local_path','path','path_without_version','dataset_functional_id','template','version','status','latest','crea_date','last_mod_date','project','model', 'timestamp']
@@ -63,7 +64,7 @@ def get_dataset(path=None,dataset_id=None,dataset_functional_id=None,conn=sddb.c
     c.execute(q)
     rs=c.fetchone()
     if rs is not None:
-        d=sdsqlutils.get_object_from_resultset(rs,Dataset)
+        d=DatasetRow(rs)
 
     c.close()
 
@@ -90,6 +91,17 @@ def update_dataset(d,commit=True,conn=sddb.conn,keys=['latest','status','last_mo
     if rowcount==0:
         raise SDException("SYNCDDAO-128","dataset not found (dataset_id=%s)"%d.dataset_id)
 
+def update_timestamps(timestamps,commit=True,conn=sddb.conn):
+    """Set datasets timestamp.
+
+    Args
+        timestamps: list of (dataset_functional_id,timestamp) tuples
+    """
+    conn.executemany("update dataset set timestamp=? where dataset_functional_id=?",[(timestamp,dataset_functional_id) for (dataset_functional_id,timestamp) in timestamps])
+
+    if commit:
+        conn.commit()
+
 def exists_dataset(path=None,conn=sddb.conn):
     d=get_dataset(path=path)
     if d is not None:
@@ -102,8 +114,10 @@ def get_datasets(limit=None,conn=sddb.conn,**search_constraints): # don't change
     Note
         If 'limit' is None, retrieve all records matching the search constraints
     """
-    datasets=[]
+    return list(get_datasets_generator(limit,conn,**search_constraints))
 
+def get_datasets_generator(limit=None,conn=sddb.conn,**search_constraints): # don't change arguments order here
+    """Same as get_datasets(), but yield datasets instead of returning a list."""
     c = conn.cursor()
 
     limit_clause="limit %i"%limit if limit is not None else ""
@@ -115,14 +129,18 @@ def get_datasets(limit=None,conn=sddb.conn,**search_constraints): # don't change
         q="select * from dataset order by path asc %s"%limit_clause
         c.execute(q)
 
-    rs=c.fetchone()
-    while rs!=None:
-        datasets.append(sdsqlutils.get_object_from_resultset(rs,Dataset))
-        rs=c.fetchone()
+    for rs in sdsqlutils.fetch_rows(c):
+        yield DatasetRow(rs)
 
-    c.close()
+def get_datasets_pagination(conn=sddb.conn,**search_constraints):
+    """Same as get_datasets_generator(), but using keyset pagination.
 
-    return datasets
+    Notes
+        - use this func to loop over a large number of datasets (constant memory)
+        - database can be modified while looping (e.g. update_dataset())
+        - datasets are returned in 'dataset_id' order
+    """
+    return sddbpagination.get_datasets(conn=conn,**search_constraints)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -25,6 +25,7 @@ import sdtime
 import sdlog
 import sdvariable
 import sdmodifyquery
+import sdcounterdao
 from sdprogress import SDProgressDot
 from sdexception import SDException
 
@@ -48,10 +49,11 @@ def switch_off_latest_flag_for_all_other_versions(latest_dataset_version,dataset
                 l__d.latest=False
                 sddatasetdao.update_dataset(l__d,False,sddb.conn)
 
-def update_latest_flag(d,force_latest=False):
+def update_latest_flag(d,force_latest=False,commit=True):
     """
     Args:
         force_latest: If 'true', force 'latest' to 'true' no matter what the compute_latest_flag() method say)
+        commit: If 'false', modifications are left in the current transaction (i.e. the caller is in charge of the commit)
 
     Notes
      - warning: this method update the dataset in database (and in some cases, also all other different versions of this datasets)
@@ -75,7 +77,9 @@ def update_latest_flag(d,force_latest=False):
         pass
 
     sddatasetdao.update_dataset(d,False,sddb.conn) # MOD_B
-    sddb.conn.commit() # commit all datasets modifications together (MOD_A (if any) and MOD_B)
+
+    if commit:
+        sddb.conn.commit() # commit all datasets modifications together (MOD_A (if any) and MOD_B)
 
 def compute_latest_flag(dataset_versions,d):
     """
@@ -217,8 +221,9 @@ def compute_dataset_status(d):
 
     # retrieve global infos
     #
-    total_files_count=sdfilequery.count_dataset_files(d,None)
-    total_done_files_count=sdfilequery.count_dataset_files(d,sdconst.TRANSFER_STATUS_DONE)
+    # (counters are maintained by triggers, so this doesn't depend on how many files the dataset contains)
+    #
+    (total_files_count,total_done_files_count)=sdcounterdao.get_dataset_counter(d.dataset_id)
 
 
     #########################
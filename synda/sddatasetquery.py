@@ -20,7 +20,7 @@ import sdapp
 import sddb
 import sdconst
 import sdsqlutils
-from sdtypes import Dataset
+from sdtypes import DatasetRow
 from sddatasetversion import DatasetVersions
 
 def get_dataset_stats(d):
@@ -37,21 +37,21 @@ def get_dataset_stats(d):
     c = sddb.conn.cursor()
 
     # -- size by status -- #
-    c.execute("select status,sum(size) as size from file where dataset_id=? group by status",(d.dataset_id,))
+    c.execute("select status,sum(size) as size from file_data where dataset_id=? group by status",(d.dataset_id,))
     rs=c.fetchone()
     while rs is not None:
         stat['size'][rs['status']]=rs['size']
         rs=c.fetchone()
 
     # -- count by status -- #
-    c.execute("select status,count(1) as count from file where dataset_id=? group by status",(d.dataset_id,))
+    c.execute("select status,count(1) as count from file_data where dataset_id=? group by status",(d.dataset_id,))
     rs=c.fetchone()
     while rs is not None:
         stat['count'][rs['status']]=rs['count']
         rs=c.fetchone()
 
     # -- how many variable, regardless of the file status -- #
-    c.execute("select count(distinct variable) from file where dataset_id=?",(d.dataset_id,))
+    c.execute("select count(distinct variable_id) from file_data where dataset_id=?",(d.dataset_id,))
     rs=c.fetchone()
     count=rs[0]
     stat['variable_count']=count
@@ -67,7 +67,7 @@ def get_dataset_versions(i__d,i__compute_stats):
     rs=c.fetchone()
     while rs!=None:
 
-        l__d=sdsqlutils.get_object_from_resultset(rs,Dataset)
+        l__d=DatasetRow(rs)
         if i__compute_stats:
             l__d.statistics=get_dataset_stats(l__d)
         datasetVersions.add_dataset_version(l__d)
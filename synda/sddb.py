@@ -64,9 +64,23 @@ def connect():
     conn=sqlite3.connect(sdconfig.db_file,timeout)
     conn.row_factory=sqlite3.Row # this is for "by name" colums indexing
 
+    # enable incremental vacuum (only effective when the database is created,
+    # see sddbmaintenance for existing databases)
+    conn.execute("pragma auto_vacuum=incremental")
+
+    # encode old 'file' table (must be done before DB objects creation)
+    if sddbobj.upgrade_file_table(conn):
+        sdlog.info("SDDATABA-005","'file' table encoded ('file_data' table)")
+
     # create DB object
     sddbobj.create_tables(conn)
     sddbobj.create_indexes(conn)
+    sddbobj.create_triggers(conn)
+
+    # compute counters if not done yet (e.g. database modified by a previous version)
+    if sddbobj.is_counters_empty(conn):
+        sddbobj.populate_counters(conn)
+        sdlog.info("SDDATABA-006","Files counters computed")
 
 def disconnect():
     global conn
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains database maintenance routines.
+
+Notes
+    - 'maintain()' can be used while the daemon is running: each step runs in
+      its own short transaction, with a pause between steps so the daemon can
+      acquire the database lock
+    - integrity is checked table by table (one read per table). This needs
+      SQLite 3.33 or later: with an older SQLite, the check reads the whole
+      database at once (which blocks the daemon commits on large databases),
+      so it is only done when the daemon is stopped
+    - 'vacuum()' rebuilds the whole database file, so it must only be used
+      when the daemon is stopped (it is also used to enable incremental vacuum
+      on databases created before this feature)
+"""
+
+import os
+import time
+import argparse
+import humanize
+import sqlite3
+import sdapp
+import sdconfig
+import sddb
+import sdlog
+
+STEP_PAUSE=0.2                # seconds (pause between two steps, so the daemon is not blocked)
+VACUUM_PAGES_PER_STEP=1000    # pages released per incremental vacuum step
+ANALYSIS_LIMIT=1000           # approximate ANALYZE (rows scanned per index, see https://www.sqlite.org/lang_analyze.html)
+
+AUTO_VACUUM_INCREMENTAL=2
+
+def maintain(full_check=False,daemon_running=False,conn=sddb.conn):
+    """Run all maintenance steps and print before/after statistics.
+
+    Returns
+        True if database integrity is ok, else False.
+    """
+    conn.commit() # make sure no transaction is pending
+
+    before=get_stats(conn)
+    print_stats('before',before)
+
+    if is_table_check_supported() or not daemon_running:
+        (ok,duration)=timed(check_integrity,full_check,conn)
+        print "integrity check: %s (%.1fs)"%('ok' if ok else 'ERROR (see log file)',duration)
+    else:
+        ok=True
+        print "integrity check: skipped (table by table check needs SQLite 3.33 or later, current version is %s: stop the daemon to run the check)"%sqlite3.sqlite_version
+
+    (_,duration)=timed(analyze,conn)
+    print "statistics update: done (%.1fs)"%duration
+
+    if before['auto_vacuum']==AUTO_VACUUM_INCREMENTAL:
+        (count,duration)=timed(incremental_vacuum,conn)
+        print "incremental vacuum: %i page(s) released (%.1fs)"%(count,duration)
+    else:
+        print "incremental vacuum: not enabled on this database (run 'synda db vacuum' once with the daemon stopped to enable it)"
+
+    if before['journal_mode']=='wal':
+        (_,duration)=timed(wal_checkpoint,conn)
+        print "WAL checkpoint: done (%.1fs)"%duration
+    else:
+        print "WAL checkpoint: skipped (journal_mode=%s)"%before['journal_mode']
+
+    after=get_stats(conn)
+    print_stats('after',after)
+
+    sdlog.info("SDDBMAIN-001","Database maintenance done (page_count_before=%i,page_count_after=%i,integrity=%s)"%(before['page_count'],after['page_count'],ok))
+
+    return ok
+
+def vacuum(conn=sddb.conn):
+    """Rebuild database file (daemon must be stopped).
+
+    Note
+        incremental vacuum is enabled by the way (auto_vacuum mode can only be
+        changed on an existing database by running VACUUM)
+    """
+    conn.commit()
+
+    before=get_stats(conn)
+    print_stats('before',before)
+
+    conn.execute("pragma auto_vacuum=incremental")
+    (_,duration)=timed(conn.execute,"vacuum")
+    print "vacuum: done (%.1fs)"%duration
+
+    after=get_stats(conn)
+    print_stats('after',after)
+
+    sdlog.info("SDDBMAIN-002","Database vacuum done (page_count_before=%i,page_count_after=%i)"%(before['page_count'],after['page_count']))
+
+def check_integrity(full_check=False,conn=sddb.conn):
+    """Return True if database is ok.
+
+    Notes
+        - 'quick_check' is used by default as it is much faster than
+          'integrity_check' (it doesn't check index content)
+        - when supported, tables are checked one by one (with their indexes),
+          with a pause between tables. Database-wide checks (e.g. free pages
+          list) are not done in this mode
+    """
+    pragma='integrity_check' if full_check else 'quick_check'
+
+    if is_table_check_supported():
+        errors=[]
+        for tablename in get_tables(conn):
+            errors.extend([rs[0] for rs in conn.execute("pragma %s('%s')"%(pragma,tablename)).fetchall() if rs[0]!='ok'])
+            time.sleep(STEP_PAUSE)
+    else:
+        errors=[rs[0] for rs in conn.execute("pragma %s"%pragma).fetchall() if rs[0]!='ok']
+
+    if len(errors)==0:
+        return True
+    else:
+        for e in errors:
+            sdlog.error("SDDBMAIN-003","Database integrity error (%s)"%e)
+        return False
+
+def is_table_check_supported():
+    return sqlite3.sqlite_version_info>=(3,33,0)
+
+def analyze(conn=sddb.conn):
+    """Refresh query planner statistics (one table per transaction)."""
+
+    if sqlite3.sqlite_version_info>=(3,32,0):
+        conn.execute("pragma analysis_limit=%i"%ANALYSIS_LIMIT)
+
+    for tablename in get_tables(conn):
+        conn.execute("analyze '%s'"%tablename)
+        conn.commit()
+        time.sleep(STEP_PAUSE)
+
+def incremental_vacuum(conn=sddb.conn):
+    """Release free pages to the filesystem, in small steps.
+
+    Returns
+        Number of released pages.
+    """
+    count=0
+
+    freelist_count=get_pragma('freelist_count',conn)
+    while freelist_count>0:
+        conn.execute("pragma incremental_vacuum(%i)"%VACUUM_PAGES_PER_STEP).fetchall() # note: fetchall() is needed, as incremental_vacuum releases one page per returned row
+        conn.commit()
+
+        remaining=get_pragma('freelist_count',conn)
+        if remaining>=freelist_count:
+            break # no progress (e.g. database locked by another connection)
+
+        count+=freelist_count-remaining
+        freelist_count=remaining
+
+        time.sleep(STEP_PAUSE)
+
+    return count
+
+def wal_checkpoint(conn=sddb.conn):
+    """
+    Note
+        PASSIVE mode is used so the daemon is never blocked (pages which are
+        in use are checkpointed on the next run)
+    """
+    conn.execute("pragma wal_checkpoint(PASSIVE)").fetchall()
+
+def get_tables(conn=sddb.conn):
+    return [rs[0] for rs in conn.execute("select name from sqlite_master where type='table' and name not like 'sqlite_%'").fetchall()]
+
+def get_pragma(name,conn=sddb.conn):
+    return conn.execute("pragma %s"%name).fetchone()[0]
+
+def get_stats(conn=sddb.conn):
+    di={}
+
+    for name in ['page_count','page_size','freelist_count','auto_vacuum','journal_mode']:
+        di[name]=get_pragma(name,conn)
+
+    di['file_size']=os.path.getsize(sdconfig.db_file)
+
+    return di
+
+def print_stats(label,stats):
+    print "%s: page_count=%i, freelist_count=%i, file_size=%s"%(label,stats['page_count'],stats['freelist_count'],humanize.naturalsize(stats['file_size'],gnu=False))
+
+def timed(func,*args):
+    start_time=time.time()
+    result=func(*args)
+    return (result,time.time()-start_time)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action',choices=['maintain','vacuum','stats'])
+    parser.add_argument('-f','--full_check',action='store_true')
+    args = parser.parse_args()
+
+    if args.action=='maintain':
+        maintain(args.full_check)
+    elif args.action=='vacuum':
+        vacuum()
+    elif args.action=='stats':
+        print_stats('current',get_stats())
@@ -11,11 +11,32 @@
 
 """This script contains database objects."""
 
+# 'file' columns stored as (dictionary prefix id, suffix) in 'file_data' table
+PREFIX_ENCODED_COLUMNS=['url','local_path']
 
-def create_tables(conn):
+# 'file' columns stored as a dictionary id in 'file_data' table
+VALUE_ENCODED_COLUMNS=['data_node','model','project','variable']
+
+# 'file' columns stored as is in 'file_data' table
+PLAIN_COLUMNS=['file_functional_id','filename','checksum','checksum_type','duration','size','rate','start_date','end_date','crea_date','status','error_msg','sdget_status','sdget_error_msg','priority','tracking_id','last_access_date','dataset_id','insertion_group_id','timestamp']
+
+def create_tables(conn,commit=True):
     """
     Notes
-        - 'file' table
+        - 'file' view
+            - 'file' is a view over 'file_data' table (decoded columns), so it
+              can be used as a table (select, insert, update and delete)
+            - 'file_data' table contains files with repetitive columns
+              dictionary-encoded: 'data_node', 'model', 'project' and 'variable'
+              are stored as an id in the 'dictionary' table, 'url' and
+              'local_path' are stored as a dictionary id for the directory part
+              (prefix) and the remaining part (suffix). This divides 'file' rows
+              (and indexes) size by ~3 on large databases.
+            - modifications done through the view are redirected to
+              'file_data' by INSTEAD OF triggers (see create_triggers()).
+              Beware: 'rowcount' and 'lastrowid' are not set by such
+              statements, so DAO code which needs them must modify
+              'file_data' table directly (only possible for PLAIN_COLUMNS).
             - 'file_functional_id' is the functional primary key (same as ESGF 'id', but without data_node, and file extension is cleaned (e.g. '.nc_4' become '.nc'))
             - duration in seconds
             - rate in bytes/seconds
@@ -41,11 +62,32 @@ def create_tables(conn):
               case 'selection_filename' column would not be sufficient for
               incremental mode. It may be removed by 2018, once we are sure
               we don't need it).
+        - 'watermark' table
+            - 'timestamp' column contains the latest search-API '_timestamp'
+              discovered for the selection file (used by incremental mode, see
+              sdwatermark)
+        - 'dataset_counter' and 'variable_counter' tables
+            - contain how many files (total and done) each dataset / variable has
+            - those tables are maintained by triggers (see create_triggers()), so they must never be modified directly
+            - 'variable' column contains '' when file variable is NULL
         - other tables
             - a dataset is a set of one or more variables
             - 'file_without_dataset' table contains orphan files (dataset doesn't exist for those files)
     """
-    conn.execute("create table if not exists file (file_id INTEGER PRIMARY KEY, url TEXT, file_functional_id TEXT, filename TEXT, local_path TEXT, data_node TEXT, checksum TEXT, checksum_type TEXT, duration INT, size INT, rate INT, start_date TEXT, end_date TEXT, crea_date TEXT, status TEXT, error_msg TEXT, sdget_status TEXT, sdget_error_msg TEXT, priority INT, tracking_id TEXT, model TEXT, project TEXT, variable TEXT, last_access_date TEXT, dataset_id INT, insertion_group_id INT, timestamp TEXT)")
+    conn.execute("create table if not exists dictionary (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute("create unique index if not exists idx_dictionary_1 on dictionary (value)") # created here (not in create_indexes()) as 'insert or ignore' into dictionary relies on it
+    conn.execute("create table if not exists file_data (file_id INTEGER PRIMARY KEY, url_prefix_id INT, url_suffix TEXT, file_functional_id TEXT, filename TEXT, local_path_prefix_id INT, local_path_suffix TEXT, data_node_id INT, checksum TEXT, checksum_type TEXT, duration INT, size INT, rate INT, start_date TEXT, end_date TEXT, crea_date TEXT, status TEXT, error_msg TEXT, sdget_status TEXT, sdget_error_msg TEXT, priority INT, tracking_id TEXT, model_id INT, project_id INT, variable_id INT, last_access_date TEXT, dataset_id INT, insertion_group_id INT, timestamp TEXT)")
+    conn.execute("""create view if not exists file as
+                    select f.file_id, up.value||f.url_suffix as url, f.file_functional_id, f.filename, lp.value||f.local_path_suffix as local_path, dn.value as data_node,
+                           f.checksum, f.checksum_type, f.duration, f.size, f.rate, f.start_date, f.end_date, f.crea_date, f.status, f.error_msg, f.sdget_status, f.sdget_error_msg,
+                           f.priority, f.tracking_id, m.value as model, p.value as project, v.value as variable, f.last_access_date, f.dataset_id, f.insertion_group_id, f.timestamp
+                    from file_data f
+                    left join dictionary up on up.id=f.url_prefix_id
+                    left join dictionary lp on lp.id=f.local_path_prefix_id
+                    left join dictionary dn on dn.id=f.data_node_id
+                    left join dictionary m on m.id=f.model_id
+                    left join dictionary p on p.id=f.project_id
+                    left join dictionary v on v.id=f.variable_id""")
     conn.execute("create table if not exists dataset (dataset_id INTEGER PRIMARY KEY, dataset_functional_id TEXT, status TEXT, crea_date TEXT, path TEXT, path_without_version TEXT, version TEXT, local_path TEXT, last_mod_date TEXT, latest INT, latest_date TEXT, last_done_transfer_date TEXT, model TEXT, project TEXT, template TEXT, timestamp TEXT)")
 
     conn.execute("create table if not exists export (dataset_id INTEGER, export_date TEXT)")
@@ -64,21 +106,46 @@ def create_tables(conn):
 
     conn.execute("create table if not exists generic_cache (realm TEXT, name TEXT, value TEXT)")
 
-    conn.commit()
+    conn.execute("create table if not exists dataset_counter (dataset_id INT NOT NULL, total INT, done INT)")
+    conn.execute("create table if not exists variable_counter (dataset_id INT NOT NULL, variable TEXT NOT NULL, total INT, done INT)")
+
+    conn.execute("create table if not exists lease (file_id INTEGER PRIMARY KEY, worker TEXT, expiry_date TEXT)")
 
-def create_indexes(conn):
-    conn.execute("create        index if not exists idx_file_1 on file (status)")
-    conn.execute("create        index if not exists idx_file_2 on file (priority)")
-    conn.execute("create        index if not exists idx_file_3 on file (crea_date)")
-    conn.execute("create unique index if not exists idx_file_4 on file (file_functional_id)")
-    conn.execute("create        index if not exists idx_file_5 on file (dataset_id)")
-    conn.execute("create        index if not exists idx_file_6 on file (tracking_id)") # not uniq (when fetching two different versions of the same dataset, many identical file are duplicated, resulting in tracking_id duplicates)
-    conn.execute("create        index if not exists idx_file_7 on file (checksum)")    # not uniq (when fetching two different versions of the same dataset, many identical file are duplicated, resulting in checksum duplicates)
-    conn.execute("create        index if not exists idx_file_8 on file (insertion_group_id)")
-    conn.execute("create        index if not exists idx_file_9 on file (project)")
-    conn.execute("create        index if not exists idx_file_10 on file (model)")
-    conn.execute("create        index if not exists idx_file_11 on file (filename)")
-    conn.execute("create unique index if not exists idx_file_12 on file (local_path)")
+    conn.execute("create table if not exists watermark (selection_filename TEXT PRIMARY KEY, selection_file_checksum TEXT, timestamp TEXT, full_discovery_date TEXT)")
+
+    if commit:
+        conn.commit()
+
+def create_indexes(conn,commit=True):
+    """
+    Notes
+        - indexes are reviewed with the sddbqueryplan module (run it after any index or DAO query modification)
+        - idx_file_5 (dataset_id) has been removed, as it is a prefix of
+          idx_file_14 (see sddbversion.upgrade_39())
+        - idx_file_1 (status) is NOT redundant with idx_file_13, as it returns
+          rows in file_id order for a given status (needed by keyset pagination)
+        - on an existing large database, new indexes are built during the
+          first connection (this may take a few minutes, but only once)
+        - 'file' indexes are on 'file_data' table (encoded columns are
+          indexed using their dictionary id)
+    """
+    conn.execute("create        index if not exists idx_file_1 on file_data (status)")
+    conn.execute("create        index if not exists idx_file_2 on file_data (priority)")
+    conn.execute("create        index if not exists idx_file_3 on file_data (crea_date)")
+    conn.execute("create unique index if not exists idx_file_4 on file_data (file_functional_id)")
+    conn.execute("create        index if not exists idx_file_6 on file_data (tracking_id)") # not uniq (when fetching two different versions of the same dataset, many identical file are duplicated, resulting in tracking_id duplicates)
+    conn.execute("create        index if not exists idx_file_7 on file_data (checksum)")    # not uniq (when fetching two different versions of the same dataset, many identical file are duplicated, resulting in checksum duplicates)
+    conn.execute("create        index if not exists idx_file_8 on file_data (insertion_group_id)")
+    conn.execute("create        index if not exists idx_file_9 on file_data (project_id)")
+    conn.execute("create        index if not exists idx_file_10 on file_data (model_id)")
+    conn.execute("create        index if not exists idx_file_11 on file_data (filename)")
+    conn.execute("create unique index if not exists idx_file_12 on file_data (local_path_prefix_id, local_path_suffix)")
+    conn.execute("create        index if not exists idx_file_13 on file_data (status, priority DESC, checksum)") # waiting transfer selection (no sort needed)
+    conn.execute("create        index if not exists idx_file_14 on file_data (dataset_id, status)")             # dataset files count by status
+    conn.execute("create        index if not exists idx_file_15 on file_data (dataset_id, variable_id, status)")   # covering index for per-dataset variable/status 'group by'
+    conn.execute("create        index if not exists idx_file_16 on file_data (status, project_id, insertion_group_id, priority DESC, checksum)") # fair-share transfer selection (see sdfairshare)
+    conn.execute("create        index if not exists idx_file_17 on file_data (status, local_path_prefix_id, priority DESC, checksum)") # locality-aware transfer selection (see sdlocality)
+    conn.execute("create        index if not exists idx_file_18 on file_data (status, end_date)") # recent transfer rates (see sdeta)
     conn.execute("create unique index if not exists idx_dataset_1 on dataset (dataset_functional_id)")
     conn.execute("create        index if not exists idx_dataset_2 on dataset (status)")
     conn.execute("create        index if not exists idx_dataset_3 on dataset (path_without_version)")
@@ -87,9 +154,250 @@ def create_indexes(conn):
     conn.execute("create        index if not exists idx_export_1 on export (dataset_id)")
     conn.execute("create unique index if not exists idx_selection_1 on selection (filename)")
     conn.execute("create unique index if not exists idx_selection__file_1 on selection__file (selection_id, file_id)")
+    conn.execute("create        index if not exists idx_selection__file_2 on selection__file (file_id)") # file deletion
     conn.execute("create        index if not exists idx_file_without_selection_1 on file_without_selection (file_id)")
     conn.execute("create        index if not exists idx_file_without_dataset_1 on file_without_dataset (file_id)")
     conn.execute("create unique index if not exists idx_param_1 on param (name,value)")
     conn.execute("create        index if not exists idx_event_1 on event (name)")
     conn.execute("create        index if not exists idx_event_2 on event (status)")
     conn.execute("create        index if not exists idx_event_3 on event (crea_date)")
+    conn.execute("create        index if not exists idx_event_4 on event (status, priority DESC, crea_date)")
+    conn.execute("create unique index if not exists idx_dataset_counter_1 on dataset_counter (dataset_id)")
+    conn.execute("create unique index if not exists idx_variable_counter_1 on variable_counter (dataset_id,variable)")
+    conn.execute("create        index if not exists idx_lease_1 on lease (expiry_date)")
+    conn.execute("create        index if not exists idx_history_1 on history (selection_filename, action)")
+
+    if commit:
+        conn.commit()
+
+def create_triggers(conn,commit=True):
+    """Create triggers which keep 'dataset_counter' and 'variable_counter' tables up to date,
+    and triggers which make 'file' view writable.
+
+    Notes
+        - counters are updated for every file modification (whatever code
+          path is used), so completion checks cost one indexed lookup instead
+          of a 'count' / 'group by' over all dataset's files
+        - 'insert or ignore' creates the counter row on first use
+        - 'file' view triggers are only created once 'file' is a view (i.e.
+          not before 'file' table has been encoded, see encode_file_table())
+    """
+
+    variable="ifnull((select value from dictionary where id=%s.variable_id),'')"
+    new_variable=variable%'new'
+    old_variable=variable%'old'
+
+    conn.execute("""create trigger if not exists trg_file_counter_insert after insert on file_data
+                    when new.dataset_id is not null
+                    begin
+                        insert or ignore into dataset_counter (dataset_id,total,done) values (new.dataset_id,0,0);
+                        insert or ignore into variable_counter (dataset_id,variable,total,done) values (new.dataset_id,%(new_variable)s,0,0);
+                        update dataset_counter set total=total+1, done=done+(new.status='done') where dataset_id=new.dataset_id;
+                        update variable_counter set total=total+1, done=done+(new.status='done') where dataset_id=new.dataset_id and variable=%(new_variable)s;
+                    end"""%locals())
+
+    conn.execute("""create trigger if not exists trg_file_counter_delete after delete on file_data
+                    when old.dataset_id is not null
+                    begin
+                        update dataset_counter set total=total-1, done=done-(old.status='done') where dataset_id=old.dataset_id;
+                        update variable_counter set total=total-1, done=done-(old.status='done') where dataset_id=old.dataset_id and variable=%(old_variable)s;
+                    end"""%locals())
+
+    # note: rows with NULL dataset_id are not counted (the 'where' clauses below do not match anything for NULL)
+    conn.execute("""create trigger if not exists trg_file_counter_update after update of status, dataset_id, variable_id on file_data
+                    when old.status is not new.status or old.dataset_id is not new.dataset_id or old.variable_id is not new.variable_id
+                    begin
+                        update dataset_counter set total=total-1, done=done-(old.status='done') where dataset_id=old.dataset_id;
+                        update variable_counter set total=total-1, done=done-(old.status='done') where dataset_id=old.dataset_id and variable=%(old_variable)s;
+                        insert or ignore into dataset_counter (dataset_id,total,done) select new.dataset_id,0,0 where new.dataset_id is not null;
+                        insert or ignore into variable_counter (dataset_id,variable,total,done) select new.dataset_id,%(new_variable)s,0,0 where new.dataset_id is not null;
+                        update dataset_counter set total=total+1, done=done+(new.status='done') where dataset_id=new.dataset_id;
+                        update variable_counter set total=total+1, done=done+(new.status='done') where dataset_id=new.dataset_id and variable=%(new_variable)s;
+                    end"""%locals())
+
+    if is_view('file',conn):
+
+        columns=', '.join(get_file_data_columns())
+        values=', '.join(get_file_data_values('new'))
+        assignments=', '.join(['%s=%s'%(c,v) for c,v in zip(get_file_data_columns(),get_file_data_values('new'))])
+        add_values=get_dictionary_insert('new')
+
+        conn.execute("""create trigger if not exists trg_file_insert instead of insert on file
+                        begin
+                            %(add_values)s;
+                            insert into file_data (file_id, %(columns)s) values (new.file_id, %(values)s);
+                        end"""%locals())
+
+        conn.execute("""create trigger if not exists trg_file_update instead of update on file
+                        begin
+                            %(add_values)s;
+                            update file_data set %(assignments)s where file_id=old.file_id;
+                        end"""%locals())
+
+        conn.execute("""create trigger if not exists trg_file_delete instead of delete on file
+                        begin
+                            delete from file_data where file_id=old.file_id;
+                        end""")
+
+    if commit:
+        conn.commit()
+
+def upgrade_file_table(conn):
+    """Encode the old 'file' table if any (i.e. database created before 'file_data' table).
+
+    Notes
+        - this func is called in sddb.connect(), before database objects
+          creation, as the database version may already match the binary
+          version (the 3.9 version number was used before 'file' encoding)
+        - nothing is done if 'file' is already a view (or doesn't exist yet)
+        - the whole upgrade runs in one explicit transaction (the python
+          sqlite module would otherwise commit before each DDL statement), so
+          if anything fails, the database is left unchanged (i.e. with the
+          old 'file' table)
+
+    Returns
+        True if 'file' table has been encoded
+    """
+
+    if not is_table('file',conn):
+        return False
+
+    conn.commit() # end the transaction implicitly started by the python sqlite module (if any)
+
+    isolation_level=conn.isolation_level
+    conn.isolation_level=None
+    try:
+        conn.execute("begin")
+
+        create_tables(conn,commit=False) # 'dictionary' and 'file_data' tables are needed to encode rows
+        encode_file_table(conn,commit=False)
+        populate_counters(conn,commit=False) # counters triggers are disabled while encoding
+
+        # indexes which are now redundant (prefix of a composite index) are removed
+        conn.execute("drop index if exists idx_file_5")
+
+        conn.execute("commit")
+    except:
+        conn.rollback()
+        raise
+    finally:
+        conn.isolation_level=isolation_level
+
+    conn.execute("analyze") # statistics are refreshed so the planner uses new indexes
+    conn.commit()
+
+    return True
+
+def encode_file_table(conn,commit=True):
+    """Move rows from the old 'file' table into 'file_data' table, then replace it with the 'file' view.
+
+    Notes
+        - this func is used when upgrading the database (see upgrade_file_table())
+        - counters must be recomputed afterwards (see populate_counters())
+    """
+
+    if is_view('file',conn):
+        return # already done
+
+    drop_counter_triggers(conn) # counters are recomputed from scratch afterwards
+    insert_file_data('file',conn)
+    conn.execute("drop table file") # also drop old 'file' indexes
+
+    create_tables(conn,commit=False)
+    create_indexes(conn,commit=False)
+    create_triggers(conn,commit=False)
+
+    if commit:
+        conn.commit()
+
+def insert_file_data(tablename,conn):
+    """Encode and copy rows from a table with 'file' layout (decoded columns) into 'file_data' table.
+
+    Note
+        rows with NULL 'file_id' get a new id
+    """
+    for c in PREFIX_ENCODED_COLUMNS:
+        conn.execute("insert or ignore into dictionary (value) select distinct %s from %s where %s is not null"%(get_prefix(c),tablename,c))
+    for c in VALUE_ENCODED_COLUMNS:
+        conn.execute("insert or ignore into dictionary (value) select distinct %s from %s where %s is not null"%(c,tablename,c))
+
+    conn.execute("insert into file_data (file_id, %s) select file_id, %s from %s"%(', '.join(get_file_data_columns()),', '.join(get_file_data_values()),tablename))
+
+def drop_counter_triggers(conn):
+    """Disable counters maintenance (used for bulk load, counters must be recomputed afterwards using populate_counters())."""
+    for name in ['trg_file_counter_insert','trg_file_counter_delete','trg_file_counter_update']:
+        conn.execute("drop trigger if exists %s"%name)
+
+def get_prefix(column):
+    """Return SQL expression which extracts directory part (i.e. everything up to the last '/')."""
+    return "rtrim(%s,replace(%s,'/',''))"%(column,column)
+
+def get_file_data_columns():
+    """Return 'file_data' columns (except 'file_id')."""
+    li=[]
+    for c in PREFIX_ENCODED_COLUMNS:
+        li.extend(['%s_prefix_id'%c,'%s_suffix'%c])
+    for c in VALUE_ENCODED_COLUMNS:
+        li.append('%s_id'%c)
+    li.extend(PLAIN_COLUMNS)
+    return li
+
+def get_file_data_values(alias=None):
+    """Return SQL expressions which encode 'file' columns (same order as get_file_data_columns()).
+
+    Note
+        dictionary values must exist before using those expressions (see get_dictionary_insert())
+    """
+    li=[]
+    for c in PREFIX_ENCODED_COLUMNS:
+        c='%s.%s'%(alias,c) if alias is not None else c
+        li.append("(select id from dictionary where value=%s)"%get_prefix(c))
+        li.append("substr(%s,length(%s)+1)"%(c,get_prefix(c)))
+    for c in VALUE_ENCODED_COLUMNS:
+        c='%s.%s'%(alias,c) if alias is not None else c
+        li.append("(select id from dictionary where value=%s)"%c)
+    for c in PLAIN_COLUMNS:
+        li.append('%s.%s'%(alias,c) if alias is not None else c)
+    return li
+
+def get_dictionary_insert(alias):
+    """Return SQL statement which adds new values (if any) of a 'file' row into dictionary."""
+    li=['select %s as value'%get_prefix('%s.%s'%(alias,c)) for c in PREFIX_ENCODED_COLUMNS]
+    li+=['select %s.%s as value'%(alias,c) for c in VALUE_ENCODED_COLUMNS]
+    return "insert or ignore into dictionary (value) select value from (%s) where value is not null"%' union all '.join(li)
+
+def is_table(name,conn):
+    c=conn.cursor()
+    c.execute("select 1 from sqlite_master where type='table' and name=?",(name,))
+    rs=c.fetchone()
+    c.close()
+    return rs is not None
+
+def is_view(name,conn):
+    c=conn.cursor()
+    c.execute("select 1 from sqlite_master where type='view' and name=?",(name,))
+    rs=c.fetchone()
+    c.close()
+    return rs is not None
+
+def is_counters_empty(conn):
+    """Return True if counters have never been computed (i.e. files exist but counters tables are empty)."""
+    if conn.execute("select 1 from dataset_counter limit 1").fetchone() is not None:
+        return False
+    return conn.execute("select 1 from file_data where dataset_id is not null limit 1").fetchone() is not None
+
+def populate_counters(conn,commit=True):
+    """Recompute 'dataset_counter' and 'variable_counter' tables from scratch.
+
+    Note
+        This func is used when upgrading the database and to fix counters if
+        they become inconsistent (e.g. after a manual modification of the
+        database with triggers disabled).
+    """
+    conn.execute("delete from dataset_counter")
+    conn.execute("delete from variable_counter")
+    conn.execute("insert into dataset_counter (dataset_id,total,done) select dataset_id,count(1),sum(status='done') from file where dataset_id is not null group by dataset_id")
+    conn.execute("insert into variable_counter (dataset_id,variable,total,done) select dataset_id,ifnull(variable,''),count(1),sum(status='done') from file where dataset_id is not null group by dataset_id,ifnull(variable,'')")
+
+    if commit:
+        conn.commit()
@@ -72,10 +72,90 @@ class DBPagination():
         files=[]
         results=self.get_items()
         for rs in results:
-            f=sdsqlutils.get_object_from_resultset(rs,sdtypes.File)
+            f=sdtypes.FileRow(rs)
             files.append(f)
         return files
 
+class DBKeysetPagination():
+    """Keyset pagination (aka 'seek method').
+
+    Unlike DBPagination (which uses OFFSET), each block starts right after the
+    last key of the previous block. So each block costs one index lookup (no
+    matter how deep we are in the table), and rows can be modified or removed
+    along the way without shifting the next blocks (e.g. when looping over
+    'running' files to switch them to 'waiting').
+
+    Note
+        'key' column must be unique (e.g. table primary key)
+    """
+
+    def __init__(self,table='file',columns='*',key='file_id',search_constraints=None,conn=sddb.conn,chunksize=DBPagination.DEFAULT_CHUNKSIZE):
+        self.conn=conn
+        self.table=table
+        self.columns=columns
+        self.key=key
+        self.search_constraints=search_constraints if search_constraints is not None else {}
+        self.pagination_block_size=chunksize
+        self.last_key=None
+
+    def reset(self):
+        self.last_key=None
+
+    def get_items(self):
+        where_clauses=[]
+        params=dict(self.search_constraints)
+
+        if len(self.search_constraints)>0:
+            where_clauses.append(sdsqlutils.build_search_placeholder(self.search_constraints))
+
+        if self.last_key is not None:
+            where_clauses.append("%s > :last_key__"%self.key)
+            params['last_key__']=self.last_key
+
+        where_clause="where %s"%" AND ".join(where_clauses) if len(where_clauses)>0 else ""
+
+        c = self.conn.cursor()
+        q="select %s from %s %s order by %s limit %d" % (self.columns,self.table,where_clause,self.key,self.pagination_block_size)
+        c.execute(q,params)
+        results = c.fetchall()
+        c.close()
+
+        if len(results)>0:
+            self.last_key=results[-1][self.key] # move key for the next call
+
+        return results
+
+    def get_files(self):
+        return [sdtypes.FileRow(rs) for rs in self.get_items()]
+
+    def get_datasets(self):
+        return [sdtypes.DatasetRow(rs) for rs in self.get_items()]
+
+def get_files(conn=sddb.conn,chunksize=DBPagination.DEFAULT_CHUNKSIZE,**search_constraints):
+    """Yield all files matching the search constraints (constant memory).
+
+    Note
+        It is possible to write in the database (and to commit) while
+        looping, as no cursor remains open between two blocks.
+    """
+    dbpagination=DBKeysetPagination('file','*','file_id',search_constraints,conn,chunksize)
+
+    files=dbpagination.get_files()
+    while len(files)>0:
+        for f in files:
+            yield f
+        files=dbpagination.get_files()
+
+def get_datasets(conn=sddb.conn,chunksize=DBPagination.DEFAULT_CHUNKSIZE,**search_constraints):
+    """Same as get_files(), but for datasets."""
+    dbpagination=DBKeysetPagination('dataset','*','dataset_id',search_constraints,conn,chunksize)
+
+    datasets=dbpagination.get_datasets()
+    while len(datasets)>0:
+        for d in datasets:
+            yield d
+        datasets=dbpagination.get_datasets()
+
 # init.
 
 if __name__ == '__main__': # test only
@@ -89,7 +169,7 @@ if __name__ == '__main__': # test only
 
             # PAYLOAD
             checksum_type=sdnormalize.normalize_checksum_type(f.checksum_type)
-            sddb.conn.execute("update file set checksum_type=? where file_id=?",(checksum_type,f.file_id))
+            sddb.conn.execute("update file_data set checksum_type=? where file_id=?",(checksum_type,f.file_id))
 
         conn.commit() # commit block
         files=dbpagination.get_files() # next block
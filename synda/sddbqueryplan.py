@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module checks SQL query plans of the most frequent DAO queries.
+
+It runs 'EXPLAIN QUERY PLAN' on each query and reports queries which scan a
+whole table or which need a temporary b-tree (i.e. sort or group by not
+resolved by an index).
+
+Notes
+    - run this module after any index (sddbobj) or DAO query modification
+    - queries below must be kept in sync with the DAO modules
+"""
+
+import argparse
+import sdapp
+import sddb
+import sdconst
+import sdfiledao
+import sdsqlutils
+
+def get_queries():
+    """Return (name,query,params) list of queries to check."""
+    li=[]
+
+    # sddao.get_one_waiting_transfer() / sdfiledao.get_files()
+    search_constraints={'status':sdconst.TRANSFER_STATUS_WAITING}
+    li.append(('waiting transfer',"select * from file where %s order by priority DESC, checksum limit 1"%sdsqlutils.build_search_placeholder(search_constraints),search_constraints))
+
+    # sdfairshare
+    li.append(('transfer groups',"select p.value, f.insertion_group_id, count(1) from file_data f left join dictionary p on p.id=f.project_id where f.status = ? group by f.project_id, f.insertion_group_id",(sdconst.TRANSFER_STATUS_WAITING,)))
+    for project in ['CMIP6',None]:
+        li.append(('fair-share waiting transfer (project=%s)'%project,sdfiledao.get_one_waiting_file_query(project),sdfiledao.get_one_waiting_file_params(project,1)))
+
+    # sdlocality
+    li.append(('active directories count',"select count(distinct local_path_prefix_id) from file_data where status = ?",(sdconst.TRANSFER_STATUS_RUNNING,)))
+    for column in ['local_path_prefix_id','dataset_id']:
+        li.append(('waiting transfer near running (%s)'%column,"select * from file where file_id = (select file_id from file_data where status = ? and %s in (select %s from file_data where status = ?) order by priority DESC, checksum limit 1)"%(column,column),(sdconst.TRANSFER_STATUS_WAITING,sdconst.TRANSFER_STATUS_RUNNING)))
+
+    # sdfiledao
+    li.append(('file by functional id',"select * from file where file_functional_id = ?",('foo',)))
+    # note: 'dataset files' query (get_dataset_files()) is not checked, as it
+    # needs a sort ('variable' is dictionary-encoded), but only dataset's
+    # files are sorted, so this is cheap
+    li.append(('dataset files',"select * from file where dataset_id = ?",(1,)))
+    li.append(('file delete (junction)',"delete from selection__file where file_id=?",(1,)))
+    li.append(('file delete',"delete from file_data where file_id=?",(1,)))
+
+    # sdfilequery
+    li.append(('dataset files count',"select count(1) from file_data where dataset_id=?",(1,)))
+    li.append(('dataset files count by status',"select count(1) from file_data where dataset_id=? and status=?",(1,sdconst.TRANSFER_STATUS_DONE)))
+    li.append(('recent rates',"select dn.value, f.rate, f.end_date from file_data f left join dictionary dn on dn.id=f.data_node_id where f.end_date > ? and f.status = ? and f.rate > 0 order by f.end_date desc limit ?",('2017-01-01',sdconst.TRANSFER_STATUS_DONE,10000)))
+    li.append(('transfer status count',"select count(1) from file_data where status = ?",(sdconst.TRANSFER_STATUS_RUNNING,)))
+    li.append(('selection files',"select f.file_functional_id, f.status from history h join file_data f on f.insertion_group_id=h.insertion_group_id where h.action = ? and h.selection_filename = ? and f.status != ?",(sdconst.ACTION_ADD,'foo.txt',sdconst.TRANSFER_STATUS_DELETE)))
+
+    # sdvariablequery
+    li.append(('variable/status group by',"select v.value,f.status,count(*) from file_data f left join dictionary v on v.id=f.variable_id where f.dataset_id=? group by f.variable_id,f.status",(1,)))
+    li.append(('variable group by',"select v.value,count(*) from file_data f left join dictionary v on v.id=f.variable_id where f.dataset_id=? group by f.variable_id",(1,)))
+
+    # sdcounterdao
+    li.append(('dataset counter',"select total,done from dataset_counter where dataset_id=?",(1,)))
+    li.append(('variable counter',"select total,done from variable_counter where dataset_id=? and variable=?",(1,'tas')))
+
+    # sddatasetdao / sddatasetquery
+    li.append(('dataset by path',"select * from dataset where path = ?",('foo',)))
+    li.append(('dataset by functional id',"select * from dataset where dataset_functional_id = ?",('foo',)))
+    li.append(('dataset versions',"select * from dataset where path_without_version=?",('foo',)))
+
+    # sdeventdao
+    search_constraints={'status':sdconst.EVENT_STATUS_NEW}
+    li.append(('new events',"select * from event where %s order by priority DESC, crea_date ASC limit 1"%sdsqlutils.build_search_placeholder(search_constraints),search_constraints))
+
+    # sddbpagination (keyset)
+    li.append(('file keyset pagination',"select * from file where status=? and file_id > ? order by file_id limit 2500",(sdconst.TRANSFER_STATUS_RUNNING,0)))
+
+    return li
+
+def get_query_plan(query,params,conn=sddb.conn):
+    """Return query plan as a list of strings."""
+    c = conn.cursor()
+    c.execute("explain query plan %s"%query,params)
+    plan=[rs[-1] for rs in c.fetchall()] # last column contains the plan step description
+    c.close()
+
+    return plan
+
+def is_plan_ok(plan):
+    for step in plan:
+        if step.startswith('SCAN') and 'USING' not in step: # full table scan (note: 'SCAN ... USING INDEX' is an index walk, which is ok)
+            return False
+        if 'TEMP B-TREE' in step:
+            return False
+
+    return True
+
+def run(conn=sddb.conn,verbose=False):
+    """Return the number of queries with a suspicious plan."""
+    count=0
+
+    for (name,query,params) in get_queries():
+        plan=get_query_plan(query,params,conn)
+        ok=is_plan_ok(plan)
+
+        if not ok:
+            count+=1
+
+        if verbose or not ok:
+            print "%-32s %s"%(name,'ok' if ok else 'WARNING')
+            for step in plan:
+                print "    %s"%step
+
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-v','--verbose',action='store_true',help='Also display plans of queries without issue')
+    args = parser.parse_args()
+
+    count=run(verbose=args.verbose)
+
+    print "%d suspicious query plan(s)"%count
@@ -63,7 +63,9 @@ def upgrade_db(conn,current_db_version,new_db_version):
 
 def upgrade_39(conn):
 
-    # put schema upgrade code here if any
+    # 'file' table encoding (dictionary-encoded 'file_data' table) is done
+    # in sddb.connect() (see sddbobj.upgrade_file_table()), as databases
+    # already at version 3.9 also need it
 
     sddbversionutils.update_db_version(conn,'3.9')
 
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module deduplicates new transfers using files already in the local repository.
+
+When a new transfer has the same checksum as a file already downloaded, the
+local copy is linked (hardlink or reflink) into the new transfer local path,
+and the transfer is marked as done without any network traffic.
+
+Notes
+    - this is typically useful when a new dataset version is published, as
+      most files are unchanged from one version to the next
+    - dedup mode is set using 'download.dedup_mode' parameter ('none',
+      'hardlink' or 'reflink')
+    - 'hardlink' requires the source and destination to be on the same
+      filesystem; 'reflink' requires a filesystem with copy-on-write support
+      (e.g. btrfs, xfs). If linking fails, the transfer stays in the queue
+      and the file is downloaded as usual.
+"""
+
+import os
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdtime
+import sdutils
+import sddb
+import sdfiledao
+import sddatasetdao
+import sdevent
+from sdexception import SDException
+
+def run(insertion_group_id):
+    """Deduplicate waiting transfers inserted during the given discovery.
+
+    Returns
+        Number of deduplicated transfers.
+
+    Notes
+        - this func must be called once ALL files of the discovery have been
+          inserted (else a dataset may be marked as complete too early)
+        - no commit is done here (caller is responsible for committing)
+    """
+
+    if dedup_mode=='none':
+        return 0
+
+    count=0
+    size=0
+    datasets={} # cache (key=dataset_id)
+
+    for f in sdfiledao.get_files_pagination(status=sdconst.TRANSFER_STATUS_WAITING,insertion_group_id=insertion_group_id):
+        src=get_local_copy(f)
+        if src is None:
+            continue
+
+        dest=f.get_full_local_path()
+
+        if not link(src,dest):
+            continue
+
+        sdlog.info("SDDEDUPL-002","Transfer deduplicated (mode=%s,src=%s,dest=%s)"%(dedup_mode,src,dest))
+
+        f.status=sdconst.TRANSFER_STATUS_DONE
+        f.error_msg=""
+        f.start_date=sdtime.now()
+        f.end_date=f.start_date
+        f.duration=0
+        f.rate=0
+        sdfiledao.update_file(f,commit=False)
+
+        if f.dataset_id not in datasets:
+            datasets[f.dataset_id]=sddatasetdao.get_dataset(dataset_id=f.dataset_id)
+        f.dataset=datasets[f.dataset_id]
+
+        sdevent.file_complete_event(f,commit=False) # trigger 'file complete' event (same as for downloaded files)
+
+        count+=1
+        size+=f.size if f.size is not None else 0
+
+    if count>0:
+        sdlog.info("SDDEDUPL-001","%i transfer(s) deduplicated (size=%i)"%(count,size))
+
+    return count
+
+def get_local_copy(f):
+    """Return full local path of an already downloaded file identical to 'f', or None if not found."""
+
+    if not f.checksum or not f.checksum_type:
+        return None
+
+    dest=f.get_full_local_path()
+
+    if os.path.exists(dest):
+        return None # let 'lfae_mode' handle this case
+
+    for candidate in sdfiledao.get_done_files_by_checksum(f.checksum,f.checksum_type):
+        src=candidate.get_full_local_path()
+
+        if src==dest:
+            continue
+
+        if not os.path.isfile(src):
+            continue # local file has been removed/moved by user
+
+        if f.size is not None and os.path.getsize(src)!=f.size:
+            continue # local file has been modified
+
+        return src
+
+    return None
+
+def link(src,dest):
+    """Return True if dest has been created, else False."""
+
+    destdir=os.path.dirname(dest)
+    try:
+        if not os.path.exists(destdir):
+            os.makedirs(destdir)
+
+        if dedup_mode=='hardlink':
+            os.link(src,dest)
+        elif dedup_mode=='reflink':
+            (status,stdout,stderr)=sdutils.get_status_output(['cp','--reflink=always',src,dest])
+            if status!=0:
+                raise Exception(stderr.strip())
+        else:
+            assert False
+
+        return True
+    except Exception,e:
+        sdlog.info("SDDEDUPL-004","Dedup failed, file will be downloaded (mode=%s,dest=%s,reason=%s)"%(dedup_mode,dest,str(e)))
+
+        if dedup_mode=='reflink' and os.path.isfile(dest):
+            os.remove(dest) # remove partial copy
+
+        return False
+
+# init.
+
+dedup_mode=sdconfig.config.get('download','dedup_mode')
+if dedup_mode not in ['none','hardlink','reflink']:
+    raise SDException("SDDEDUPL-003","Incorrect value for 'download.dedup_mode' parameter (%s)"%dedup_mode)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('insertion_group_id',type=int)
+    args = parser.parse_args()
+
+    count=run(args.insertion_group_id)
+    sddb.conn.commit()
+
+    print "%i transfer(s) deduplicated"%count
@@ -23,7 +23,20 @@ def delete_dataset_transfers(d,conn=sddb.conn):
       no commit done here !
     """
     c = conn.cursor()
-    c.execute("update file set status=? where dataset_id=?",(sdconst.TRANSFER_STATUS_DELETE,d.dataset_id,))
+    c.execute("update file_data set status=? where dataset_id=?",(sdconst.TRANSFER_STATUS_DELETE,d.dataset_id,))
+    c.close()
+
+def delete_files(file_ids,conn=sddb.conn):
+    """Delete many files metadata at once.
+
+    note
+      no commit done here !
+    """
+    params=[(file_id,) for file_id in file_ids]
+
+    c = conn.cursor()
+    c.executemany("delete from selection__file where file_id=?",params) # also delete entries from junction table
+    c.executemany("delete from file_data where file_id=?",params)
     c.close()
 
 def purge_error_and_waiting_transfer(conn=sddb.conn):
@@ -36,7 +49,7 @@ def purge_error_and_waiting_transfer(conn=sddb.conn):
     """
     c = conn.cursor()
     c.execute("delete from selection__file where file_id in (select file_id from file where status in (?,?))",(sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING))
-    c.execute("delete from file where status in (?,?)",(sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING))
+    c.execute("delete from file_data where status in (?,?)",(sdconst.TRANSFER_STATUS_ERROR,sdconst.TRANSFER_STATUS_WAITING))
     nbr=c.rowcount
     c.close()
     conn.commit()
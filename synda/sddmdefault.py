@@ -15,7 +15,6 @@ Note
     sddmdefault means 'SynDa Download Manager default'
 """
 
-import os
 import time
 import Queue
 import sdapp
@@ -24,15 +23,15 @@ import sdconst
 import sdexception
 import sdlogon
 import sdconfig
-import sdtime
+import sddb
 import sdfiledao
 import sdevent
 import sdutils
-import sdtools
-import sdget
+import sddownload
 import sdtrace
 import sdnexturl
 import sdworkerutils
+import sdprofiler
 
 class Download():
     exception_occurs=False # this flag is used to stop the event loop if exception occurs in thread
@@ -49,151 +48,38 @@ class Download():
     @classmethod
     def start_transfer_script(cls,tr):
 
-        if sdconfig.fake_download:
-            tr.status=sdconst.TRANSFER_STATUS_DONE
-            tr.error_msg=""
-            tr.sdget_error_msg=""
-            return
-
-        # main
-        (tr.sdget_status,killed,tr.sdget_error_msg)=sdget.download(tr.url,
-                                                                   tr.get_full_local_path(),
-                                                                   debug=False,
-                                                                   http_client=sdconst.HTTP_CLIENT_WGET,
-                                                                   timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,
-                                                                   verbosity=0,
-                                                                   buffered=True,
-                                                                   hpss=hpss)
-
-
-        # check
-        assert tr.size is not None
-
-        # compute metrics
-        tr.end_date=sdtime.now()
-        tr.duration=sdtime.compute_duration(tr.start_date,tr.end_date)
-        tr.rate=sdtools.compute_rate(tr.size,tr.duration)
-
-        # post-processing
-        if tr.sdget_status==0:
-
-            if int(tr.size) != os.path.getsize(tr.get_full_local_path()):
-                sdlog.error("SDDMDEFA-002","size don't match (remote_size=%i,local_size=%i,local_path=%s)"%(int(tr.size),os.path.getsize(tr.get_full_local_path()),tr.get_full_local_path()))
-
-            # retrieve remote checksum
-            remote_checksum=tr.checksum
-
-            if remote_checksum!=None:
-                # remote checksum exists
-
-                # compute local checksum
-                checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5 # fallback to 'md5' (arbitrary)
-                local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
-
-                # compare local and remote checksum
-                if remote_checksum==local_checksum:
-                    # checksum is ok
-
-                    tr.status=sdconst.TRANSFER_STATUS_DONE
-                    tr.error_msg=""
-                else:
-                    # checksum is not ok
-
-                    if incorrect_checksum_action=="remove":
-                        tr.status=sdconst.TRANSFER_STATUS_ERROR
-                        tr.error_msg="File corruption detected: local checksum doesn't match remote checksum"
-
-                        # remove file from local repository
-                        sdlog.error("SDDMDEFA-155","checksum don't match: remove local file (local_checksum=%s,remote_checksum=%s,local_path=%s)"%(local_checksum,remote_checksum,tr.get_full_local_path()))
-                        try:
-                            os.remove(tr.get_full_local_path())
-                        except Exception,e:
-                            sdlog.error("SDDMDEFA-158","error occurs while removing local file (%s)"%tr.get_full_local_path())
-
-                    elif incorrect_checksum_action=="keep":
-                        sdlog.info("SDDMDEFA-157","local checksum doesn't match remote checksum (%s)"%tr.get_full_local_path())
-                        
-                        tr.status=sdconst.TRANSFER_STATUS_DONE
-                        tr.error_msg=""
-                    else:
-                        raise sdexception.FatalException("SDDMDEFA-507","incorrect value (%s)"%incorrect_checksum_action)
-            else:
-                # remote checksum is missing
-                # NOTE: we DON'T store the local checksum ('file' table contains only the *remote* checksum)
-
-                tr.status=sdconst.TRANSFER_STATUS_DONE
-                tr.error_msg=""
-        else:
-
-            # Remove file if exists
-            if os.path.isfile(tr.get_full_local_path()):
-                try:
-                    os.remove(tr.get_full_local_path())
-                except Exception,e:
-                    sdlog.error("SDDMDEFA-528","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
-
-            # Set status
-            if killed:
-
-                # OLD WAY
-                #tr.status=sdconst.TRANSFER_STATUS_WAITING
-                #tr.error_msg="Error occurs during download (killed). Transfer marked for retry."
-
-                # NEW WAY (TAG4JK4JJJ4454)
-                #
-                # We do not switch to 'waiting' anymore in this case, because
-                # most often, process is killed by the watchdog for good
-                # reason (e.g. the transfer process is frozen because of a
-                # non-fixable server side problem).
-                #
-                # If we set to 'waiting' here, it will be retried for ever
-                # without ending, causing synda to never complete a download
-                # task (download task here means all files added and marked for
-                # download  during a discovery step, e.g. 300 To of files).
-                #
-                # The downside of this new way of doing is that if the process
-                # has been killed for bad reason (sudden reboot, watchdog kills
-                # it because it was too slow or because of a temporary server
-                # failure, etc..), then it will not be automatically retried
-                # and will requires manual intervention.
-                #
-                # To solve this later problem, a high level manual retry system
-                # must be implemented (directly in synda, or using crontab).
-                #
-                tr.status=sdconst.TRANSFER_STATUS_ERROR
-                tr.error_msg="Download process has been killed"
-
-                sdlog.error("SDDMDEFA-190","%s (file_id=%d,url=%s,local_path=%s)"%(tr.error_msg,tr.file_id,tr.url,tr.local_path))
-            else:
-
-                if sdconfig.next_url_on_error:
-
-
-                    # Hack
-                    #
-                    # Notes
-                    #     - Only active for gridftp url to prevent having useless log message (i.e. there is currently no url switching mecanism for http url)
-                    #     - We need a log here so to have a trace of the original failed transfer (i.e. in case the url-switch succeed, the error msg will be reset)
-                    #
-                    transfer_protocol=sdutils.get_transfer_protocol(tr.url)
-                    if transfer_protocol==sdconst.TRANSFER_PROTOCOL_GRIDFTP:
-                        sdlog.info("SDDMDEFA-088","Transfer failed: try to use another url (%s)"%str(tr))
-
-
-                    result=sdnexturl.run(tr)
-                    if result:
-                        tr.status=sdconst.TRANSFER_STATUS_WAITING
-                        tr.error_msg=''
-                    else:
-                        tr.status=sdconst.TRANSFER_STATUS_ERROR
-                        tr.error_msg='Error occurs during download.'
-
-
-                else:
-                    tr.status=sdconst.TRANSFER_STATUS_ERROR
-                    tr.error_msg='Error occurs during download.'
-
-def end_of_transfer(tr):
+        killed=sddownload.run(tr)
+
+        if tr.status==sdconst.TRANSFER_STATUS_ERROR and tr.sdget_status!=0 and not killed:
+            if sdconfig.next_url_on_error:
+                next_url(tr)
+
+def next_url(tr):
+    """Switch to another url after a download failure.
+
+    If another url is found, the transfer is marked for retry.
+    """
+
+    # Hack
+    #
+    # Notes
+    #     - Only active for gridftp url to prevent having useless log message (i.e. there is currently no url switching mecanism for http url)
+    #     - We need a log here so to have a trace of the original failed transfer (i.e. in case the url-switch succeed, the error msg will be reset)
+    #
+    transfer_protocol=sdutils.get_transfer_protocol(tr.url)
+    if transfer_protocol==sdconst.TRANSFER_PROTOCOL_GRIDFTP:
+        sdlog.info("SDDMDEFA-088","Transfer failed: try to use another url (%s)"%str(tr))
+
+
+    result=sdnexturl.run(tr)
+    if result:
+        tr.status=sdconst.TRANSFER_STATUS_WAITING
+        tr.error_msg=''
+    else:
+        tr.status=sdconst.TRANSFER_STATUS_ERROR
+        tr.error_msg='Error occurs during download.'
+
+def end_of_transfer(tr,commit=True):
 
     # log
     if tr.status==sdconst.TRANSFER_STATUS_DONE:
@@ -210,12 +96,12 @@ def end_of_transfer(tr):
         sdlog.info("SDDMDEFA-102","Transfer failed (%s)"%str(tr))
 
     # update file
-    sdfiledao.update_file(tr)
+    sdfiledao.update_file(tr,commit=commit)
 
     # IMPORTANT: code below must run AFTER the file status has been saved in DB
 
     if tr.status==sdconst.TRANSFER_STATUS_DONE:
-        sdevent.file_complete_event(tr) # trigger 'file complete' event
+        sdevent.file_complete_event(tr,commit=commit) # trigger 'file complete' event
 
     # TODO: maybe do some rollback here in case fatal exception occurs in 'file_complete_event'
     #       (else, we have a file marked as 'done' with the corresponding event un-triggered)
@@ -230,22 +116,91 @@ def start_transfer_thread(tr):
     th.setDaemon(True) # if main thread quits, we kill running threads (note though that forked child processes are NOT killed and continue running after that !)
     th.start()
 
+@sdprofiler.timeit
+def end_of_transfer_batch(batch):
+    """Process a batch of completed transfers in one transaction.
+
+    Notes
+        - if a fatal error occurs for one transfer, the remaining transfers of
+          the batch are still processed (so they are not lost) and the
+          exception is raised once the batch is committed.
+        - if another error occurs, the batch transaction is rolled back (so
+          the failing transfer is not partially written) and the batch is
+          processed again, one transfer per transaction (see
+          end_of_transfer_one_by_one()).
+    """
+    fatal_exception=None
+
+    try:
+        for tr in batch:
+            try:
+                end_of_transfer(tr,commit=False)
+            except sdexception.FatalException, e:
+                fatal_exception=e
+
+        sddb.conn.commit() # file updates, dataset status changes and events are written together
+    except Exception, e:
+        sddb.conn.rollback()
+
+        sdlog.info("SDDMDEFA-112","Error occurs during end of transfer batch processing, batch is processed again one transfer at a time (%s)"%str(e))
+
+        end_of_transfer_one_by_one(batch)
+        return
+
+    sdlog.debug("SDDMDEFA-110","End of transfer batch processed (%d items)"%len(batch))
+
+    if fatal_exception is not None:
+        raise fatal_exception
+
+def end_of_transfer_one_by_one(batch):
+    """Process completed transfers, one transaction per transfer.
+
+    Note
+        all transfers are processed, then the first error (if any) is raised
+        (a transfer which fails is rolled back and stays in 'running' status,
+        as when the error occurred in the per-transfer mode)
+    """
+    fatal_exception=None
+    error=None
+
+    for tr in batch:
+        try:
+            end_of_transfer(tr,commit=False)
+            sddb.conn.commit()
+        except sdexception.FatalException, e:
+            sddb.conn.commit()
+            fatal_exception=e
+        except Exception, e:
+            sddb.conn.rollback()
+            sdlog.error("SDDMDEFA-113","Error occurs during end of transfer processing (%s,%s)"%(str(tr),str(e)))
+            if error is None:
+                error=e
+
+    if error is not None:
+        raise error
+
+    if fatal_exception is not None:
+        raise fatal_exception
+
 def transfers_end():
-    for i in range(8): # arbitrary
+    while True:
+
+        # drain queue
+        batch=[]
         try:
-            task=eot_queue.get_nowait() # raises Empty when empty
-            end_of_transfer(task)
-            eot_queue.task_done()
+            while len(batch)<eot_batch_size:
+                batch.append(eot_queue.get_nowait()) # raises Empty when empty
         except Queue.Empty, e:
             pass
-        except sdexception.FatalException, e:
-            raise
-        except:
 
-            # debug
-            #sdtrace.log_exception(stderr=True)
+        if len(batch)==0:
+            break
 
-            raise
+        try:
+            end_of_transfer_batch(batch)
+        finally:
+            for tr in batch:
+                eot_queue.task_done()
 
 def transfers_begin(transfers):
 
@@ -268,6 +223,5 @@ def fatal_exception():
 
 # module init.
 
-hpss=sdconfig.config.getboolean('download','hpss') # hpss & parse_output hack
 eot_queue=Queue.Queue() # eot means "End Of Task"
-incorrect_checksum_action=sdconfig.config.get('behaviour','incorrect_checksum_action')
+eot_batch_size=200 # max number of end-of-task items written in one transaction
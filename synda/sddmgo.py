@@ -28,78 +28,67 @@ import sdconst
 from sdexception import SDException,FatalException
 import sdconfig
 import sdtime
+import sddb
 import sdfiledao
 import sdevent
-import sdutils
 from globusonline.transfer import api_client
 from globusonline.transfer.api_client import x509_proxy
 
 def transfers_end():
 
-    _, _, access_token = api_client.goauth.get_access_token(username=globus_username, password=globus_password)
-    api = api_client.TransferAPIClient(username=globus_username, goauth=access_token)
+    api=get_api()
 
-    for task_id in globus_tasks:
+    for task_id in globus_tasks.keys(): # note: keys() returns a copy, as items are removed from the dict in the loop
+
+        try:
+            code, reason, data = api.task(task_id, fields="status")
+        except api_client.APIError as e:
+            sdlog.error("SDDMGLOB-029","Cannot retrieve Globus task status (task_id=%s,error=%s)"%(task_id,str(e)))
+            invalidate_api() # token may have been revoked, so we retrieve a new one on the next call
+            return
 
-        code, reason, data = api.task(task_id, fields="status")
         status = data['status']
 
         sdlog.debug("SDDMGLOB-016", "Checking the status of Globus transfer tasks, id: %s, status: %s" % (task_id, status))
+
+        if status == "ACTIVE":
+            continue
+        elif status == "INACTIVE":
+            # Reactivate both source and destination endpoints
+            activate_endpoint(api, globus_tasks[task_id]['src_endpoint'], force=True)
+            activate_endpoint(api, force=True)
+            continue
+
+        # task is over (SUCCEEDED or FAILED), so we update all its files in one transaction
+
+        if status == "FAILED":
+            # a task contains many files, so only files missing from the
+            # task successful transfers are set to error
+            successful_paths = get_successful_paths(api, task_id)
+        else:
+            successful_paths = None
+
         for item in globus_tasks[task_id]['items']:
             tr = item['tr']
-            if status == "SUCCEEDED":
+            if status == "SUCCEEDED" or (successful_paths is not None and os.path.normpath(item['dst_path']) in successful_paths):
 
                 assert tr.size is not None
 
                 if int(tr.size) != os.path.getsize(tr.get_full_local_path()):
                     sdlog.error("SDDMGLOB-002","size don't match (remote_size=%i,local_size=%i,local_path=%s)"%(int(tr.size),os.path.getsize(tr.get_full_local_path()),tr.get_full_local_path()))
 
-                # retrieve local and remote checksum
-                checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5
-                local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
-                remote_checksum=tr.checksum # retrieve remote checksum
-
-                if remote_checksum!=None:
-                    # remote checksum exists
-
-                    # compare local and remote checksum
-                    if remote_checksum==local_checksum:
-                        # checksum is ok
-
-                        tr.status = sdconst.TRANSFER_STATUS_DONE
-                    else:
-                        # checksum is not ok
+                # Note
+                #     checksum is not computed locally: tasks are submitted with
+                #     'verify_checksum' (and with the remote checksum as
+                #     'external_checksum', see add_item()), so a SUCCEEDED task
+                #     means that all the files checksums have been verified by Globus
 
-                        if incorrect_checksum_action=="remove":
-                            tr.status=sdconst.TRANSFER_STATUS_ERROR
-                            tr.error_msg="File corruption detected: local checksum doesn't match remote checksum"
+                tr.status = sdconst.TRANSFER_STATUS_DONE
+                tr.end_date=sdtime.now() # WARNING: this is not the real end of transfer date but the date when we ask the globus scheduler if the transfer is done.
+                tr.error_msg=""
+                sdlog.info("SDDMGLOB-101", "Transfer done (%s)" % str(tr))
 
-                            # remove file from local repository
-                            sdlog.error("SDDMGLOB-155","checksum don't match: remove local file (local_checksum=%s,remote_checksum=%s,local_path=%s)"%(local_checksum,remote_checksum,tr.get_full_local_path()))
-                            try:
-                                os.remove(tr.get_full_local_path())
-                            except Exception,e:
-                                sdlog.error("SDDMGLOB-158","error occurs while removing local file (%s)"%tr.get_full_local_path())
-
-                        elif incorrect_checksum_action=="keep":
-                            sdlog.info("SDDMGLOB-157","local checksum doesn't match remote checksum (%s)"%tr.get_full_local_path())
-                            
-                            tr.status=sdconst.TRANSFER_STATUS_DONE
-
-                        else:
-                            raise FatalException("SDDMGLOB-507","incorrect value (%s)"%incorrect_checksum_action)
-                else:
-                    # remote checksum is missing
-                    # NOTE: we DON'T store the local checksum ('file' table contains only the REMOTE checksum)
-
-                    tr.status = sdconst.TRANSFER_STATUS_DONE
-
-                if tr.status == sdconst.TRANSFER_STATUS_DONE:
-                    tr.end_date=sdtime.now() # WARNING: this is not the real end of transfer date but the date when we ask the globus scheduler if the transfer is done.
-                    tr.error_msg=""
-                    sdlog.info("SDDMGLOB-101", "Transfer done (%s)" % str(tr))
-
-            elif status == "FAILED":
+            else:
                 tr.status = sdconst.TRANSFER_STATUS_ERROR
                 tr.error_msg = "Error occurs during download."
 
@@ -112,66 +101,88 @@ def transfers_end():
                     except Exception,e:
                         sdlog.error("SDDMGLOB-528","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
 
-            elif status == "INACTIVE":
-                # Reactivate both source and destination endpoints
-                activate_endpoint(api, globus_tasks[task_id]['src_endpoint'])
-                activate_endpoint(api)
-            elif status == "ACTIVE":
-                pass
-
 
             # update file
-            sdfiledao.update_file(tr)
+            sdfiledao.update_file(tr,commit=False)
 
 
             if tr.status == sdconst.TRANSFER_STATUS_DONE:
 
-                # TODO: maybe add a try/except and do some rollback here in
-                # case fatal exception occurs in 'file_complete_event' (else,
-                # we have a file marked as 'done' with the corresponding event
-                # un-triggered)
-
                 # NOTE: code below must run AFTER the file status has been
                 # saved in DB (because it makes DB queries which expect the
                 # file status to exist)
 
-                sdevent.file_complete_event(tr) # trigger 'file complete' event
+                sdevent.file_complete_event(tr,commit=False) # trigger 'file complete' event
+
+        sddb.conn.commit()
 
+        # Remove the task from the list of active tasks
+        globus_tasks.pop(task_id, None)
 
-        # Remove the tasks from the lists of active tasks
-        if status == "SUCCEEDED" or status == "FAILED":
-            globus_tasks.pop(task_id, None)
+def get_successful_paths(api, task_id):
+    """Return destination paths of the files successfully transferred by the task.
+
+    Returns
+        set of paths (None if the list cannot be retrieved)
+    """
+    paths = set()
+    marker = None
+
+    while True:
+        kw = {} if marker is None else {'marker': marker}
+
+        try:
+            code, reason, data = api.task_successful_transfers(task_id, **kw)
+        except api_client.APIError as e:
+            sdlog.error("SDDMGLOB-031","Cannot retrieve Globus task successful transfers, all task's files are set to error (task_id=%s,error=%s)"%(task_id,str(e)))
+            return None
+
+        for transfer in data['DATA']:
+            paths.add(os.path.normpath(transfer['destination_path']))
+
+        marker = data.get('next_marker')
+        if marker is None:
+            break
+
+    sdlog.info("SDDMGLOB-032","Globus task failed (task_id=%s,successful_transfers_count=%d)"%(task_id,len(paths)))
+
+    return paths
 
 def transfers_begin(transfers):
 
-    # Activate the destination endpoint
+    if len(transfers)==0:
+        return
 
-    _, _, access_token = api_client.goauth.get_access_token(username=globus_username, password=globus_password)
-    api = api_client.TransferAPIClient(username=globus_username, goauth=access_token)
+    api=get_api()
+
+    # Activate the destination endpoint
     activate_endpoint(api)
 
     # Divide all files that are to be transferred into groups based on the source globus endpoint
+    # (i.e. one Globus task per (source endpoint, destination endpoint))
 
     globus_transfers = {}
 
     for tr in transfers:
         src_endpoint, src_path, path = map_to_globus(tr.url)
         local_path = tr.get_full_local_path()
-        if not src_endpoint in globus_transfers:
-            globus_transfers[src_endpoint] = {
+        key=(src_endpoint,dst_endpoint)
+        if not key in globus_transfers:
+            globus_transfers[key] = {
                     'src_endpoint': src_endpoint,
                     'items': []
             }
-        globus_transfers[src_endpoint]['items'].append({
+        globus_transfers[key]['items'].append({
                 'src_path': src_path,
                 'dst_path': local_path,
                 'tr': tr
         })
-        sdlog.info("SDDMGLOB-001", "src_endpoint: %s, src_path: %s, local_path: %s" % (src_endpoint, src_path, local_path))
+        sdlog.debug("SDDMGLOB-001", "src_endpoint: %s, src_path: %s, local_path: %s" % (src_endpoint, src_path, local_path))
 
     # Submit transfers
 
-    for src_endpoint in globus_transfers:
+    for key in globus_transfers:
+        src_endpoint=globus_transfers[key]['src_endpoint']
 
         # Activate the source endpoint
         activate_endpoint(api, src_endpoint)
@@ -182,11 +193,10 @@ def transfers_begin(transfers):
         if code != 200:
             raise FatalException()
         submission_id = data['value']
-        t = api_client.Transfer(submission_id, src_endpoint, dst_endpoint)
-        sdlog.info("SDDMGLOB-004", "Globus transfer, source endpoint: %s, destination endpoint: %s" % (src_endpoint, dst_endpoint))
-        for item in globus_transfers[src_endpoint]['items']:
-            t.add_item(item['src_path'], item['dst_path'])
-            sdlog.info("SDDMGLOB-005", "Globus transfer item, source path: %s, destination path: %s" % (item['src_path'], item['dst_path']))
+        t = api_client.Transfer(submission_id, src_endpoint, dst_endpoint, verify_checksum=True)
+        for item in globus_transfers[key]['items']:
+            add_item(t, item)
+            sdlog.debug("SDDMGLOB-005", "Globus transfer item, source path: %s, destination path: %s" % (item['src_path'], item['dst_path']))
 
         # Submit the transfer
 
@@ -195,9 +205,61 @@ def transfers_begin(transfers):
             sdlog.error("SDDMGLOB-006","Error: Cannot add a transfer: (%s, %s)"% (code, message))
             raise FatalException()
         task_id = data['task_id']
-        sdlog.info("SDDMGLOB-007", "Submitted Globus task, id: %s" % task_id)
-        globus_tasks[task_id] = globus_transfers[src_endpoint]
-
+        sdlog.info("SDDMGLOB-007", "Submitted Globus task (id=%s,source_endpoint=%s,destination_endpoint=%s,files_count=%d)" % (task_id, src_endpoint, dst_endpoint, len(globus_transfers[key]['items'])))
+        globus_tasks[task_id] = globus_transfers[key]
+
+def add_item(t, item):
+    """Add file to the Globus transfer.
+
+    Note
+        When the remote checksum is known, it is given to Globus which then
+        checks the downloaded file against it (if checksum doesn't match, the
+        file transfer fails). This is not done when 'incorrect_checksum_action'
+        is 'keep' (in this case, Globus only checks that source and destination
+        checksums match).
+    """
+    tr=item['tr']
+
+    checksum_algorithm=globus_checksum_algorithms.get(tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5)
+
+    if tr.checksum is not None and checksum_algorithm is not None and incorrect_checksum_action=="remove":
+        t.add_item(item['src_path'], item['dst_path'], external_checksum=tr.checksum, checksum_algorithm=checksum_algorithm)
+    else:
+        t.add_item(item['src_path'], item['dst_path'])
+
+def get_api():
+    """Return Globus API client.
+
+    Note
+        access token is cached, and only refreshed when near expiry
+    """
+    global api, token_expiry
+
+    if api is None or time.time() > (token_expiry - TOKEN_REFRESH_MARGIN):
+        _, _, access_token = api_client.goauth.get_access_token(username=globus_username, password=globus_password)
+        api = api_client.TransferAPIClient(username=globus_username, goauth=access_token)
+        token_expiry = get_token_expiry(access_token)
+
+        sdlog.info("SDDMGLOB-030","Globus access token retrieved (expiry=%s)"%datetime.fromtimestamp(token_expiry))
+
+    return api
+
+def invalidate_api():
+    global api
+    api=None
+    activation_dates.clear()
+
+def get_token_expiry(access_token):
+    """Return token expiry date (epoch).
+
+    Sample
+        un=foo|tokenid=7a2e...|expiry=1470150387|client_id=foo|...
+    """
+    m=re.search(r'expiry=(\d+)',access_token)
+    if m is not None:
+        return int(m.group(1))
+    else:
+        return time.time()+DEFAULT_TOKEN_LIFETIME
 
 def map_to_globus(url):
     parsed_url = urlparse.urlparse(url)
@@ -217,10 +279,18 @@ def map_to_globus(url):
     return src_endpoint, src_path, path
 
 
-def activate_endpoint(api, ep=None):
+def activate_endpoint(api, ep=None, force=False):
+    """
+    Note
+        activation is cached (i.e. endpoint is only activated again when
+        activation is old, or when 'force' is True (e.g. INACTIVE task))
+    """
     if ep is None:
         ep = dst_endpoint
 
+    if not force and ep in activation_dates and (time.time() - activation_dates[ep]) < ENDPOINT_REACTIVATION_INTERVAL:
+        return
+
     code, reason, reqs = api.endpoint_activation_requirements(ep, type='delegate_proxy')
     public_key = reqs.get_requirement_value("delegate_proxy", "public_key")
     proxy = x509_proxy.create_proxy_from_file(sdconfig.esgf_x509_proxy, public_key, lifetime_hours=72)
@@ -231,6 +301,8 @@ def activate_endpoint(api, ep=None):
         sdlog.error("SDDMGLOB-028","Error: Cannot activate the source endpoint: (%s)"% str(e))
         raise FatalException()
 
+    activation_dates[ep]=time.time()
+
 
 def can_leave():
     return True
@@ -332,6 +404,19 @@ if endpoints_filepath:
 
 incorrect_checksum_action=sdconfig.config.get('behaviour','incorrect_checksum_action')
 
+# Globus checksum algorithm names
+globus_checksum_algorithms={sdconst.CHECKSUM_TYPE_MD5:'MD5',sdconst.CHECKSUM_TYPE_SHA256:'SHA256'}
+
+# cached Globus API client (see get_api())
+TOKEN_REFRESH_MARGIN=3600          # seconds (token is refreshed one hour before expiry)
+DEFAULT_TOKEN_LIFETIME=12*3600     # seconds (used if expiry date cannot be retrieved from the token)
+api=None
+token_expiry=None
+
+# endpoints activation date (see activate_endpoint())
+ENDPOINT_REACTIVATION_INTERVAL=24*3600 # seconds (note: proxy lifetime is 72 hours)
+activation_dates={}
+
 '''
 All Globus active transfer tasks are stored by transfer_begin() in
 globus_tasks = {
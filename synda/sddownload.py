@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the transfer script (download and checksum check).
+
+Note
+    this module doesn't access the database, so it is used both by the
+    daemon (see sddmdefault) and by remote workers (see sdqueueworker)
+"""
+
+import os
+import argparse
+import sdapp
+import sdlog
+import sdconst
+import sdexception
+import sdconfig
+import sdtime
+import sdutils
+import sdtools
+import sdget
+
+def run(tr):
+    """Download the file and check it.
+
+    Returns
+        True if the download process has been killed, else False.
+
+    Note
+        on return, 'tr.status' is set to 'done' or 'error'
+    """
+
+    if sdconfig.fake_download:
+        tr.status=sdconst.TRANSFER_STATUS_DONE
+        tr.error_msg=""
+        tr.sdget_error_msg=""
+        return False
+
+    # main
+    (tr.sdget_status,killed,tr.sdget_error_msg)=sdget.download(tr.url,
+                                                               tr.get_full_local_path(),
+                                                               debug=False,
+                                                               http_client=sdconst.HTTP_CLIENT_WGET,
+                                                               timeout=sdconst.ASYNC_DOWNLOAD_HTTP_TIMEOUT,
+                                                               verbosity=0,
+                                                               buffered=True,
+                                                               hpss=hpss)
+
+
+    # check
+    assert tr.size is not None
+
+    # compute metrics
+    tr.end_date=sdtime.now()
+    tr.duration=sdtime.compute_duration(tr.start_date,tr.end_date)
+    tr.rate=sdtools.compute_rate(tr.size,tr.duration)
+
+    # post-processing
+    if tr.sdget_status==0:
+
+        if int(tr.size) != os.path.getsize(tr.get_full_local_path()):
+            sdlog.error("SDDMDEFA-002","size don't match (remote_size=%i,local_size=%i,local_path=%s)"%(int(tr.size),os.path.getsize(tr.get_full_local_path()),tr.get_full_local_path()))
+
+        # retrieve remote checksum
+        remote_checksum=tr.checksum
+
+        if remote_checksum!=None:
+            # remote checksum exists
+
+            # compute local checksum
+            checksum_type=tr.checksum_type if tr.checksum_type is not None else sdconst.CHECKSUM_TYPE_MD5 # fallback to 'md5' (arbitrary)
+            local_checksum=sdutils.compute_checksum(tr.get_full_local_path(),checksum_type)
+
+            # compare local and remote checksum
+            if remote_checksum==local_checksum:
+                # checksum is ok
+
+                tr.status=sdconst.TRANSFER_STATUS_DONE
+                tr.error_msg=""
+            else:
+                # checksum is not ok
+
+                if incorrect_checksum_action=="remove":
+                    tr.status=sdconst.TRANSFER_STATUS_ERROR
+                    tr.error_msg="File corruption detected: local checksum doesn't match remote checksum"
+
+                    # remove file from local repository
+                    sdlog.error("SDDMDEFA-155","checksum don't match: remove local file (local_checksum=%s,remote_checksum=%s,local_path=%s)"%(local_checksum,remote_checksum,tr.get_full_local_path()))
+                    try:
+                        os.remove(tr.get_full_local_path())
+                    except Exception,e:
+                        sdlog.error("SDDMDEFA-158","error occurs while removing local file (%s)"%tr.get_full_local_path())
+
+                elif incorrect_checksum_action=="keep":
+                    sdlog.info("SDDMDEFA-157","local checksum doesn't match remote checksum (%s)"%tr.get_full_local_path())
+
+                    tr.status=sdconst.TRANSFER_STATUS_DONE
+                    tr.error_msg="Local checksum doesn't match remote checksum: keep file (incorrect_checksum_action=keep)" # also prevents the file to be used as dedup source (see sddedup)
+                else:
+                    raise sdexception.FatalException("SDDMDEFA-507","incorrect value (%s)"%incorrect_checksum_action)
+        else:
+            # remote checksum is missing
+            # NOTE: we DON'T store the local checksum ('file' table contains only the *remote* checksum)
+
+            tr.status=sdconst.TRANSFER_STATUS_DONE
+            tr.error_msg=""
+    else:
+
+        # Remove file if exists
+        if os.path.isfile(tr.get_full_local_path()):
+            try:
+                os.remove(tr.get_full_local_path())
+            except Exception,e:
+                sdlog.error("SDDMDEFA-528","Error occurs during file suppression (%s,%s)"%(tr.get_full_local_path(),str(e)))
+
+        # Set status
+        if killed:
+
+            # OLD WAY
+            #tr.status=sdconst.TRANSFER_STATUS_WAITING
+            #tr.error_msg="Error occurs during download (killed). Transfer marked for retry."
+
+            # NEW WAY (TAG4JK4JJJ4454)
+            #
+            # We do not switch to 'waiting' anymore in this case, because
+            # most often, process is killed by the watchdog for good
+            # reason (e.g. the transfer process is frozen because of a
+            # non-fixable server side problem).
+            #
+            # If we set to 'waiting' here, it will be retried for ever
+            # without ending, causing synda to never complete a download
+            # task (download task here means all files added and marked for
+            # download  during a discovery step, e.g. 300 To of files).
+            #
+            # The downside of this new way of doing is that if the process
+            # has been killed for bad reason (sudden reboot, watchdog kills
+            # it because it was too slow or because of a temporary server
+            # failure, etc..), then it will not be automatically retried
+            # and will requires manual intervention.
+            #
+            # To solve this later problem, a high level manual retry system
+            # must be implemented (directly in synda, or using crontab).
+            #
+            tr.status=sdconst.TRANSFER_STATUS_ERROR
+            tr.error_msg="Download process has been killed"
+
+            sdlog.error("SDDMDEFA-190","%s (file_id=%d,url=%s,local_path=%s)"%(tr.error_msg,tr.file_id,tr.url,tr.local_path))
+        else:
+            tr.status=sdconst.TRANSFER_STATUS_ERROR
+            tr.error_msg='Error occurs during download.' # note: caller may switch to another url (see sddmdefault.next_url())
+
+    return killed
+
+# module init.
+
+hpss=sdconfig.config.getboolean('download','hpss') # hpss & parse_output hack
+incorrect_checksum_action=sdconfig.config.get('behaviour','incorrect_checksum_action')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('url')
+    parser.add_argument('local_path')
+    parser.add_argument('-s','--size',type=int,required=True)
+    parser.add_argument('-c','--checksum',default=None)
+    parser.add_argument('-t','--checksum_type',default=sdconst.CHECKSUM_TYPE_MD5)
+    args = parser.parse_args()
+
+    from sdtypes import File
+    tr=File(file_id=0,url=args.url,local_path=args.local_path,size=args.size,checksum=args.checksum,checksum_type=args.checksum_type,start_date=sdtime.now())
+
+    run(tr)
+
+    print "status=%s,error_msg=%s"%(tr.status,tr.error_msg)
@@ -11,6 +11,7 @@
 
 """This module contains encoding functions."""
 
+import codecs
 import unicodedata
 
 def fix_mixed_encoding_ISO8859_UTF8(buf):
@@ -18,3 +19,17 @@ def fix_mixed_encoding_ISO8859_UTF8(buf):
     buf=buf.decode('utf-8', 'ignore').encode('utf-8')
 
     return buf
+
+def fix_mixed_encoding_ISO8859_UTF8_stream(chunks):
+    """Same as fix_mixed_encoding_ISO8859_UTF8(), for a stream of chunks.
+
+    Note
+        an incremental decoder is used, so multi-byte characters split
+        across two chunks are kept
+    """
+    decoder=codecs.getincrementaldecoder('utf-8')('ignore')
+
+    for chunk in chunks:
+        yield decoder.decode(chunk).encode('utf-8')
+
+    yield decoder.decode('',final=True).encode('utf-8')
@@ -29,7 +29,7 @@ import sdfiledao
 import sddatasetdao
 import sdutils
 import sdconfig
-import sdtimestamp
+import sdbatchtimestamp
 from sdtypes import Dataset,File
 import sdconst
 import sdsqlutils
@@ -38,6 +38,7 @@ import sdtime
 import sdpipelineprocessing
 from sdexception import SDException
 import sdprogress
+import sddedup
 
 def run(metadata,timestamp_right_boundary=None):
     """
@@ -78,6 +79,10 @@ def run(metadata,timestamp_right_boundary=None):
 
         fix_timestamp()
 
+        sdlog.info("SDENQUEU-105","Deduplicate transfers..")
+
+        sddedup.run(insertion_group_id)
+
         sddb.conn.commit() # final commit (we do all insertion/update in one transaction).
 
         if sdconfig.progress:
@@ -230,7 +235,7 @@ def fix_timestamp():
     # sdquicksearch (also in this case, sdsearch can still be used for the top
     # level search (so resulting with a mix of sdsearch and sdquicksearch)).
     #
-    datasets_without_timestamp=sddatasetdao.get_datasets(timestamp=None) # retrieve datasets with timestamp not set
+    datasets_without_timestamp=sddatasetdao.get_datasets_pagination(timestamp=None) # retrieve datasets with timestamp not set (generator, as there may be a lot of them)
 
     # HACK 2
     recent_datasets_without_timestamp=keep_recent_datasets(datasets_without_timestamp)
@@ -238,17 +243,11 @@ def fix_timestamp():
     if len(recent_datasets_without_timestamp)>0:
         sdlog.info("SDENQUEU-004","Retrieving timestamp for %i dataset(s)."%len(recent_datasets_without_timestamp))
 
-        for dataset_without_timestamp in recent_datasets_without_timestamp:
-
-            try:
-                sdtimestamp.fill_missing_dataset_timestamp(dataset_without_timestamp)
-            except SDException, e:
-                if e.code in ['SDTIMEST-011','SDTIMEST-008','SDTIMEST-800']:
-                    sdlog.info("SDENQUEU-909","Timestamp not set for '%s' dataset (%s)"%(dataset_without_timestamp.dataset_functional_id,str(e)))
-                else:
-                    # fatal error come here
-
-                    raise
+        # datasets are retrieved in batch (many datasets per search-API query)
+        #
+        # note: we don't commit here (all insertion/update are done in one transaction, see run())
+        #
+        sdbatchtimestamp.fill_missing_dataset_timestamps(recent_datasets_without_timestamp,commit=False)
 
     else:
         # This case is when new files are enqueued, but only on existing
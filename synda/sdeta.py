@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module forecasts transfers completion time (ETA).
+
+Model
+    - rates of transfers done during the last RATE_PERIOD hours are
+      collected for each data node (if a data node has not enough samples,
+      rates from all data nodes are used)
+    - the remaining work of each pending file is its size divided by its
+      data node rate (i.e. transfer-seconds)
+    - transfers are started in priority order, and files with the same
+      priority are interleaved (checksum order), so a group of files
+      (selection, dataset) is complete once all files with a priority higher
+      than or equal to the lowest priority of the group are done
+    - remaining work is shared between download slots (concurrency)
+    - the confidence range is computed using the first and third quartiles
+      of rates
+
+Notes
+    - running transfers are counted as if they had just started
+    - the forecast assumes the daemon is running with the current
+      concurrency setting, and doesn't take fair-share or locality ordering
+      into account
+    - a data node is flagged as 'slowdown' when its rate during the last
+      RECENT_RATE_PERIOD hours is less than SLOWDOWN_RATIO times its rate
+      during the last RATE_PERIOD hours
+"""
+
+import json
+import datetime
+import argparse
+import humanize
+from tabulate import tabulate
+import sdapp
+import sdconfig
+import sdconst
+import sdtime
+import sdfilequery
+import sdhistorydao
+
+RATE_PERIOD=24          # hours
+RECENT_RATE_PERIOD=1    # hours
+MAX_RATE_SAMPLES=10000
+MIN_NODE_SAMPLES=5      # below this samples count, rates from all data nodes are used for the data node
+SLOWDOWN_RATIO=0.5
+
+def get_eta():
+    """Return forecast as a dict (which can be serialized as JSON).
+
+    Note
+        'eta', 'eta_min' and 'eta_max' are in seconds (None if no transfer
+        has been done recently, as no rate is available)
+    """
+    now=sdtime.now()
+
+    concurrency=get_concurrency()
+
+    # rates
+
+    samples=sdfilequery.get_recent_rates(sdtime.substract_hour(now,RATE_PERIOD),MAX_RATE_SAMPLES)
+    recent_date=sdtime.substract_hour(now,RECENT_RATE_PERIOD)
+
+    all_rates=[rate for (data_node,rate,end_date) in samples]
+    global_stats=get_rate_stats(all_rates)
+
+    node_rates={}
+    node_recent_rates={}
+    for (data_node,rate,end_date) in samples:
+        node_rates.setdefault(data_node,[]).append(rate)
+        if end_date>recent_date:
+            node_recent_rates.setdefault(data_node,[]).append(rate)
+
+    # remaining work
+
+    selections=sdhistorydao.get_insertion_group_selections(sdconst.ACTION_ADD)
+
+    tiers={} # remaining work by priority
+    groups={'total':{},'selections':{},'datasets':{},'data_nodes':{}}
+
+    for (dataset_id,dataset_functional_id,insertion_group_id,data_node,priority,files_count,size) in sdfilequery.get_remaining_transfers():
+        size=size if size is not None else 0
+
+        rates=node_rates.get(data_node,[])
+        stats=get_rate_stats(rates) if len(rates)>=MIN_NODE_SAMPLES else global_stats
+
+        work=compute_work(size,stats)
+        tiers[priority]=add_work(tiers.get(priority),work)
+
+        for (group_name,key) in [('total',None),('selections',selections.get(insertion_group_id)),('datasets',(dataset_id,dataset_functional_id)),('data_nodes',data_node)]:
+            g=groups[group_name].setdefault(key,{'remaining_files':0,'remaining_size':0,'priority':priority})
+            g['remaining_files']+=files_count
+            g['remaining_size']+=size
+            g['priority']=min(g['priority'],priority)
+
+    # cumulative work by priority (i.e. work which must be done before all files with this priority are done)
+    cumulative_work={}
+    work=None
+    for priority in sorted(tiers,reverse=True):
+        work=add_work(work,tiers[priority])
+        cumulative_work[priority]=work
+
+    # build result
+
+    result={'date':now,
+            'concurrency':concurrency,
+            'running':sdfilequery.transfer_running_count(),
+            'rate_period':RATE_PERIOD,
+            'rate_samples':len(samples)}
+
+    g=groups['total'].get(None,{'remaining_files':0,'remaining_size':0,'priority':None})
+    result['total']=build_item({},g,cumulative_work,concurrency)
+
+    result['selections']=[build_item({'selection':key},g,cumulative_work,concurrency) for key,g in sorted(groups['selections'].items())]
+    result['datasets']=[build_item({'dataset_id':key[0],'dataset_functional_id':key[1]},g,cumulative_work,concurrency) for key,g in sorted(groups['datasets'].items())]
+
+    # data nodes (including those without pending transfer, so slowdown can be spotted)
+    result['data_nodes']=[]
+    for data_node in sorted(set(node_rates.keys())|set(groups['data_nodes'].keys())):
+        g=groups['data_nodes'].get(data_node,{'remaining_files':0,'remaining_size':0})
+
+        stats=get_rate_stats(node_rates.get(data_node,[]))
+        recent_stats=get_rate_stats(node_recent_rates.get(data_node,[]))
+
+        slowdown=False
+        if len(node_recent_rates.get(data_node,[]))>=MIN_NODE_SAMPLES and stats is not None:
+            slowdown=recent_stats[1]<SLOWDOWN_RATIO*stats[1]
+
+        result['data_nodes'].append({'data_node':data_node,
+                                     'remaining_files':g['remaining_files'],
+                                     'remaining_size':g['remaining_size'],
+                                     'rate_samples':len(node_rates.get(data_node,[])),
+                                     'rate':stats[1] if stats is not None else None,
+                                     'recent_rate':recent_stats[1] if recent_stats is not None else None,
+                                     'slowdown':slowdown})
+
+    return result
+
+def build_item(item,group,cumulative_work,concurrency):
+    item['remaining_files']=group['remaining_files']
+    item['remaining_size']=group['remaining_size']
+
+    work=cumulative_work.get(group['priority'])
+    if work is None or work[1] is None:
+        (item['eta_min'],item['eta'],item['eta_max'])=(None,None,None)
+        item['completion_date']=None
+    else:
+        (item['eta_min'],item['eta'],item['eta_max'])=[int(w/concurrency) for w in work]
+        item['completion_date']=(datetime.datetime.now()+datetime.timedelta(seconds=item['eta'])).strftime('%Y-%m-%d %H:%M:%S')
+
+    return item
+
+def compute_work(size,stats):
+    """Return (optimistic,expected,pessimistic) transfer-seconds needed to download 'size' bytes."""
+    if stats is None:
+        return (None,None,None)
+
+    (rate_low,rate_median,rate_high)=stats
+    return (float(size)/rate_high,float(size)/rate_median,float(size)/rate_low)
+
+def add_work(w1,w2):
+    if w1 is None:
+        return w2
+
+    return tuple(a+b if a is not None and b is not None else None for a,b in zip(w1,w2))
+
+def get_rate_stats(rates):
+    """Return (first quartile,median,third quartile), or None if no rate."""
+    if len(rates)==0:
+        return None
+
+    li=sorted(rates)
+    return (li[len(li)/4],li[len(li)/2],li[(len(li)*3)/4])
+
+def get_concurrency():
+    """Return download slots count (same as in 'sdtask' module)."""
+    if sdconfig.config.getboolean('module','globustransfer'):
+        return sdconfig.config.getint('globustransfer','max_running_files')
+    else:
+        return sdconfig.config.getint('download','max_parallel_download')
+
+def format_eta(item):
+    if item['eta'] is None:
+        return 'unknown'
+
+    return "%s (%s - %s)"%(humanize.naturaldelta(item['eta']),humanize.naturaldelta(item['eta_min']),humanize.naturaldelta(item['eta_max']))
+
+def print_eta(result,selections=True):
+    """Print forecast summary (used by 'synda queue' and 'synda watch')."""
+    total=result['total']
+
+    if total['remaining_files']==0:
+        return
+
+    print ""
+    print "Estimated completion: %s (concurrency=%i)"%(format_eta(total),result['concurrency'])
+
+    if total['eta'] is None:
+        print "No transfer done during the last %i hours, ETA cannot be computed."%result['rate_period']
+
+    if selections and len(result['selections'])>1:
+        li=[[s['selection'] if s['selection'] is not None else '-',s['remaining_files'],humanize.naturalsize(s['remaining_size'],gnu=False),format_eta(s)] for s in result['selections']]
+        print ""
+        print tabulate(li,headers=['selection','files','size','ETA'],tablefmt="plain")
+
+    slowdowns=[n['data_node'] for n in result['data_nodes'] if n['slowdown']]
+    if len(slowdowns)>0:
+        print ""
+        print "Slowdown detected on: %s"%', '.join(slowdowns)
+
+def print_json(result):
+    print json.dumps(result,indent=4,sort_keys=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j','--json',action='store_true')
+    args = parser.parse_args()
+
+    result=get_eta()
+
+    if args.json:
+        print_json(result)
+    else:
+        print_eta(result)
@@ -41,7 +41,25 @@ def file_deleted_event(d):
     sdeventdao.add_event(event,commit=commit)
 """
 
-def file_complete_event(tr):
+def get_output12_datasets(dataset_path):
+    """Return output1 and output2 datasets corresponding to the (product-less) dataset path.
+
+    Returns
+        (d1,d2) if both products exist, else None
+    """
+    (ds_path_output1,ds_path_output2)=sdproduct.get_output12_dataset_paths(dataset_path)
+
+    d1=sddatasetdao.get_dataset(path=ds_path_output1)
+    if d1 is None:
+        return None
+
+    d2=sddatasetdao.get_dataset(path=ds_path_output2)
+    if d2 is None:
+        return None
+
+    return (d1,d2)
+
+def file_complete_event(tr,commit=True):
     """
     Note
         when a variable is complete, we know for sure that all variable's files are fetched,
@@ -63,15 +81,15 @@ def file_complete_event(tr):
         event.filename_pattern=tr.filename
         event.crea_date=sdtime.now()
         event.priority=sdconst.DEFAULT_PRIORITY
-        sdeventdao.add_event(event,commit=True)
+        sdeventdao.add_event(event,commit=commit)
 
     # update dataset (all except 'latest' flag)
     tr.dataset.status=sddatasetflag.compute_dataset_status(tr.dataset)
     tr.dataset.last_done_transfer_date=tr.end_date
-    sddatasetdao.update_dataset(tr.dataset)
+    sddatasetdao.update_dataset(tr.dataset,commit=commit)
 
     if sdvariable.is_variable_complete(tr.dataset.dataset_id,tr.variable):
-        variable_complete_event(tr.project,tr.model,tr.dataset,tr.variable) # trigger 'variable complete' event
+        variable_complete_event(tr.project,tr.model,tr.dataset,tr.variable,commit=commit) # trigger 'variable complete' event
 
 def variable_complete_event(project,model,dataset,variable,commit=True):
     sdlog.log("SYDEVENT-002","'variable_complete_event' triggered (%s,%s)"%(dataset.dataset_functional_id,variable),event_triggered_log_level)
@@ -89,27 +107,26 @@ def variable_complete_event(project,model,dataset,variable,commit=True):
 
     # cascade 1 (trigger dataset event)
     if dataset.status==sdconst.DATASET_STATUS_COMPLETE:
-        dataset_complete_event(project,model,dataset) # trigger 'dataset complete' event
+        dataset_complete_event(project,model,dataset,commit=commit) # trigger 'dataset complete' event
 
     # cascade 2 (trigger variable output12 event)
     if project=='CMIP5':
 
         assert '/output/' not in dataset.path
 
-        (ds_path_output1,ds_path_output2)=sdproduct.get_output12_dataset_paths(dataset.path)
-        if sddatasetdao.exists_dataset(path=ds_path_output1) and sddatasetdao.exists_dataset(path=ds_path_output2):
+        output12_datasets=get_output12_datasets(dataset.path)
+        if output12_datasets is not None:
 
-            d1=sddatasetdao.get_dataset(path=ds_path_output1)
-            d2=sddatasetdao.get_dataset(path=ds_path_output2)
+            (d1,d2)=output12_datasets
 
             if sdvariable.is_variable_complete(d1.dataset_id,variable) and sdvariable.is_variable_complete(d2.dataset_id,variable):
                 dataset_pattern=sdproduct.replace_output12_product_with_wildcard(dataset.local_path)
-                variable_complete_output12_event(project,model,dataset_pattern,variable) # trigger event (cross dataset event)
+                variable_complete_output12_event(project,model,dataset_pattern,variable,commit=commit) # trigger event (cross dataset event)
         else:
             # we also trigger the 'variable_complete_output12_event' event if the variable is over one product only (because if only one product, then output12 event is also true)
 
             dataset_pattern=sdproduct.replace_output12_product_with_wildcard(dataset.local_path)
-            variable_complete_output12_event(project,model,dataset_pattern,variable) # trigger event (cross dataset event)
+            variable_complete_output12_event(project,model,dataset_pattern,variable,commit=commit) # trigger event (cross dataset event)
 
 def variable_complete_output12_event(project,model,dataset_pattern,variable,commit=True):
     sdlog.log("SYDEVENT-003","'variable_complete_output12_event' triggered (%s,%s)"%(dataset_pattern,variable),event_triggered_log_level)
@@ -152,7 +169,7 @@ def dataset_complete_event(project,model,dataset,commit=True):
     if not old_latest:
         # old state is not latest
 
-        sddatasetflag.update_latest_flag(dataset) # warning: this method modifies the dataset object in memory (and in database too)
+        sddatasetflag.update_latest_flag(dataset,commit=commit) # warning: this method modifies the dataset object in memory (and in database too)
     else:
         # nothing to do concerning the 'latest' flag as the current dataset is already the latest
         # (the latest flag can only be switched off (i.e. to False) by *other* datasets versions, not by himself !!!)
@@ -178,13 +195,15 @@ def dataset_complete_event(project,model,dataset,commit=True):
         non_latest_dataset_complete_event(project,model,dataset.local_path,commit=commit)
 
 
+    # retrieve output1 and output2 datasets once for cascade 3 and 4
+    if project=='CMIP5':
+        output12_datasets=get_output12_datasets(dataset.path)
+
     # cascade 3 (trigger output12 dataset complete event)
     if project=='CMIP5':
-        (ds_path_output1,ds_path_output2)=sdproduct.get_output12_dataset_paths(dataset.path)
-        if sddatasetdao.exists_dataset(path=ds_path_output1) and sddatasetdao.exists_dataset(path=ds_path_output2):
+        if output12_datasets is not None:
 
-            d1=sddatasetdao.get_dataset(path=ds_path_output1)
-            d2=sddatasetdao.get_dataset(path=ds_path_output2)
+            (d1,d2)=output12_datasets
 
             if d1.status==sdconst.DATASET_STATUS_COMPLETE and d2.status==sdconst.DATASET_STATUS_COMPLETE:
                 dataset_pattern=sdproduct.replace_output12_product_with_wildcard(dataset.local_path)
@@ -204,11 +223,9 @@ def dataset_complete_event(project,model,dataset,commit=True):
 
     # cascade 4 (trigger latest output12 dataset complete event)
     if project=='CMIP5':
-        (ds_path_output1,ds_path_output2)=sdproduct.get_output12_dataset_paths(dataset.path)
-        if sddatasetdao.exists_dataset(path=ds_path_output1) and sddatasetdao.exists_dataset(path=ds_path_output2):
+        if output12_datasets is not None:
 
-            d1=sddatasetdao.get_dataset(path=ds_path_output1)
-            d2=sddatasetdao.get_dataset(path=ds_path_output2)
+            (d1,d2)=output12_datasets
 
             if d1.status==sdconst.DATASET_STATUS_COMPLETE and d2.status==sdconst.DATASET_STATUS_COMPLETE:
                 if d1.latest and d2.latest:
@@ -353,11 +370,10 @@ def dataset_latest_event(project,model,dataset_path,commit=True):
     if project=='CMIP5':
         assert '/output/' not in dataset_path
 
-        (ds_path_output1,ds_path_output2)=sdproduct.get_output12_dataset_paths(dataset_path)
-        if sddatasetdao.exists_dataset(path=ds_path_output1) and sddatasetdao.exists_dataset(path=ds_path_output2):
+        output12_datasets=get_output12_datasets(dataset_path)
+        if output12_datasets is not None:
 
-            d1=sddatasetdao.get_dataset(path=ds_path_output1)
-            d2=sddatasetdao.get_dataset(path=ds_path_output2)
+            (d1,d2)=output12_datasets
 
             if d1.latest and d2.latest:
                 dataset_pattern=sdproduct.replace_output12_product_with_wildcard(dataset_path)
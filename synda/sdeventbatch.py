@@ -46,7 +46,7 @@ def file_():
     sdmodifyquery.wipeout_datasets_flags(status=sdconst.DATASET_STATUS_EMPTY)
 
     # mimic end of transfer
-    dbpagination=sddbpagination.DBPagination()
+    dbpagination=sddbpagination.DBKeysetPagination()
     files=dbpagination.get_files()
     while len(files)>0:
         for f in files:
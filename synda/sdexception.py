@@ -27,6 +27,10 @@ class FileNotFoundException(SDException):
     pass
 class HttpUrlNotFoundException(SDException):
     pass
+class ServerErrorException(SDException):
+    pass
+class ConnectionErrorException(SDException):
+    pass
 class NoTransferWaitingException(SDException):
     pass
 class FatalException(SDException):
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the weighted fair-share transfer scheduler.
+
+Transfers are grouped by project, then by selection file (i.e. the selection
+file used to install the transfer, which is retrieved from the 'history'
+table using the 'insertion_group_id' column).
+
+Each time a download slot is free, the project with the lowest running share
+(i.e. running transfers count divided by project weight) is chosen, then in
+this project, the selection with the lowest running share. The transfer with
+the highest priority in this group is then started.
+
+Notes
+    - weights are set using 'download.fairshare_project_weights' and
+      'download.fairshare_selection_weights' parameters (default weight is 1)
+    - 'priority' is only used inside a group (a high priority selection
+      cannot starve other selections anymore)
+    - list of groups with waiting transfers is cached (see GROUPS_REFRESH_INTERVAL),
+      so new selections may wait a little before being scheduled
+"""
+
+import time
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdfiledao
+import sdfilequery
+import sddatasetdao
+import sdhistorydao
+from sdexception import SDException,NoTransferWaitingException
+
+GROUPS_REFRESH_INTERVAL=60 # seconds
+
+class Groups():
+    """Contains groups with waiting transfers.
+
+    Structure
+        { project: { selection: [ insertion_group_id, ... ] } }
+    """
+
+    def __init__(self):
+        self.groups={}
+        self.refresh_date=None
+
+    def is_expired(self):
+        return self.refresh_date is None or (time.time()-self.refresh_date)>GROUPS_REFRESH_INTERVAL
+
+    def refresh(self):
+        self.groups={}
+
+        selections=sdhistorydao.get_insertion_group_selections(sdconst.ACTION_ADD)
+        for (project,insertion_group_id) in sdfilequery.get_transfer_groups(sdconst.TRANSFER_STATUS_WAITING):
+            selection=selections.get(insertion_group_id)
+            self.groups.setdefault(project,{}).setdefault(selection,[]).append(insertion_group_id)
+
+        self.refresh_date=time.time()
+
+    def remove(self,project,selection,insertion_group_id):
+        """Remove group once all its transfers have been started."""
+        insertion_group_ids=self.groups[project][selection]
+        insertion_group_ids.remove(insertion_group_id)
+
+        if len(insertion_group_ids)==0:
+            del self.groups[project][selection]
+
+            if len(self.groups[project])==0:
+                del self.groups[project]
+
+    def is_empty(self):
+        return len(self.groups)==0
+
+def get_one_waiting_transfer():
+    """Return the next transfer to start, according to fair-share policy.
+
+    Raises
+        NoTransferWaitingException
+    """
+
+    refreshed=False
+    if groups.is_expired():
+        groups.refresh()
+        refreshed=True
+
+    tr=get_next_transfer()
+
+    if tr is None and not refreshed:
+        # maybe new transfers have been added since last refresh
+
+        groups.refresh()
+        tr=get_next_transfer()
+
+    if tr is None:
+        raise NoTransferWaitingException()
+
+    # retrieve the dataset
+    tr.dataset=sddatasetdao.get_dataset(dataset_id=tr.dataset_id)
+
+    return tr
+
+def get_next_transfer():
+    """Return None if there is no more waiting transfer in cached groups."""
+
+    (project_shares,selection_shares)=get_running_shares()
+
+    while not groups.is_empty():
+
+        project=choose(groups.groups.keys(),project_shares,project_weights)
+        selection=choose(groups.groups[project].keys(),selection_shares,selection_weights,project)
+
+        # a selection may have been installed many times (i.e. many insertion groups)
+        best=None
+        for insertion_group_id in list(groups.groups[project][selection]):
+            f=sdfiledao.get_one_waiting_file(project,insertion_group_id)
+
+            if f is None:
+                groups.remove(project,selection,insertion_group_id) # no more waiting transfer in this group
+            elif best is None or (f.priority,best.checksum)>(best.priority,f.checksum): # same order as 'priority DESC, checksum'
+                best=f
+
+        if best is not None:
+            sdlog.debug("SDFAIRSH-002","Transfer chosen (project=%s,selection=%s,file_id=%i)"%(project,selection,best.file_id))
+            return best
+
+    return None
+
+def choose(keys,shares,weights,project=None):
+    """Return the key with the lowest running share (i.e. running count divided by weight)."""
+
+    def share(key):
+        count=shares.get((project,key) if project is not None else key,0)
+        return float(count+1)/weights.get(key,1)
+
+    return min(sorted(keys),key=share) # note: keys are sorted so to be deterministic if equality
+
+def get_running_shares():
+    """Return running transfers count by project and by (project,selection)."""
+    project_shares={}
+    selection_shares={}
+
+    selections=sdhistorydao.get_insertion_group_selections(sdconst.ACTION_ADD)
+    for (project,insertion_group_id),count in sdfilequery.get_transfer_groups(sdconst.TRANSFER_STATUS_RUNNING).iteritems():
+        selection=selections.get(insertion_group_id)
+
+        project_shares[project]=project_shares.get(project,0)+count
+        selection_shares[(project,selection)]=selection_shares.get((project,selection),0)+count
+
+    return (project_shares,selection_shares)
+
+def parse_weights(value,name):
+    """
+    Sample
+        'CMIP6:1,CORDEX:4' => {'CMIP6':1.0,'CORDEX':4.0}
+    """
+    weights={}
+
+    for item in value.split(','):
+        item=item.strip()
+
+        if item=='':
+            continue
+
+        try:
+            (key,weight)=item.rsplit(':',1)
+            weight=float(weight)
+        except ValueError:
+            raise SDException("SDFAIRSH-001","Incorrect format for '%s' parameter (%s)"%(name,item))
+
+        if weight<=0:
+            raise SDException("SDFAIRSH-003","Weight must be positive in '%s' parameter (%s)"%(name,item))
+
+        weights[key.strip()]=weight
+
+    return weights
+
+# init.
+
+project_weights=parse_weights(sdconfig.config.get('download','fairshare_project_weights'),'download.fairshare_project_weights')
+selection_weights=parse_weights(sdconfig.config.get('download','fairshare_selection_weights'),'download.fairshare_selection_weights')
+
+groups=Groups()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    args = parser.parse_args()
+
+    (project_shares,selection_shares)=get_running_shares()
+
+    print "running transfers by project: %s"%project_shares
+    print "running transfers by selection: %s"%selection_shares
+
+    try:
+        tr=get_one_waiting_transfer()
+        print "next transfer: %s"%tr.file_functional_id
+    except NoTransferWaitingException,e:
+        print "no waiting transfer"
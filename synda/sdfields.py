@@ -9,9 +9,31 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module contains search-API 'fields' related routines."""
+"""This module contains search-API 'fields' related routines.
+
+Notes
+    - when 'fields' is not set by the caller, the query planner (get_fields)
+      computes the minimal fields list from the search type and the action
+      (i.e. the pipeline stages and output columns which will process the
+      result)
+    - all fields are retrieved for actions which print or keep every
+      attribute (e.g. show, dump), and when the local path is built by user
+      code ('homemade' local path format)
+    - search-API ignores non-existent fields, so fields which only exist for
+      some projects can be listed
+"""
 
 import sdconst
+import sdtools
+
+# actions for which the attributes used downstream are known
+PLANNED_ACTIONS={sdconst.SA_TYPE_FILE:['install','stat','remove','get','search'],
+                 sdconst.SA_TYPE_DATASET:['search'],
+                 sdconst.SA_TYPE_AGGREGATION:['search']}
+
+PIPELINE_FIELDS={sdconst.SA_TYPE_FILE:sdconst.FILE_PIPELINE_FIELDS,
+                 sdconst.SA_TYPE_DATASET:sdconst.DATASET_PIPELINE_FIELDS,
+                 sdconst.SA_TYPE_AGGREGATION:sdconst.DATASET_PIPELINE_FIELDS} # aggregations are listed from datasets (see sdtsaction)
 
 def get_timestamp_fields():
     return ','.join(sdconst.TIMESTAMP_FIELDS)
@@ -40,4 +62,50 @@ def get_all_dataset_fields():
 def get_all_variable_fields():
     return '*'
 
+def get_fields(type_,action,local_path_format=None,local_path_drs_template=None):
+    """Return the minimal fields list needed to process the result.
+
+    Returns
+        fields list (['*'] if all fields are needed)
+    """
+    if action not in PLANNED_ACTIONS.get(type_,[]):
+        return ['*']
+
+    fields=list(PIPELINE_FIELDS[type_])
+
+    template_fields=get_local_path_fields(local_path_format,local_path_drs_template)
+    if template_fields is None:
+        return ['*']
+
+    for field in template_fields:
+        if field not in fields:
+            fields.append(field)
+
+    return fields
+
+def get_dataset_attrs_fields(local_path_format=None,local_path_drs_template=None):
+    """Return fields needed to copy dataset attributes to files (see sdadddsattr)."""
+
+    template_fields=get_local_path_fields(local_path_format,local_path_drs_template)
+    if template_fields is None:
+        return ['*']
+
+    return ['instance_id']+template_fields+sdconst.REQUIRED_FIELDS
+
+def get_local_path_fields(local_path_format,local_path_drs_template):
+    """Return fields used to build the local path (None if unknown)."""
+
+    if local_path_format is None:
+        local_path_format=sdconst.DEFAULT_LOCAL_PATH_FORMAT
+
+    if local_path_format=='homemade':
+        return None
+    elif local_path_format in ('custom','customvar'):
+        if local_path_drs_template is None:
+            return None # error is raised downstream (see sdlocalpathutils)
+
+        return sdtools.extract_keys_from_template(local_path_drs_template)
+    else:
+        return []
+
 # init.
@@ -15,24 +15,37 @@ import sdapp
 from sdexception import SDException
 import sddb
 import sdconfig
+import sdconst
 import sdsqlutils
-from sdtypes import File
+import sddbpagination
+from sdtypes import File,FileRow
 
 def update_transfer_last_access_date(i__date,i__transfer_id,conn=sddb.conn):
     # no commit here (will be committed in updatelastaccessdate())
     c = conn.cursor()
-    c.execute("update file set last_access_date=? where file_id = ?",(i__date,i__transfer_id))
+    c.execute("update file_data set last_access_date=? where file_id = ?",(i__date,i__transfer_id))
     c.close()
 
 def add_file(file,commit=True,conn=sddb.conn):
     keys_to_insert=['status', 'crea_date', 'url', 'local_path', 'filename', 'file_functional_id', 'tracking_id', 'priority', 'checksum', 'checksum_type', 'size', 'variable', 'project', 'model', 'data_node', 'dataset_id', 'insertion_group_id', 'timestamp']
-    return sdsqlutils.insert(file,keys_to_insert,commit,conn)
+    sdsqlutils.insert(file,keys_to_insert,False,conn)
+
+    # 'lastrowid' is not set when inserting through 'file' view, so we retrieve the id using the functional primary key
+    c = conn.cursor()
+    c.execute("select file_id from file_data where file_functional_id=?",(file.file_functional_id,))
+    id_=c.fetchone()[0]
+    c.close()
+
+    if commit:
+        conn.commit()
+
+    return id_
 
 def delete_file(tr,commit=True,conn=sddb.conn):
     c = conn.cursor()
 
     c.execute("delete from selection__file where file_id=?",(tr.file_id,)) # also delete entries from junction table
-    c.execute("delete from file where file_id=?",(tr.file_id,))
+    c.execute("delete from file_data where file_id=?",(tr.file_id,)) # 'file_data' is used here (and not 'file' view), so rowcount is set
     # note that we don't delete entries (if any) from post_processing tables (this will be done in a batch procedure which will be manually executed from time to time)
 
     # TAGKRE45343J54K5JK
@@ -88,7 +101,7 @@ def get_file(file_functional_id,conn=sddb.conn):
     c.execute("select * from file where file_functional_id = ?", (file_functional_id,))
     rs=c.fetchone()
     if rs<>None:
-        t=sdsqlutils.get_object_from_resultset(rs,File)
+        t=FileRow(rs)
     c.close()
 
     return t
@@ -99,8 +112,15 @@ def get_files(limit=None,conn=sddb.conn,**search_constraints): # don't change ar
       - one search constraint must be given at least
       - if 'limit' is None, retrieve all records matching the search constraints
     """
-    files=[]
+    return list(get_files_generator(limit,conn,**search_constraints))
+
+def get_files_generator(limit=None,conn=sddb.conn,**search_constraints): # don't change arguments order here
+    """Same as get_files(), but yield files instead of returning a list.
 
+    Note
+        Don't write in the database until the generator is exhausted (see
+        sdlargequery for more info).
+    """
     search_placeholder=sdsqlutils.build_search_placeholder(search_constraints)
     orderby="priority DESC, checksum"
     limit_clause="limit %i"%limit if limit is not None else ""
@@ -108,13 +128,86 @@ def get_files(limit=None,conn=sddb.conn,**search_constraints): # don't change ar
     c = conn.cursor()
     q="select * from file where %s order by %s %s"%(search_placeholder,orderby,limit_clause)
     c.execute(q,search_constraints)
+
+    for rs in sdsqlutils.fetch_rows(c):
+        yield FileRow(rs)
+
+def get_done_files_by_checksum(checksum,checksum_type,conn=sddb.conn):
+    """Return files with the given checksum which have been successfully transferred.
+
+    Note
+        files marked as done without checksum verification (i.e. with an
+        error message, e.g. 'lfae_mode=keep' or 'incorrect_checksum_action=keep')
+        are not returned
+    """
+    c = conn.cursor()
+    c.execute("select * from file where checksum = ? and checksum_type = ? and status = ? and (error_msg is null or error_msg = '')",(checksum,checksum_type,sdconst.TRANSFER_STATUS_DONE))
+    li=[FileRow(rs) for rs in c.fetchall()]
+    c.close()
+
+    return li
+
+def get_one_waiting_file(project,insertion_group_id,conn=sddb.conn):
+    """Return the waiting file with the highest priority for the given (project,insertion_group_id) group, or None if the group has no waiting file.
+
+    Note
+        'project' may be None (files without project are grouped together, see sdfilequery.get_transfer_groups())
+    """
+    f=None
+
+    c = conn.cursor()
+    c.execute(get_one_waiting_file_query(project),get_one_waiting_file_params(project,insertion_group_id))
     rs=c.fetchone()
-    while rs!=None:
-        files.append(sdsqlutils.get_object_from_resultset(rs,File))
-        rs=c.fetchone()
+    if rs is not None:
+        f=FileRow(rs)
     c.close()
 
-    return files
+    return f
+
+def get_one_waiting_file_query(project):
+    """Return get_one_waiting_file() query ('file_data' is used, so the project is matched using its dictionary id and the composite index is used)."""
+    if project is None:
+        project_clause="project_id is null"
+    else:
+        project_clause="project_id = (select id from dictionary where value = ?)"
+
+    return "select * from file where file_id = (select file_id from file_data where status = ? and %s and insertion_group_id is ? order by priority DESC, checksum limit 1)"%project_clause
+
+def get_one_waiting_file_params(project,insertion_group_id):
+    if project is None:
+        return (sdconst.TRANSFER_STATUS_WAITING,insertion_group_id)
+    else:
+        return (sdconst.TRANSFER_STATUS_WAITING,project,insertion_group_id)
+
+def get_active_directories_count(conn=sddb.conn):
+    """Return how many target directories contain running transfers."""
+    c = conn.cursor()
+    c.execute("select count(distinct local_path_prefix_id) from file_data where status = ?",(sdconst.TRANSFER_STATUS_RUNNING,)) # 'local_path_prefix_id' identifies the file directory
+    count=c.fetchone()[0]
+    c.close()
+
+    return count
+
+def get_one_waiting_file_in_active_directories(conn=sddb.conn):
+    """Return the waiting file with the highest priority located in a directory which contains running transfers, or None if not found."""
+    return get_one_waiting_file_near_running_transfers('local_path_prefix_id',conn)
+
+def get_one_waiting_file_in_active_datasets(conn=sddb.conn):
+    """Return the waiting file with the highest priority located in a dataset which contains running transfers, or None if not found."""
+    return get_one_waiting_file_near_running_transfers('dataset_id',conn)
+
+def get_one_waiting_file_near_running_transfers(column,conn=sddb.conn):
+    f=None
+
+    c = conn.cursor()
+    c.execute("""select * from file where file_id = (select file_id from file_data where status = ? and %s in (select %s from file_data where status = ?)
+                                                     order by priority DESC, checksum limit 1)"""%(column,column),(sdconst.TRANSFER_STATUS_WAITING,sdconst.TRANSFER_STATUS_RUNNING))
+    rs=c.fetchone()
+    if rs is not None:
+        f=FileRow(rs)
+    c.close()
+
+    return f
 
 def get_dataset_files(d,conn=sddb.conn,limit=None):
     """
@@ -123,8 +216,10 @@ def get_dataset_files(d,conn=sddb.conn,limit=None):
     Args
         limit: if set, returns only a subset of datasets's files
     """
-    files=[]
+    return list(get_dataset_files_generator(d,conn,limit))
 
+def get_dataset_files_generator(d,conn=sddb.conn,limit=None):
+    """Same as get_dataset_files(), but yield files instead of returning a list."""
     c = conn.cursor()
 
     limit_clause="limit %i"%limit if limit is not None else ""
@@ -133,23 +228,31 @@ def get_dataset_files(d,conn=sddb.conn,limit=None):
 
     c.execute(q)
 
-    rs=c.fetchone()
-    while rs!=None:
-        files.append(sdsqlutils.get_object_from_resultset(rs,File))
-        rs=c.fetchone()
+    for rs in sdsqlutils.fetch_rows(c):
+        yield FileRow(rs)
 
-    c.close()
+def get_files_pagination(conn=sddb.conn,**search_constraints):
+    """Same as get_files_generator(), but using keyset pagination.
+
+    Notes
+        - use this func to loop over a large number of files (constant memory)
+        - database can be modified while looping (e.g. update_file())
+        - files are returned in 'file_id' order
+    """
+    return sddbpagination.get_files(conn=conn,**search_constraints)
 
-    return files
+def get_dataset_files_pagination(d,conn=sddb.conn):
+    """Same as get_dataset_files(), but using keyset pagination (files are returned in 'file_id' order)."""
+    return sddbpagination.get_files(conn=conn,dataset_id=d.dataset_id)
 
 def update_file(file,commit=True,conn=sddb.conn):
     keys=['status','error_msg','sdget_status','sdget_error_msg','start_date','end_date','duration','rate']
 
     # 'url' need to be present when 'sdnexturl' feature is enabled
     if sdconfig.next_url_on_error:
-        keys.append('url')
+        conn.execute("update file set url=? where file_id=?",(file.url,file.file_id)) # encoded column, so update is done through 'file' view
 
-    rowcount=sdsqlutils.update(file,keys,commit,conn)
+    rowcount=sdsqlutils.update(file,keys,commit,conn,tablename='file_data') # 'file_data' is used here (and not 'file' view), so rowcount is set
 
     # check
     if rowcount==0:
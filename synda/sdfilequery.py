@@ -30,7 +30,7 @@ def transfer_status_count(status=None,conn=sddb.conn):
     assert status!=None
 
     c=conn.cursor()
-    q="select count(1) from file where status = '%s'" % status
+    q="select count(1) from file_data where status = '%s'" % status
     c.execute(q)
     rs=c.fetchone()
 
@@ -41,13 +41,64 @@ def transfer_status_count(status=None,conn=sddb.conn):
     c.close()
     return count
 
+def get_transfer_groups(status,conn=sddb.conn):
+    """Return files count for each (project,insertion_group_id) group with the given transfer status.
+
+    Returns
+        dict (key=(project,insertion_group_id), value=files count)
+    """
+    di={}
+    c = conn.cursor()
+    c.execute("select p.value, f.insertion_group_id, count(1) from file_data f left join dictionary p on p.id=f.project_id where f.status = ? group by f.project_id, f.insertion_group_id",(status,)) # 'file_data' is used here (and not 'file' view), so 'group by' is resolved by index
+    for rs in c.fetchall():
+        di[(rs[0],rs[1])]=rs[2]
+    c.close()
+    return di
+
+def get_selection_files(selection_filename,conn=sddb.conn):
+    """Return (file_functional_id,status) of files inserted by the given selection file (files marked for deletion excluded).
+
+    Note
+        files are linked to the selection file through their insertion group (see 'history' table)
+    """
+    c = conn.cursor()
+    c.execute("select f.file_functional_id, f.status from history h join file_data f on f.insertion_group_id=h.insertion_group_id where h.action = ? and h.selection_filename = ? and f.status != ?",(sdconst.ACTION_ADD,selection_filename,sdconst.TRANSFER_STATUS_DELETE))
+    li=[(rs[0],rs[1]) for rs in c.fetchall()]
+    c.close()
+    return li
+
+def get_recent_rates(since,limit,conn=sddb.conn):
+    """Return (data_node,rate,end_date) of transfers done since the given date (most recent first)."""
+    c = conn.cursor()
+    c.execute("select dn.value, f.rate, f.end_date from file_data f left join dictionary dn on dn.id=f.data_node_id where f.end_date > ? and f.status = ? and f.rate > 0 order by f.end_date desc limit ?",(since,sdconst.TRANSFER_STATUS_DONE,limit))
+    li=[(rs[0],rs[1],rs[2]) for rs in c.fetchall()]
+    c.close()
+    return li
+
+def get_remaining_transfers(conn=sddb.conn):
+    """Return files count and size of pending transfers ('waiting' and 'running'), by dataset, insertion group, data node and priority.
+
+    Returns
+        list of (dataset_id,dataset_functional_id,insertion_group_id,data_node,priority,files_count,size)
+    """
+    c = conn.cursor()
+    c.execute("""select f.dataset_id, d.dataset_functional_id, f.insertion_group_id, dn.value, f.priority, count(1), sum(f.size)
+                 from file_data f
+                 left join dictionary dn on dn.id=f.data_node_id
+                 left join dataset d on d.dataset_id=f.dataset_id
+                 where f.status in (?,?)
+                 group by f.dataset_id, f.insertion_group_id, f.data_node_id, f.priority""",(sdconst.TRANSFER_STATUS_WAITING,sdconst.TRANSFER_STATUS_RUNNING))
+    li=[tuple(rs) for rs in c.fetchall()]
+    c.close()
+    return li
+
 def get_download_status(project=None):
     li=[]
 
     c = sddb.conn.cursor()
 
     if project is None:
-        q="select status,count(*),sum(size) from file group by status"
+        q="select status,count(*),sum(size) from file_data group by status"
         c.execute(q)
     else:
         q="select status,count(*),sum(size) from file where project=? group by status"
@@ -71,9 +122,9 @@ def count_dataset_files(d,file_status,conn=sddb.conn):
     c = conn.cursor()
 
     if file_status is None:
-        c.execute("select count(1) from file where dataset_id=?",(d.dataset_id,))
+        c.execute("select count(1) from file_data where dataset_id=?",(d.dataset_id,))
     else:
-        c.execute("select count(1) from file where dataset_id=? and status=?",(d.dataset_id,file_status,))
+        c.execute("select count(1) from file_data where dataset_id=? and status=?",(d.dataset_id,file_status,))
 
     rs=c.fetchone()
     nbr=rs[0]
@@ -16,8 +16,7 @@ from sdtools import print_stderr
 def esgf_search_api(args):
     import sdrfile, sddeferredafter
 
-    # tuning: note that we don't reduce the number of field returned here.
-    # Maybe change that to optimise download time / reduce bandwidth footprint.
+    # note: search-API 'fields' are set by the query planner (see sdfields)
 
     sddeferredafter.add_default_parameter(args.stream,'limit',args.limit)
 
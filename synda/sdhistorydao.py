@@ -68,4 +68,14 @@ def get_latest_history_line(selection_filename,action,conn=sddb.conn):
 
     return di
 
+def get_insertion_group_selections(action,conn=sddb.conn):
+    """Return dict with selection filename for each insertion group (key=insertion_group_id)."""
+    di={}
+    c = conn.cursor()
+    c.execute("select insertion_group_id, selection_filename from history where action = ? and insertion_group_id is not null",(action,))
+    for rs in c.fetchall():
+        di[rs[0]]=rs[1]
+    c.close()
+    return di
+
 # module init.
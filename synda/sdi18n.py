@@ -214,3 +214,16 @@ m0025="""sudo service synda start"""
 m0026="""synda daemon start"""
 
 m0027="You must either be root, or part of the synda group to perform this command."
+
+m0028="""  'maintain' can be used while the daemon is running (integrity check,
+  statistics update, incremental vacuum and WAL checkpoint are done in
+  small steps). With SQLite older than 3.33, the integrity check is skipped
+  while the daemon is running. 'vacuum' rebuilds the database file and
+  enables incremental vacuum: the daemon must be stopped.
+"""
+
+m0029="""  Download transfers claimed from the queue service of the central Synda
+  daemon ('module.queue_service' must be true on the central host). Files
+  are written in the shared storage ('core.data_path'). The worker runs in
+  foreground (on CTRL-C, running transfers are completed before exiting).
+"""
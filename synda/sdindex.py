@@ -9,11 +9,53 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
+import os
+import time
+import json
 import random
+import atexit
+import threading
+import argparse
+import urlparse
+import sdapp
 import sdconfig
+import sdlog
 import sdtools
+from sdexception import SDException
 
-"""This module contains index related routines."""
+"""This module contains index related routines.
+
+Notes
+    - index nodes health (latency and error rate) is updated after each
+      search-API call (see sdnetutils), and periodically by the daemon
+      (probe)
+    - latency and error rate are exponentially weighted moving averages
+      (recent calls weight more)
+    - an index node is unhealthy when its error rate reaches
+      HEALTH_MAX_ERROR_RATE (i.e. one error after successful calls is
+      enough to fail over)
+    - health older than HEALTH_TTL is ignored (so an unhealthy node gets
+      another chance, even if the daemon is not running)
+    - health is stored in a small JSON file, so it is kept between runs and
+      shared between synda processes
+"""
+
+HEALTH_ALPHA=0.5          # moving average weight of the latest call
+HEALTH_MAX_ERROR_RATE=0.5
+HEALTH_TTL=3600           # seconds
+HEALTH_SAVE_INTERVAL=30   # seconds
+PROBE_TIMEOUT=30          # seconds
+
+class IndexProbeThread(threading.Thread):
+    """Probe index nodes periodically (daemon only)."""
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+
+    def run(self):
+        while True:
+            probe_all()
+            time.sleep(probe_interval)
 
 def get_index_list():
     return sdtools.split_values(sdconfig.config.get('index','indexes'))
@@ -24,6 +66,195 @@ def get_default_index():
 def get_random_index():
     return random.choice(index_host_list)
 
+def get_best_index():
+    """Return the healthy index node with the lowest latency (default index if health routing is disabled)."""
+
+    if not health_routing:
+        return get_default_index()
+
+    hosts=get_healthy_hosts(get_candidates())
+
+    if len(hosts)==0:
+        sdlog.warning("SYDINDEX-001","No healthy index node found, using default index (%s)"%get_default_index())
+        return get_default_index()
+
+    return hosts[0]
+
+def get_failover_index(tried):
+    """Return the next index node to use once 'tried' index nodes failed (None if no healthy index node remains)."""
+
+    if not health_routing:
+        return None
+
+    hosts=get_healthy_hosts([host for host in get_candidates() if host not in tried])
+
+    if len(hosts)==0:
+        return None
+
+    return hosts[0]
+
+def get_healthy_index_list(hosts):
+    """Return healthy index nodes from 'hosts' list (all hosts if none is healthy)."""
+
+    if not health_routing:
+        return hosts
+
+    li=[host for host in hosts if is_healthy(host)]
+
+    return li if len(li)>0 else hosts
+
+def get_candidates():
+    """Return index nodes which can be used for a distributed search (default index first)."""
+    return [get_default_index()]+[host for host in index_host_list if host!=get_default_index()]
+
+def get_healthy_hosts(hosts):
+    """Return healthy hosts sorted by latency (hosts with unknown latency come last, in the given order)."""
+
+    li=[host for host in hosts if is_healthy(host)]
+
+    return sorted(li,key=lambda host: (get_latency(host) is None,get_latency(host),hosts.index(host)))
+
+def is_healthy(host):
+    return get_health(host)['error_rate']<HEALTH_MAX_ERROR_RATE
+
+def get_latency(host):
+    return get_health(host)['latency']
+
+def get_health(host):
+    """Return host health (neutral health if unknown or outdated)."""
+
+    with health_lock:
+        return get_health_nolock(host)
+
+def get_health_nolock(host):
+    h=health.get(host)
+
+    if h is None or time.time()-h['date']>HEALTH_TTL:
+        return {'latency':None,'error_rate':0.0,'date':None}
+
+    return dict(h)
+
+def record_success(url,duration):
+    record(url,duration,False)
+
+def record_error(url):
+    record(url,None,True)
+
+def record(url,duration,error):
+    """Update index node health (calls to other hosts are ignored)."""
+    global dirty
+
+    host=urlparse.urlsplit(url).netloc
+    if host not in get_candidates():
+        return
+
+    with health_lock:
+        h=get_health_nolock(host)
+
+        h['error_rate']=HEALTH_ALPHA*(1.0 if error else 0.0)+(1-HEALTH_ALPHA)*h['error_rate']
+
+        if not error:
+            h['latency']=duration if h['latency'] is None else HEALTH_ALPHA*duration+(1-HEALTH_ALPHA)*h['latency']
+
+        h['date']=time.time()
+
+        health[host]=h
+        dirty=True
+
+    if error:
+        sdlog.info("SYDINDEX-002","Index node error recorded (host=%s,error_rate=%.2f)"%(host,h['error_rate']))
+
+    if time.time()-last_save>HEALTH_SAVE_INTERVAL:
+        save()
+
+def probe_all():
+    """Send a light query to each index node (health is updated by sdnetutils)."""
+    import sdnetutils,sdurlutils
+
+    for host in get_candidates():
+        url=sdurlutils.add_solr_output_format("http://%s/esg-search/search?type=Dataset&limit=0&distrib=false"%host)
+
+        try:
+            sdnetutils.HTTP_GET(url,PROBE_TIMEOUT)
+        except Exception,e:
+            sdlog.info("SYDINDEX-003","Index node probe failed (host=%s,%s)"%(host,str(e)))
+
+    save()
+
+def load():
+    global health
+
+    if not os.path.isfile(health_file):
+        return
+
+    try:
+        with open(health_file) as fh:
+            health=json.load(fh)
+    except Exception,e:
+        sdlog.warning("SYDINDEX-004","Error occurs while reading index health file (%s,%s)"%(health_file,str(e)))
+
+def save():
+    global last_save,dirty
+
+    with health_lock:
+        if not dirty:
+            return
+
+        buf=json.dumps(health)
+        last_save=time.time()
+        dirty=False
+
+    try:
+        tmp_file="%s.%d"%(health_file,os.getpid())
+        with open(tmp_file,'w') as fh:
+            fh.write(buf)
+        os.rename(tmp_file,health_file) # atomic (file is shared between synda processes)
+    except Exception,e:
+        sdlog.warning("SYDINDEX-005","Error occurs while writing index health file (%s,%s)"%(health_file,str(e)))
+
+def start_probe():
+    """Start index nodes background probe (daemon only)."""
+
+    if not health_routing or probe_interval==0:
+        return
+
+    sdlog.info("SYDINDEX-006","Starting index nodes probe..")
+
+    th=IndexProbeThread()
+    th.setDaemon(True)
+    th.start()
+
 # init.
 
 index_host_list=get_index_list()
+
+health_routing=sdconfig.config.getboolean('index','health_routing')
+probe_interval=sdconfig.config.getint('index','health_probe_interval')
+health_file=sdconfig.index_health_file
+
+if probe_interval<0:
+    raise SDException("SYDINDEX-010","Incorrect value for 'index.health_probe_interval' parameter (%i)"%probe_interval)
+
+health={} # host => {'latency':seconds,'error_rate':ratio,'date':epoch}
+health_lock=threading.Lock()
+last_save=time.time()
+dirty=False # True if health has been updated since last save
+
+if health_routing:
+    load()
+    atexit.register(save)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p','--probe',action='store_true',help='Probe index nodes')
+    args = parser.parse_args()
+
+    if args.probe:
+        probe_all()
+
+    for host in get_candidates():
+        h=get_health(host)
+        latency='%.2fs'%h['latency'] if h['latency'] is not None else '-'
+        print "%s (healthy=%s,latency=%s,error_rate=%.2f)"%(host,is_healthy(host),latency,h['error_rate'])
+
+    print "best index: %s"%get_best_index()
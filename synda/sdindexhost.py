@@ -32,7 +32,7 @@ def run(facets_groups,parallel=True,index_host=None,dry_run=False):
       index_host: index host from arguments (overwrite 'searchapi_host' in facets_groups, if any)
 
     Notes
-        - If 'searchapi_host' parameter is missing both in func arguments and in 'facets_groups', a random index node is used.
+        - If 'searchapi_host' parameter is missing both in func arguments and in 'facets_groups', the best healthy index node is used (see sdindex).
         - 'searchapi_host' or 'index_host' is the index host used as url HOST (i.e. the search-API service host where the query will be submitted)
         - 'index_node' is the index host used as url PARAMETER (i.e. the SolR parameter)
     """
@@ -56,7 +56,7 @@ def run(facets_groups,parallel=True,index_host=None,dry_run=False):
             # print a working query on stdout, not a query with fake host)
 
             if 'searchapi_host' not in facets_group:
-                facets_group['searchapi_host']=sdindex.get_default_index()
+                facets_group['searchapi_host']=sdindex.get_best_index()
         else:
             if parallel:
                 # in parallel mode, we just check that index host is not set (should always be the case)
@@ -64,7 +64,7 @@ def run(facets_groups,parallel=True,index_host=None,dry_run=False):
                 assert 'searchapi_host' not in facets_group
             else:
                 if 'searchapi_host' not in facets_group:
-                    facets_group['searchapi_host']=sdindex.get_default_index()
+                    facets_group['searchapi_host']=sdindex.get_best_index()
 
                 #sdlog.debug("SDIDXHST-001","Using %s"%facets_group['searchapi_host'],stderr=False,logfile=True)
 
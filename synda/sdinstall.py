@@ -19,7 +19,11 @@ import sdexception
 import sdlog
 from sdtools import print_stderr
 
-def run(args,metadata=None):
+def run(args,metadata=None,discovery=None):
+    """
+    Args
+        discovery: sdwatermark.Discovery object (if set, watermark is stored once metadata is processed)
+    """
     import syndautils
 
     syndautils.check_daemon()
@@ -35,8 +39,13 @@ def run(args,metadata=None):
         if args.selection_file is not None:
             sdlog.info("SYNDINST-006","Process '%s'"%args.selection_file)
 
+        # timestamp boundaries restrict the discovery, so no watermark is stored in this case
+        if args.timestamp_left_boundary is None and args.timestamp_right_boundary is None:
+            import sdwatermark
+            discovery=sdwatermark.get_discovery(args.selection_file,args.incremental)
+
         try:
-            metadata=syndautils.file_full_search(args)
+            metadata=syndautils.file_full_search(args,discovery=discovery)
         except sdexception.EmptySelectionException, e:
             print_stderr('No dataset will be installed, upgraded, or removed.')
             return (0,0)
@@ -50,11 +59,13 @@ def run(args,metadata=None):
 
     interactive=not args.yes
 
-    return _install(metadata,interactive,args.timestamp_right_boundary)
+    return _install(metadata,interactive,args.timestamp_right_boundary,discovery)
 
-def _install(metadata,interactive,timestamp_right_boundary=None):
+def _install(metadata,interactive,timestamp_right_boundary=None,discovery=None):
     import sddaemon
 
+    if discovery is not None:
+        discovered_metadata=metadata # watermark is computed from all discovered files (not only new ones)
 
     # Compute total files stat
     count_total=metadata.count()
@@ -83,6 +94,9 @@ def _install(metadata,interactive,timestamp_right_boundary=None):
         else:
             sdlog.info("SYNDINST-028",'Nothing to install (0 file found).',stderr=interactive)
 
+        if discovery is not None:
+            discovery.complete(discovered_metadata)
+
         return (0,0)
 
     # ask user for confirmation
@@ -106,6 +120,9 @@ def _install(metadata,interactive,timestamp_right_boundary=None):
         import sdenqueue
         sdenqueue.run(metadata,timestamp_right_boundary)
 
+        if discovery is not None:
+            discovery.complete(discovered_metadata)
+
         if interactive:
             print_stderr("%i file(s) enqueued"%count_new)
             print_stderr("You can follow the download using 'synda watch' and 'synda queue' commands")
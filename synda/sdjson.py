@@ -13,11 +13,16 @@
 
 import argparse
 import json
+import re
 import sdapp
 import sdlog
 from sdexception import SDException
 from sdtypes import Item
 
+DOCS_REGEX=re.compile(r'"docs"\s*:\s*\[')
+NUM_FOUND_REGEX=re.compile(r'"numFound"\s*:\s*(\d+)')
+SEPARATOR_REGEX=re.compile(r'[\s,]*')
+
 def parse_parameters(buffer):
     try:
         xmldoc = json.loads(buffer)
@@ -58,87 +63,140 @@ def parse_parameters(buffer):
 
 def parse_metadata(buffer):
     """Parse result for both type (Dataset and File)."""
-    xmldoc=None
-    l__files=[] # can be real file or dataset, depending on "type" input facet
 
     if buffer is None:
         raise SDException("SYNDAXML-001","Buffer is empty")
 
-    try:
-        xmldoc = json.loads(buffer)
-    except Exception, e:
-        raise
-
-
-    # --- parse header and footer nodes (header name is "responseHeader" and footer name is "facet_counts") --- #
-
-    # retrieve header & footer (those nodes always exist)
-    header_node=xmldoc["responseHeader"]
-    footer_node=xmldoc["facet_counts"]
-
-    # parse footer
-    fields_node=footer_node["facet_fields"]
-
-    # --- parse body node --- #
-
-    body_node=xmldoc["response"]
-
-    # retrieve "numFound" attribute
-    l__num_found=int(body_node["numFound"]) # int/unicode conversion
-
-    doc_nodes=body_node["docs"]
-
-    for doc_node in doc_nodes: # file/dataset loop
-        l__dict={}
-
-        """
-        SAMPLE
-
-        {
-        "id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601|esgf2.dkrz.de",
-        "data_node":"esgf2.dkrz.de",
-        "instance_id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601",
-        "size":23697992,
-        "type":"Dataset",
-        "variable":["sbl",
-          "snc",
-          "snd",
-          "snm",
-          "snw",
-          "tsn"],
-        "score":1.0
-        },
-        """
-
-        for attr_name,attr_value in doc_node.iteritems():
-
-            # TODO: maybe move transformation below in a downstream
-            #       step (e.g. in the generic pipeline) so to keep
-            #       original xml stream not altered when using dump
-            #       action in raw mode.
-
-            if attr_name=="url":
-                # url array have three subitems (GRIDFTP, HTTPServer and openDAP)
-                # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
-
-                for item in attr_value:
-                    url=item.split('|')[0] # keep only first field (i.e. keep only the file url)
-                    protocol=item.split('|')[-1]
-
-                    if protocol.upper()=="HTTPSERVER":
-                        l__dict['url_http']=url
-                    elif protocol.upper()=="GRIDFTP":
-                        l__dict['url_gridftp']=url
-                    elif protocol.upper()=="OPENDAP":
-                        l__dict['url_opendap']=url
-            else:
-                l__dict[attr_name]=attr_value
-
-        l__files.append(l__dict)
+    info={}
+    l__files=list(parse_metadata_stream([buffer],info)) # can be real file or dataset, depending on "type" input facet
 
     sdlog.debug("SYNDJSON-014","files-count=%d"%len(l__files))
 
-    return {'files':l__files,'num_found':l__num_found,'num_result':len(l__files)}
+    return {'files':l__files,'num_found':info['num_found'],'num_result':len(l__files)}
+
+def parse_metadata_stream(chunks,info):
+    """Parse result for both type (Dataset and File) as bytes arrive.
+
+    Args
+        chunks: response buffer pieces (iterable)
+        info: dict, which 'num_found' key is set during parsing
+
+    Returns
+        files/datasets generator
+
+    Notes
+        - 'docs' array items are decoded one by one, and the buffer only
+          keeps the part which has not been decoded yet
+        - 'numFound' normally comes before 'docs' (else it is searched in
+          the data which follow the 'docs' array)
+    """
+    decoder=json.JSONDecoder()
+    buf=''
+    pos=None # decoding position in 'buf' (None until the 'docs' array is reached)
+    done=False
+
+    for chunk in chunks:
+        if done:
+            if 'num_found' in info:
+                continue # read remaining data (footer)
+            else:
+                buf+=chunk
+                continue
+
+        if pos is None:
+            buf+=chunk
+
+            m=DOCS_REGEX.search(buf)
+            if m is None:
+                continue
+
+            # retrieve "numFound" attribute
+            li=NUM_FOUND_REGEX.findall(buf,0,m.start())
+            if len(li)>0:
+                info['num_found']=int(li[-1])
+
+            pos=m.end()
+        else:
+            buf=buf[pos:]+chunk
+            pos=0
+
+        while True:
+            pos=SEPARATOR_REGEX.match(buf,pos).end()
+
+            if pos==len(buf):
+                break
+
+            if buf[pos]==']':
+                done=True
+                buf=buf[pos:]
+                break
+
+            try:
+                (doc_node,pos_)=decoder.raw_decode(buf,pos)
+            except ValueError,e:
+                break # doc is incomplete (wait for more data)
+
+            pos=pos_
+
+            yield parse_doc(doc_node)
+
+    if not done:
+        raise SDException("SYNDJSON-003","Unexpected end of document")
+
+    if 'num_found' not in info:
+        m=NUM_FOUND_REGEX.search(buf)
+        if m is None:
+            raise SDException("SYNDJSON-002","'numFound' attribute not found")
+        info['num_found']=int(m.group(1))
+
+def parse_doc(doc_node):
+    """Parse one file/dataset node."""
+    l__dict={}
+
+    """
+    SAMPLE
+
+    {
+    "id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601|esgf2.dkrz.de",
+    "data_node":"esgf2.dkrz.de",
+    "instance_id":"cmip5.output1.CCCma.CanCM4.decadal1970.mon.landIce.LImon.r5i2p1.v20120601",
+    "size":23697992,
+    "type":"Dataset",
+    "variable":["sbl",
+      "snc",
+      "snd",
+      "snm",
+      "snw",
+      "tsn"],
+    "score":1.0
+    },
+    """
+
+    for attr_name,attr_value in doc_node.iteritems():
+
+        # TODO: maybe move transformation below in a downstream
+        #       step (e.g. in the generic pipeline) so to keep
+        #       original xml stream not altered when using dump
+        #       action in raw mode.
+
+        if attr_name=="url":
+            # url array have three subitems (GRIDFTP, HTTPServer and openDAP)
+            # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
+
+            for item in attr_value:
+                url=item.split('|')[0] # keep only first field (i.e. keep only the file url)
+                protocol=item.split('|')[-1]
+
+                if protocol.upper()=="HTTPSERVER":
+                    l__dict['url_http']=url
+                elif protocol.upper()=="GRIDFTP":
+                    l__dict['url_gridftp']=url
+                elif protocol.upper()=="OPENDAP":
+                    l__dict['url_opendap']=url
+        else:
+            l__dict[attr_name]=attr_value
+
+    return l__dict
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
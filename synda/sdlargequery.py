@@ -16,7 +16,7 @@ Also see
 """
 
 import sdapp
-from sdtypes import File
+from sdtypes import FileRow
 import sddb
 import sdsqlutils
 
@@ -43,7 +43,7 @@ def get_files_batch(conn=sddb.conn):
     c.execute(q)
 
     for rs in large_query_helper(c,arraysize):
-        yield sdsqlutils.get_object_from_resultset(rs,File)
+        yield FileRow(rs)
 
     c.close()
 
@@ -72,7 +72,7 @@ def get_files(limit=None,conn=sddb.conn):
     c.execute(q)
     rs=c.fetchone()
     while rs!=None:
-        files.append(sdsqlutils.get_object_from_resultset(rs,File))
+        files.append(FileRow(rs))
         rs=c.fetchone()
     c.close()
 
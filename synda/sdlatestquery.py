@@ -13,7 +13,7 @@
 
 import sdapp
 import sddb
-from sdtypes import Dataset
+from sdtypes import DatasetRow
 
 def get_latest_datasets(full,conn=sddb.conn):
     """Returns datasets with latest flag set to true."""
@@ -28,7 +28,7 @@ def get_latest_datasets(full,conn=sddb.conn):
     c.execute(q)
     rs=c.fetchone()
     while rs!=None:
-        datasets.append(sdsqlutils.get_object_from_resultset(rs,Dataset))
+        datasets.append(DatasetRow(rs))
         rs=c.fetchone()
     c.close()
 
@@ -103,7 +103,7 @@ def get_latest_datasets_to_export(project,conn=sddb.conn):
 
     rs=c.fetchone()
     while rs!=None:
-        datasets.append(sdsqlutils.get_object_from_resultset(rs,Dataset))
+        datasets.append(DatasetRow(rs))
         rs=c.fetchone()
 
     c.close()
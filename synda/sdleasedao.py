@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""Contains lease DAO SQL queries.
+
+Note
+    a lease is the claim of a running transfer by a remote worker (see
+    sdqueueservice)
+"""
+
+import argparse
+import sdapp
+import sddb
+import sdtime
+
+def add_lease(file_id,worker,expiry_date,commit=True,conn=sddb.conn):
+    conn.execute("insert or replace into lease (file_id,worker,expiry_date) values (?,?,?)",(file_id,worker,expiry_date))
+
+    if commit:
+        conn.commit()
+
+def get_lease(file_id,conn=sddb.conn):
+    """Return lease as a row (None if not found)."""
+    return conn.execute("select * from lease where file_id=?",(file_id,)).fetchone()
+
+def get_leases(conn=sddb.conn):
+    return conn.execute("select * from lease order by file_id").fetchall()
+
+def get_expired_leases(date,conn=sddb.conn):
+    return conn.execute("select * from lease where expiry_date<? order by file_id",(date,)).fetchall()
+
+def renew_leases(file_ids,worker,expiry_date,commit=True,conn=sddb.conn):
+    """Extend worker's leases.
+
+    Returns
+        list of file_id which are not leased by the worker anymore
+    """
+    lost=[]
+
+    for file_id in file_ids:
+        c=conn.execute("update lease set expiry_date=? where file_id=? and worker=?",(expiry_date,file_id,worker))
+        if c.rowcount==0:
+            lost.append(file_id)
+
+    if commit:
+        conn.commit()
+
+    return lost
+
+def renew_all_leases(expiry_date,commit=True,conn=sddb.conn):
+    conn.execute("update lease set expiry_date=? where expiry_date<?",(expiry_date,expiry_date))
+
+    if commit:
+        conn.commit()
+
+def delete_lease(file_id,commit=True,conn=sddb.conn):
+    conn.execute("delete from lease where file_id=?",(file_id,))
+
+    if commit:
+        conn.commit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e','--expired',action='store_true')
+    args = parser.parse_args()
+
+    li=get_expired_leases(sdtime.now()) if args.expired else get_leases()
+    for l in li:
+        print "file_id=%i,worker=%s,expiry_date=%s"%(l['file_id'],l['worker'],l['expiry_date'])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the storage-locality-aware transfer scheduler.
+
+Each time a download slot is free, the next transfer is chosen in this order
+    - a waiting transfer located in a directory which already receives files
+    - a waiting transfer located in a dataset which already receives files
+    - the next waiting transfer (priority order)
+
+The two last cases open a new target directory, so they are only used while
+less than 'download.max_active_directories' directories receive files.
+
+Notes
+    - this reduces metadata server load on parallel filesystems (e.g. Lustre,
+      GPFS), as writes are not scattered across many directories at once
+    - 'priority' is only used inside those groups (a high priority transfer
+      may wait until an active directory is complete)
+    - a download slot may stay idle when all active directories have no more
+      waiting transfers and 'download.max_active_directories' is reached (the
+      slot is used again as soon as one of those directories is complete)
+"""
+
+import os
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdfiledao
+import sddatasetdao
+from sdexception import SDException,NoTransferWaitingException
+
+def get_one_waiting_transfer():
+    """Return the next transfer to start, according to storage locality.
+
+    Raises
+        NoTransferWaitingException
+    """
+
+    tr=sdfiledao.get_one_waiting_file_in_active_directories()
+
+    if tr is None:
+        if sdfiledao.get_active_directories_count()<max_active_directories:
+            tr=sdfiledao.get_one_waiting_file_in_active_datasets()
+
+            if tr is None:
+                li=sdfiledao.get_files(limit=1,status=sdconst.TRANSFER_STATUS_WAITING)
+                if len(li)>0:
+                    tr=li[0]
+
+    if tr is None:
+        raise NoTransferWaitingException()
+
+    # retrieve the dataset
+    tr.dataset=sddatasetdao.get_dataset(dataset_id=tr.dataset_id)
+
+    return tr
+
+def create_directories(transfers):
+    """Create target directories of the given transfers in one batch (each directory is only checked once)."""
+
+    directories=set(os.path.dirname(tr.get_full_local_path()) for tr in transfers)
+
+    count=0
+    for directory in sorted(directories): # sorted, so parent directories are created first
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+                count+=1
+            except OSError as e:
+                if not os.path.isdir(directory): # another process may have created it in the meantime
+                    sdlog.error("SDLOCALI-002","Cannot create directory (%s,%s)"%(directory,str(e)))
+
+    if count>0:
+        sdlog.debug("SDLOCALI-003","%i directory(ies) created"%count)
+
+# init.
+
+max_active_directories=sdconfig.config.getint('download','max_active_directories')
+if max_active_directories<1:
+    raise SDException("SDLOCALI-001","Incorrect value for 'download.max_active_directories' parameter (%i)"%max_active_directories)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    args = parser.parse_args()
+
+    print "active directories: %i (max=%i)"%(sdfiledao.get_active_directories_count(),max_active_directories)
+
+    try:
+        tr=get_one_waiting_transfer()
+        print "next transfer: %s"%tr.file_functional_id
+    except NoTransferWaitingException,e:
+        print "no waiting transfer"
@@ -27,7 +27,7 @@ import humanize
 import sdsqlutils
 import sddquery
 import sdprint
-from sdtypes import File,Dataset
+from sdtypes import FileRow,DatasetRow
 
 def run(stream=None,path=None,parameter=None,dry_run=False,load_default=None):
 
@@ -56,12 +56,16 @@ def get_files(q,type_,conn=sddb.conn):
     c.execute(q)
     rs=c.fetchone()
     while rs!=None:
-        files.append(sdsqlutils.get_object_from_resultset(rs,eval(type_))) # HACK: improve this
+        files.append(row_classes[type_](rs))
         rs=c.fetchone()
     c.close()
 
     return files
 
+# init.
+
+row_classes={'File':FileRow,'Dataset':DatasetRow}
+
 if __name__ == '__main__':
     prog=os.path.basename(__file__)
     parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -29,7 +29,7 @@ def change_status(old_status,new_status,conn=sddb.conn):
     nbr=0
 
     c=conn.cursor()
-    res=c.execute("update file set error_msg=NULL,status=?,sdget_error_msg=NULL,sdget_status=NULL where status=?",(new_status,old_status,))
+    res=c.execute("update file_data set error_msg=NULL,status=?,sdget_error_msg=NULL,sdget_status=NULL where status=?",(new_status,old_status,))
     nbr=c.rowcount
     conn.commit()
     c.close()
@@ -40,7 +40,7 @@ def change_priority(new_priority,conn=sddb.conn):
     """Change priority value for already existing transfer."""
     c=conn.cursor()
     sdlog.info("SDMODIFQ-002","updating %s selection (new priority=%s)"%(u_s.filename,new_priority))
-    res=c.execute("UPDATE file SET priority = ? WHERE EXISTS (SELECT 1 FROM selection__file WHERE file.file_id = selection__file.file_id AND selection__file.selection_id = ?)",(new_priority,u_s.get_selection_id(),))
+    res=c.execute("UPDATE file_data SET priority = ? WHERE EXISTS (SELECT 1 FROM selection__file WHERE file_data.file_id = selection__file.file_id AND selection__file.selection_id = ?)",(new_priority,u_s.get_selection_id(),))
     modified_files_count=c.rowcount
     conn.commit()
     c.close()
@@ -9,19 +9,29 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module contains network functions."""
-
-import os
+"""This module contains network functions.
+
+Notes
+    - search-API calls share one HTTP client (persistent connections pool per
+      index host, gzip compression, retry with backoff on connection errors)
+    - errors are mapped to SDException subclasses (see get_HTTP_exception())
+    - the HTTP client is tested against a local HTTP stub (see sdv/svhttpclient)
+    - index node health is updated after each call (see sdindex)
+"""
+
+import time
+import threading
 import urllib2
 import requests
+from requests.packages.urllib3.util.retry import Retry
 import sdtypes
-from sdexception import SDException
+from sdexception import SDException,ServerErrorException,ConnectionErrorException
 from sdtime import SDTimer
 import sdapp
 import sdlog
 import sdconst
 import sdconfig
-import sdpoodlefix
+import sdindex
 import httplib
 import sdtrace
 import ssl
@@ -38,40 +48,66 @@ class HTTPSClientAuthHandler(urllib2.HTTPSHandler):
             return httplib.HTTPSConnection(host, key_file=self.key, cert_file=self.cert)
 
 def call_web_service(url,timeout=sdconst.SEARCH_API_HTTP_TIMEOUT,lowmem=False): # default is to load list resulting from HTTP call in memory (should work on lowmem machine as response should not exceed SEARCH_API_CHUNKSIZE)
+    """Call search-API and parse the response while it is being read.
+
+    Note
+        as parsing overlaps with the network read, 'call_duration' includes
+        parsing time
+    """
     start_time=SDTimer.get_time()
-    buf=HTTP_GET(url,timeout)
-    elapsed_time=SDTimer.get_elapsed_time(start_time)
 
-    buf=fix_encoding(buf)
+    response=sdtypes.Response(lowmem=lowmem) # RAM storage is ok here as one response is limited by SEARCH_API_CHUNKSIZE
+    info={}
 
     try:
-        di=search_api_parser.parse_metadata(buf)
+        files=[]
+        for f in search_api_parser.parse_metadata_stream(fix_encoding_stream(HTTP_GET_stream(url,timeout)),info):
+            files.append(f)
+
+            if len(files)>=sdconst.SEARCH_API_STORE_BATCH_SIZE:
+                response.add_files(files)
+                files=[]
+
+        if len(files)>0:
+            response.add_files(files)
+
+    except SDException,e:
+        if e.code=='SDNETUTI-002':
+            raise # HTTP error
+
+        handle_parsing_error(e)
     except Exception,e:
+        handle_parsing_error(e)
 
-        # If we are here, it's likely that they is a problem with the internet connection
-        # (e.g. we are behind an HTTP proxy and have no authorization to use it)
+    response.num_found=info['num_found']
+    response.call_duration=SDTimer.get_elapsed_time(start_time)
+
+    sdlog.debug("SDNETUTI-044","files-count=%d"%response.count())
 
-        sdlog.info('SDNETUTI-001','XML parsing error (exception=%s). Most of the time, this error is due to a network error.'%str(e))
+    return response
 
-        # debug
-        #
-        # TODO: maybe always enable this
-        #
-        sdtrace.log_exception()
+def handle_parsing_error(e):
 
-        # debug
-        #
-        # (if the error is not due to a network error (e.g. internet connection
-        # problem), raise the original exception below and set the debug mode
-        # to see the stacktrace.
-        #
-        #raise
+    # If we are here, it's likely that they is a problem with the internet connection
+    # (e.g. we are behind an HTTP proxy and have no authorization to use it)
 
-        raise SDException('SDNETUTI-008','Network error (see log for details)') # we raise a new exception 'network error' here, because most of the time, 'xml parsing error' is due to an 'network error'.
+    sdlog.info('SDNETUTI-001','XML parsing error (exception=%s). Most of the time, this error is due to a network error.'%str(e))
 
-    sdlog.debug("SDNETUTI-044","files-count=%d"%len(di.get('files')))
+    # debug
+    #
+    # TODO: maybe always enable this
+    #
+    sdtrace.log_exception()
+
+    # debug
+    #
+    # (if the error is not due to a network error (e.g. internet connection
+    # problem), raise the original exception below and set the debug mode
+    # to see the stacktrace.
+    #
+    #raise
 
-    return sdtypes.Response(call_duration=elapsed_time,lowmem=lowmem,**di) # RAM storage is ok here as one response is limited by SEARCH_API_CHUNKSIZE
+    raise SDException('SDNETUTI-008','Network error (see log for details)') # we raise a new exception 'network error' here, because most of the time, 'xml parsing error' is due to an 'network error'.
 
 def call_param_web_service(url,timeout):
     buf=HTTP_GET(url,timeout)
@@ -103,6 +139,15 @@ def fix_encoding(buf):
 
     return buf
 
+def fix_encoding_stream(chunks):
+    """Same as fix_encoding(), for a stream of chunks."""
+
+    if sdconfig.fix_encoding:
+        import sdencoding
+        chunks=sdencoding.fix_mixed_encoding_ISO8859_UTF8_stream(chunks)
+
+    return chunks
+
 def HTTP_GET_2(url,timeout=20,verify=True):
     """requests impl."""
 
@@ -121,29 +166,91 @@ def HTTP_GET_2(url,timeout=20,verify=True):
     return buf
 
 def HTTP_GET(url,timeout=20):
-    """urllib impl."""
+    """Shared HTTP client impl."""
 
-    sock=None
-    buf=None
+    start_time=time.time()
 
     try:
-        sdpoodlefix.start(url)
+        response=get_session().get(url,timeout=(connect_timeout,timeout))
+        response.raise_for_status()
 
-        sock=urllib2.urlopen(url, timeout=timeout)
-        buf=sock.read()
+        buf=response.content # note: gzip compressed content is decoded here
     except Exception, e:
-        errmsg="HTTP query failed (url=%s,exception=%s,timeout=%d)"%(url,str(e),timeout)
-        errcode="SDNETUTI-002"
+        raise get_HTTP_exception(url,timeout,e)
 
-        raise SDException(errcode,errmsg)
+    sdindex.record_success(url,time.time()-start_time)
+
+    return buf
+
+def HTTP_GET_stream(url,timeout=20,read_size=sdconst.SEARCH_API_READ_SIZE):
+    """Shared HTTP client impl. (generator version, which yields the response by blocks of 'read_size' bytes)."""
+
+    start_time=time.time()
+
+    try:
+        response=get_session().get(url,timeout=(connect_timeout,timeout),stream=True)
+        response.raise_for_status()
+    except Exception, e:
+        raise get_HTTP_exception(url,timeout,e)
+
+    sdindex.record_success(url,time.time()-start_time) # latency until response headers are received
+
+    try:
+        try:
+            for buf in response.iter_content(read_size): # note: gzip compressed content is decoded here
+                yield buf
+        except Exception, e:
+            raise get_HTTP_exception(url,timeout,e)
 
     finally:
-        if sock!=None:
-            sock.close()
+        response.close() # connection returns to the pool (if response has been fully read)
 
-        sdpoodlefix.stop()
+def get_HTTP_exception(url,timeout,e):
+    errmsg="HTTP query failed (url=%s,exception=%s,timeout=%d)"%(url,str(e),timeout)
+    errcode="SDNETUTI-002"
 
-    return buf
+    if isinstance(e,requests.HTTPError) and e.response is not None and e.response.status_code<500:
+        return SDException(errcode,errmsg) # client side error (e.g. incorrect query)
+
+    sdindex.record_error(url) # index node is down or unhealthy
+
+    if isinstance(e,requests.HTTPError) and e.response is not None:
+        return ServerErrorException(errcode,errmsg) # server side error (can be retried later)
+    elif isinstance(e,(requests.ConnectionError,requests.Timeout,requests.exceptions.ChunkedEncodingError)):
+        return ConnectionErrorException(errcode,errmsg) # index node is unreachable
+    else:
+        return SDException(errcode,errmsg)
+
+def get_session():
+    """Return the shared HTTP client (created on first call).
+
+    Notes
+        - requests.Session is used by many threads (sdproxy_mt), which is ok
+          as connections pools are thread-safe
+        - only connection errors are retried here. HTTP 5xx responses are
+          returned as is (they are retried with backoff by the caller, see
+          ServerErrorException in sdproxy_mt)
+    """
+    global session
+
+    with session_lock:
+        if session is None:
+            retry=Retry(total=http_retry,
+                        connect=http_retry,
+                        read=http_retry,
+                        status=0,
+                        backoff_factor=sdconst.HTTP_RETRY_BACKOFF_FACTOR)
+
+            adapter=requests.adapters.HTTPAdapter(pool_connections=sdconst.HTTP_POOL_COUNT,
+                                                  pool_maxsize=pool_size,
+                                                  max_retries=retry)
+
+            session=requests.Session()
+            session.mount('http://',adapter)
+            session.mount('https://',adapter)
+            session.headers['Accept-Encoding']='gzip'
+
+        return session
 
 def test_access():
     urlfile = urllib2.urlopen("http://www.google.com")
@@ -187,3 +294,10 @@ def allow_self_signed_certificate():
 # init.
 
 search_api_parser=get_search_api_parser()
+
+connect_timeout=sdconfig.config.getint('index','connect_timeout')
+http_retry=sdconfig.config.getint('index','http_retry')
+pool_size=sdconfig.config.getint('index','max_parallel_call') # connections kept per index host
+
+session=None
+session_lock=threading.Lock()
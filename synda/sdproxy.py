@@ -9,21 +9,95 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module contains search-api proxy."""
+"""This module contains search-api proxy.
+
+Notes
+    - the first page of a paginated call gives the total match count
+      ('numFound'), then the remaining pages (offset windows) are retrieved
+      concurrently
+    - concurrent calls are limited per index host ('index.max_parallel_call'),
+      and this limit is shared by all searches running in the process (e.g.
+      sdproxy_mt threads)
+    - pages are merged in offset order
+    - when 'index.fanout' is true, a search is sent to each index node of
+      'index.indexes' with 'distrib=false' (i.e. each node only searches its
+      own shard), then results are merged and deduplicated locally; a node
+      which doesn't answer within 'index.fanout_timeout' seconds (or which
+      fails) is skipped with a warning, so one slow shard doesn't block the
+      whole search
+    - queries bound to a specific index host (e.g. '-i' option) are not
+      fanned out
+    - search cache is not used in fan-out mode (cache revalidation relies on
+      the distributed match count)
+    - in sequential mode, a query fails over to the next healthy index node
+      if its index node fails (in parallel mode, failed queries are retried
+      on other index nodes by sdproxy_mt)
+"""
 
 import time
-import argparse
+import copy
+import Queue
+import urllib
+import urlparse
+import threading
 import sdapp
 import sdtypes
-from sdexception import SDException
-from sdtime import SDTimer
+from sdexception import SDException,ServerErrorException,ConnectionErrorException
 import sdnetutils
 import sdconst
 import sdlog
 import sdtools
 import sdconfig
 import sdaddap
+import sdindex
 import sdurlutils
+import sdsearchcache
+
+class PageThread(threading.Thread):
+    """Retrieve pages (i.e. offset windows) of one paginated call."""
+
+    def __init__(self,service,request,task_queue,result_queue):
+        self.service=service           # SearchAPIProxy object
+        self.request=request           # paginated call request (used as template)
+        self.task_queue=task_queue     # input queue (offsets to retrieve)
+        self.result_queue=result_queue # output queue ((offset,response,exception) tuples)
+
+        threading.Thread.__init__(self)
+
+    def run(self):
+        while True:
+            offset=self.task_queue.get()
+            if offset is None:
+                break
+
+            request=copy.copy(self.request)
+            request.offset=offset
+
+            try:
+                response=self.service.call_web_service__PAGE(request)
+                self.result_queue.put((offset,response,None))
+            except Exception,e:
+                self.result_queue.put((offset,None,e))
+
+class NodeThread(threading.Thread):
+    """Retrieve all pages of one search on one index node (fan-out mode)."""
+
+    def __init__(self,service,host,request):
+        self.service=service # SearchAPIProxy object
+        self.host=host       # index node
+        self.request=request # paginated call request (on this node)
+        self.metadata=None
+        self.exception=None
+
+        threading.Thread.__init__(self)
+
+    def run(self):
+        try:
+            paginated_response=self.service.call_web_service__PAGINATION(self.request)
+            self.metadata=paginated_response.to_metadata()
+            self.metadata.disconnect() # TAGKLK434L3K34K
+        except Exception,e:
+            self.exception=e
 
 # not a singleton
 class SearchAPIProxy():
@@ -39,28 +113,84 @@ class SearchAPIProxy():
         request=sdtypes.Request(url=url,pagination=True)
         final_url=request.get_url()
 
-        sdlog.debug("SYDPROXY-490","paginated call started (url=%s)"%final_url)
+        fanout_mode=fanout and 'searchapi_host' not in attached_parameters
 
-        try:
-            paginated_response=self.call_web_service__PAGINATION(request)
-        except Exception,e:
-            sdlog.error("SYDPROXY-400","Error occurs during search-API paginated call (url=%s)"%(final_url,))
-            sdlog.error("SYDPROXY-410","%s"%(str(e),))
-            raise
+        md=sdsearchcache.get(url) if sdsearchcache.enabled and not fanout_mode else None
+
+        if fanout_mode:
+            sdlog.debug("SYDPROXY-491","fan-out call started (url=%s)"%final_url)
+
+            try:
+                md=self.call_web_service__FANOUT(url)
+            except Exception,e:
+                sdlog.error("SYDPROXY-401","Error occurs during search-API fan-out call (url=%s)"%(final_url,))
+                sdlog.error("SYDPROXY-411","%s"%(str(e),))
+                raise
+
+            if attached_parameters.get('verbose',False) == True:
+                sdtools.print_stderr("Url: %s (fan-out)"%final_url)
+                sdtools.print_stderr("")
+
+        elif md is None:
+            sdlog.debug("SYDPROXY-490","paginated call started (url=%s)"%final_url)
 
-        sdlog.debug("SYDPROXY-001","paginated call completed (call-duration=%i, files-count=%i, url=%s)"%(paginated_response.call_duration, paginated_response.count(), final_url))
+            try:
+                paginated_response=self.call_web_service__PAGINATION(request)
+            except Exception,e:
+                sdlog.error("SYDPROXY-400","Error occurs during search-API paginated call (url=%s)"%(final_url,))
+                sdlog.error("SYDPROXY-410","%s"%(str(e),))
+                raise
+
+            sdlog.debug("SYDPROXY-001","paginated call completed (call-duration=%i, files-count=%i, url=%s)"%(paginated_response.call_duration, paginated_response.count(), final_url))
+
+            if attached_parameters.get('verbose',False) == True:
+                sdtools.print_stderr("Url: %s"%final_url)
+                sdtools.print_stderr("Duration: %s"%paginated_response.call_duration)
+                sdtools.print_stderr("")
 
-        if attached_parameters.get('verbose',False) == True:
-            sdtools.print_stderr("Url: %s"%final_url)
-            sdtools.print_stderr("Duration: %s"%paginated_response.call_duration)
-            sdtools.print_stderr("")
+            md=paginated_response.to_metadata() # we cast to remove pagination related code and have a lighter object
 
-        md=paginated_response.to_metadata() # we cast to remove pagination related code and have a lighter object
+            if sdsearchcache.enabled:
+                sdsearchcache.put(url,md)
+        else:
+            if attached_parameters.get('verbose',False) == True:
+                sdtools.print_stderr("Url: %s (cached)"%final_url)
+                sdtools.print_stderr("")
 
         md=sdaddap.run(md,attached_parameters)
 
         return md
 
+    def run_with_failover(self,url=None,attached_parameters=None):
+        """Same as run(), but if the index node fails, the query is sent to the next healthy index node.
+
+        Notes
+            - only queries sent to an index node listed in configuration file
+              fail over (see sdindex)
+            - only server side errors (HTTP 5xx) and connection errors (incl.
+              timeout) fail over. Other errors (e.g. HTTP 4xx, incorrect
+              query) are raised at once, as they would fail on any index node
+        """
+        tried=[]
+
+        while True:
+            host=urlparse.urlsplit(url).netloc
+            tried.append(host)
+
+            try:
+                return self.run(url=url,attached_parameters=attached_parameters)
+            except (ServerErrorException,ConnectionErrorException),e:
+                if host not in sdindex.get_candidates():
+                    raise
+
+                next_host=sdindex.get_failover_index(tried)
+                if next_host is None:
+                    raise
+
+                sdlog.warning("SYDPROXY-240","Index node failed, query is sent to %s (host=%s)"%(next_host,host))
+
+                url=get_host_url(url,next_host)
+
     def call_web_service(self,request):
 
         sdlog.debug("SYDPROXY-100","Search-API call started (%s)."%request.get_url())
@@ -115,6 +245,15 @@ class SearchAPIProxy():
 
         return response
 
+    def call_web_service__PAGE(self,request):
+        """Retrieve one page (waits if too many calls are running on the index)."""
+
+        with get_host_semaphore(urlparse.urlparse(request.get_url()).netloc):
+            if sdconfig.mono_host_retry:
+                return self.call_web_service__RETRY(request)
+            else:
+                return self.call_web_service(request)
+
     def call_web_service__PAGINATION(self,request):
         """
         Notes
@@ -124,32 +263,182 @@ class SearchAPIProxy():
         # init
         request.limit=sdconst.SEARCH_API_CHUNKSIZE
         request.offset=0
-        offset = 0
         paginated_response=sdtypes.PaginatedResponse()
-        nread = 0 # how many already read
-        moredata = True
 
-        while moredata: # paging loop
+        # first page (gives the total match count)
+        response=self.call_web_service__PAGE(request)
 
-            # paging (pre-processing)
-            request.offset=offset
+        if response.count()>0: # this is for the case when "num_found > 0" but nothing is returned
+            offsets=range(sdconst.SEARCH_API_CHUNKSIZE,response.num_found,sdconst.SEARCH_API_CHUNKSIZE)
+        else:
+            offsets=[]
 
-            # call
-            if sdconfig.mono_host_retry:
-                response=self.call_web_service__RETRY(request)
+        paginated_response.slurp(response) # warning: response is modified here
+
+        # remaining pages
+        if len(offsets)>0:
+            self.call_web_service__CONCURRENT(request,offsets,paginated_response)
+
+        return paginated_response
+
+    def call_web_service__CONCURRENT(self,request,offsets,paginated_response):
+        """Retrieve pages concurrently, and merge them in offset order.
+
+        Note
+            at most 'max_parallel_call' pages are running or waiting to be
+            merged, so memory usage is bounded
+        """
+        task_queue=Queue.Queue()
+        result_queue=Queue.Queue()
+
+        count=min(len(offsets),max_parallel_call)
+
+        sdlog.debug("SYDPROXY-200","Retrieve %i pages using %i threads (%s)."%(len(offsets),count,request.get_url()))
+
+        threads=[PageThread(self,request,task_queue,result_queue) for i in range(count)]
+        for th in threads:
+            th.setDaemon(True)
+            th.start()
+
+        pending={} # offset => response (retrieved but not merged yet)
+        next_=0    # index (in 'offsets') of the next page to retrieve
+        merged=0   # index (in 'offsets') of the next page to merge
+
+        try:
+            while merged<len(offsets):
+
+                # dispatch
+                while next_<len(offsets) and next_-merged<count:
+                    task_queue.put(offsets[next_])
+                    next_+=1
+
+                # wait for one page (timeout is only used to remain interruptible)
+                try:
+                    (offset,response,e)=result_queue.get(True,1)
+                except Queue.Empty:
+                    continue
+
+                if e is not None:
+                    # if one page fails, the whole paginated call is cancelled
+
+                    raise e
+
+                pending[offset]=response
+
+                # merge
+                while merged<len(offsets) and offsets[merged] in pending:
+                    paginated_response.slurp(pending.pop(offsets[merged])) # warning: response is modified here
+                    merged+=1
+
+        finally:
+            for th in threads:
+                task_queue.put(None) # stop thread (running pages of a cancelled call are ignored)
+
+    def call_web_service__FANOUT(self,url):
+        """Run the paginated call on each index node (not distributed), then merge results.
+
+        Notes
+            - nodes are queried in parallel, and results are merged in
+              'index.indexes' order
+            - a node which fails or doesn't answer in time is skipped
+        """
+        start_time=time.time()
+
+        threads=[NodeThread(self,host,sdtypes.Request(url=get_node_url(url,host),pagination=True)) for host in sdindex.index_host_list]
+        for th in threads:
+            th.setDaemon(True) # a node which doesn't answer in time is abandoned
+            th.start()
+
+        deadline=start_time+fanout_timeout
+        results=[]
+        for th in threads:
+
+            # wait for the node (timeout is only used to remain interruptible)
+            while th.isAlive() and time.time()<deadline:
+                th.join(1)
+
+            if th.isAlive():
+                sdlog.warning("SYDPROXY-220","Index node skipped as it doesn't answer within %i seconds (host=%s)"%(fanout_timeout,th.host))
+            elif th.exception is not None:
+                sdlog.warning("SYDPROXY-222","Index node skipped as error occurs (host=%s,%s)"%(th.host,str(th.exception)))
             else:
-                response=self.call_web_service(request)
+                th.metadata.connect() # TAGKLK434L3K34K
+                results.append(th.metadata)
 
-            # paging (post-processing)
-            offset += sdconst.SEARCH_API_CHUNKSIZE
-            nread += response.count()
-            nleft = response.num_found - nread
+        if len(results)==0:
+            raise SDException("SYDPROXY-230","No index node answered (url=%s)"%url)
 
-            moredata = (nleft>0) and (response.count()>0) # the second member is for the case when "num_found > 0" but nothing is returned
+        metadata=merge(results)
 
-            paginated_response.slurp(response) # warning: response is modified here
+        sdlog.debug("SYDPROXY-002","fan-out call completed (call-duration=%i, nodes-count=%i/%i, files-count=%i, url=%s)"%(time.time()-start_time, len(results), len(threads), metadata.count(), url))
 
-        return paginated_response
+        return metadata
+
+def merge(results):
+    """Merge node results and remove duplicates (i.e. same record returned by many nodes).
+
+    Note
+        replicas (i.e. same 'instance_id', different 'data_node') are not
+        duplicates, as replica selection is done afterward
+    """
+    metadata=sdtypes.Metadata()
+    seen=set()
+
+    for result in results:
+        for chunk in result.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+            files=[]
+            for f in chunk:
+                if 'instance_id' in f:
+                    key=(f['instance_id'],f.get('data_node'))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+
+                files.append(f)
+
+            metadata.add_files(files)
+
+    return metadata
+
+def get_node_url(url,host):
+    """Return url for a not distributed search on the given index node."""
+
+    (scheme,netloc,path,query,fragment)=urlparse.urlsplit(url)
+
+    parameters=[(name,value) for (name,value) in urlparse.parse_qsl(query,keep_blank_values=True) if name not in ('distrib','shards')]
+    parameters.append(('distrib','false'))
+
+    return urlparse.urlunsplit((scheme,host,path,urllib.urlencode(parameters),fragment))
+
+def get_host_url(url,host):
+    """Return the same url, on another index node."""
+
+    (scheme,netloc,path,query,fragment)=urlparse.urlsplit(url)
+
+    return urlparse.urlunsplit((scheme,host,path,query,fragment))
+
+def get_host_semaphore(host):
+    with host_semaphores_lock:
+        if host not in host_semaphores:
+            host_semaphores[host]=threading.BoundedSemaphore(max_parallel_call)
+
+        return host_semaphores[host]
+
+# module init.
+
+max_parallel_call=sdconfig.config.getint('index','max_parallel_call')
+
+if max_parallel_call<1:
+    raise SDException("SYDPROXY-210","Incorrect value for 'index.max_parallel_call' parameter (%i)"%max_parallel_call)
+
+host_semaphores={} # host => semaphore (limits concurrent calls on each index)
+host_semaphores_lock=threading.Lock()
+
+fanout=sdconfig.config.getboolean('index','fanout')
+fanout_timeout=sdconfig.config.getint('index','fanout_timeout')
+
+if fanout_timeout<1:
+    raise SDException("SYDPROXY-212","Incorrect value for 'index.fanout_timeout' parameter (%i)"%fanout_timeout)
 
 if __name__ == '__main__':
 
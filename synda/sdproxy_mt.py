@@ -9,7 +9,18 @@
 #  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
 ##################################
 
-"""This module runs many searches (SearchAPIProxy.run()) in parallel."""
+"""This module runs many searches (SearchAPIProxy.run()) in parallel.
+
+Notes
+    - each index host has a fixed-size worker pool ('max_thread_per_host'
+      threads), and all workers take queries from the same queue (so fast
+      indexes process more queries)
+    - the caller is notified through a condition as soon as all queries are
+      processed (no polling)
+    - when an index returns a server error (HTTP 5xx), the query is retried
+      on the same index after a delay (exponential backoff), then retried on
+      any index by the retry loop (see run())
+"""
 
 import Queue
 import sdapp
@@ -29,55 +40,94 @@ import sdurlutils
 import sdexception
 
 class MetadataThread(threading.Thread):
-    def __init__(self,host,service,query,result_queue,error_queue):
+    def __init__(self,host,service,query_queue,completion):
         self.host=host                 # index
         self.service=service           # search-API service (SearchAPIProxy object)
-        self.query=query               # query
-        self.result_queue=result_queue # output queue (global thread-safe Queue PTR)
-        self.error_queue=error_queue   # error queue used by the retry mecanism (global thread-safe Queue PTR)
+        self.query_queue=query_queue   # input queue (shared by all workers of all hosts)
+        self.completion=completion     # used to report results (Completion object)
 
         threading.Thread.__init__(self)
 
     def run(self):
-        ap=self.query.get('attached_parameters',{})
-
-        try:
-            url_with_host_set=self.query['url'].replace(sdconst.IDXHOSTMARK,self.host)
-
-            #sdlog.debug("SDPROXMT-012","Using %s"%self.host,stderr=False,logfile=True)
-
-
-            # BEWARE: printing stuff on stdxxx is NOT welcome here, as we are
-            # here running inside a progress bar... so printing on stdxxx
-            # result in a big mess. Maybe enable verbose mode here only if
-            # progress is off, or just output to logfile....
-            # Well, in fact, maybe the better is to move the progress here,
-            # (i.e. as the slow part is the remote call, let's have the progress
-            # close to it, not far upstream !).
-            """
-            verbose=sdsquery.get_scalar(self.query,'verbose',default=False,type_=bool) # we cast here as verbose can be str (set from parameter) or bool (set from '-v' option)
-            if verbose:
-                sdtools.print_stderr("Using %s"%self.host)
-            """
-
-
-            metadata=self.service.run(url=url_with_host_set,attached_parameters=ap) # service is an instance of SearchAPIProxy
-            metadata.disconnect() # TAGKLK434L3K34K
-            self.result_queue.put(metadata)
-        except Exception, e:
-            # note
-            #  - it's not fatal to come here, because error queries will be
-            #    retried later using a different host (well until "max_retry"
-            #    is reached of course)
-
-            self.error_queue.put(self.query)
-
-            # not needed to log here as already done by 'SYDPROXY-400' and 'SYDPROXY-410'
-            #sdlog.info("SDPROXMT-001", "Query failed (url=%s)"%(url_with_host_set,))
-            #sdlog.info("SDPROXMT-006", "%s"%(str(e)),)
+        while True:
+            query=self.query_queue.get()
+            if query is None:
+                break
 
-            # debug
-            #sdtrace.log_exception()
+            try:
+                metadata=self.process_query(query)
+                metadata.disconnect() # TAGKLK434L3K34K
+                self.completion.add_result(metadata)
+            except Exception, e:
+                # note
+                #  - it's not fatal to come here, because error queries will be
+                #    retried later using a different host (well until "max_retry"
+                #    is reached of course)
+
+                self.completion.add_error(query)
+
+                # not needed to log here as already done by 'SYDPROXY-400' and 'SYDPROXY-410'
+                #sdlog.info("SDPROXMT-001", "Query failed (url=%s)"%(url_with_host_set,))
+                #sdlog.info("SDPROXMT-006", "%s"%(str(e)),)
+
+                # debug
+                #sdtrace.log_exception()
+
+    def process_query(self,query):
+        ap=query.get('attached_parameters',{})
+        url_with_host_set=query['url'].replace(sdconst.IDXHOSTMARK,self.host)
+
+        # BEWARE: printing stuff on stdxxx is NOT welcome here, as we are
+        # here running inside a progress bar... so printing on stdxxx
+        # result in a big mess.
+
+        i=0
+        while True:
+            try:
+                return self.service.run(url=url_with_host_set,attached_parameters=ap) # service is an instance of SearchAPIProxy
+            except sdexception.ServerErrorException, e:
+                if i>=max_server_error_retry:
+                    raise
+
+                delay=backoff_delay*(2**i)*random.uniform(1,1.5) # jitter prevents workers from retrying at the same time
+                sdlog.info("SDPROXMT-010","Server error, retry in %i seconds (host=%s)"%(delay,self.host))
+                time.sleep(delay)
+
+                i+=1
+
+class Completion():
+    """Collect workers output and notify the caller when all queries are processed."""
+
+    def __init__(self,total):
+        self.total=total
+        self.results=[]
+        self.errors=[]
+        self.condition=threading.Condition()
+
+    def add_result(self,metadata):
+        with self.condition:
+            self.results.append(metadata)
+            self.condition.notify()
+
+    def add_error(self,query):
+        with self.condition:
+            self.errors.append(query)
+            self.condition.notify()
+
+    def count(self):
+        return len(self.results)+len(self.errors)
+
+    def wait(self):
+        last_log=time.time()
+
+        with self.condition:
+            while self.count()<self.total:
+                self.condition.wait(1) # timeout is only used to remain interruptible
+
+                # log
+                if time.time()-last_log>progress_log_interval:
+                    sdlog.info("SDPROXMT-004","total_queries=%d, done_queries=%d, waiting_or_running_queries=%d"%(self.total,self.count(),self.total-self.count()))
+                    last_log=time.time()
 
 def run(i__queries):
     """This method contains the retry mecanism."""
@@ -117,65 +167,30 @@ def run(i__queries):
 
     return metadata
 
-def start_new_thread(host,url):
-    sdlog.debug("SDPROXMT-002","Starting new search-API thread (%s)"%host)
-
-    service=searchAPIServices[host]["iSearchAPIProxy"]
-
-    th=MetadataThread(host,service,url,__result_queue,__error_queue)
-    th.setDaemon(True)
-    th.start()
-
-    return th
+def start_workers(query_queue,completion,count):
+    """Start worker pools (one per host).
 
-def all_threads_completed():
+    Returns
+        threads list
     """
-    Returns:
-      True   => all threads completed
-      False  => threads still running
-    """
-    for host in searchAPIServices.keys():
-        for t in searchAPIServices[host]['threadlist']:
-            if t.is_alive():
-                return False
-
-    return True
-
-def process_query(host,query):
-    """
-    return 
-      True   => query processed
-      False  => query not processed (host is busy)
-    """
-
-    if len(searchAPIServices[host]['threadlist'])<max_thread_per_host:
-
-        searchAPIServices[host]['threadlist'].append(start_new_thread(host,query))
-
-        return True
-    else:
-        return False
-
-def distribute_queries(queries):
-
-    hosts=searchAPIServices.keys()
+    threads=[]
 
+    hosts=sdindex.get_healthy_index_list(searchAPIServices.keys()) # unhealthy index nodes are not used (except if all are unhealthy)
     random.shuffle(hosts) # this is to prevent always starting with the same server
 
     for host in hosts:
+        sdlog.debug("SDPROXMT-002","Starting search-API worker pool (host=%s,size=%d)"%(host,count))
 
-        if len(queries)<1:
-            break
-        else:
-            query=queries.pop()
+        service=searchAPIServices[host]["iSearchAPIProxy"]
 
-            status=process_query(host,query)
+        for i in range(count):
+            th=MetadataThread(host,service,query_queue,completion)
+            th.setDaemon(True)
+            th.start()
 
-            if not status:
-                # host is busy (thread is running on the host)
-                # so we send back query in the stack
+            threads.append(th)
 
-                queries.append(query)
+    return threads
 
 def run_helper(queries):
     """
@@ -186,56 +201,28 @@ def run_helper(queries):
 
     sdlog.debug("SDPROXMT-003","%d search-API queries to process (max_thread_per_host=%d,timeout=%d)"%(total_query_to_process,max_thread_per_host,sdconst.SEARCH_API_HTTP_TIMEOUT))
 
-    while True:
-        if sdconfig.proxymt_progress_stat:
-            sdlog.info("SDPROXMT-033","threads per host: %s"%",".join(['%s=%s'%(host,len(searchAPIServices[host]['threadlist'])) for host in searchAPIServices.keys()]))
+    query_queue=Queue.Queue()
+    for query in queries:
+        query_queue.put(query)
 
-        if len(queries)>0:
-            distribute_queries(queries)
-        else:
-            # leave the loop only if all threads completed
-            if all_threads_completed():
-                break
+    completion=Completion(total_query_to_process)
 
-        # remove completed threads from list
-        for host in searchAPIServices.keys():
-            li=[]
-            for t in searchAPIServices[host]['threadlist']:
-                if t.is_alive():
-                    li.append(t)
-            searchAPIServices[host]['threadlist']=li
-
-        # log
-        total_query_already_processed = total_query_to_process - len(queries)
-        if total_query_to_process > 0: # display progress only when there are a lot of queries
-            if len(queries) > 0: # display progress only when still query to process
-                sdlog.info("SDPROXMT-004","total_queries=%d, running_or_done_queries=%d, waiting_queries=%d"%(total_query_to_process,total_query_already_processed,len(queries)))
-
-        # if all services are busy, we sleep to limit loop speed
-        # (note that all the code around the "sleep" call is to detect system overload)
-        sleep_time=10
-        warning_threshold=5 # threshold not to emit warning for every small load exceedance
-        befo=time.time()
-        time.sleep(sleep_time)
-        afte=time.time()
-        diff=afte-befo
-        if diff>sleep_time+warning_threshold:
-            sdlog.warning("SDPROXMT-005","WARNING: system overload detected (sleep takes %d second to complete)."%diff)
-
-    # retrieve result from output queue
+    # no more workers than queries (small searches don't start useless threads)
+    threads=start_workers(query_queue,completion,min(max_thread_per_host,max(1,-(-total_query_to_process/len(searchAPIServices))))) # ceil
+
+    try:
+        completion.wait()
+    finally:
+        for th in threads:
+            query_queue.put(None) # stop worker
+
+    # retrieve results
     metadata=sdtypes.Metadata()
-    while not __result_queue.empty():
-        success=__result_queue.get(False) # retrieve result from ONE successful search-API call
+    for success in completion.results: # result from ONE successful search-API call
         success.connect() # TAGKLK434L3K34K
         metadata.slurp(success) # warning: success is modified here
 
-    # retrieve error from output queue and insert them into a list
-    errors=[]
-    while not __error_queue.empty():
-        query=__error_queue.get(False)
-        errors.append(query)
-
-    return (metadata,errors)
+    return (metadata,completion.errors)
 
 def set_index_hosts(index_hosts):
     global searchAPIServices
@@ -244,14 +231,14 @@ def set_index_hosts(index_hosts):
     for index_host in index_hosts:
         searchAPIServices[index_host]={}
         searchAPIServices[index_host]['iSearchAPIProxy']=sdproxy.SearchAPIProxy() # contains service PTR
-        searchAPIServices[index_host]['threadlist']=[]                            # contains threads PTR
 
 # module init
 
 max_thread_per_host=sdconfig.max_metadata_parallel_download_per_index
 
-__result_queue=Queue.Queue() # thread safe data structure to hold search-API result
-__error_queue=Queue.Queue()  # thread safe data structure to hold unsuccessful request (used by the retry mecanism)
+max_server_error_retry=3  # retry count on the same host when server error occurs (HTTP 5xx)
+backoff_delay=2           # delay before the first retry (seconds), doubled at each retry
+progress_log_interval=10  # seconds
 
 searchAPIServices=None # list of search-API services (M queries will be sent to one service at once, resulting in MxN parallel streams, with N the number of service)
 
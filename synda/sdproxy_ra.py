@@ -26,9 +26,11 @@ import sdconfig
 import sdurlutils
 from sdtypes import Request
 
-def get_one_file(host=sdindex.get_default_index(),project=None,query=None,dry_run=None):
+def get_one_file(host=None,project=None,query=None,dry_run=None):
     """Return one sample file with all attributes."""
 
+    host=sdindex.get_best_index() if host is None else host
+
     project_filter='' if project is None else "&project=%s"%project
     query_filter='' if query is None else "&query=%s"%query
 
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the queue service, which hands transfers to remote workers.
+
+Overview
+    - when 'module.queue_service' is true, the daemon doesn't download files
+      itself, but serves the transfer queue to workers (JSON-RPC over HTTP)
+    - a worker claims transfers, downloads files to the shared storage, then
+      reports results (see sdqueueworker)
+    - each claimed transfer is leased to the worker for
+      'queue_service.lease_duration' seconds, and the worker renews its leases
+      while downloading
+    - when a lease expires (e.g. worker host crash), the transfer returns to
+      the queue (i.e. status is set back to 'waiting')
+
+Notes
+    - requests are processed in the daemon main thread, between two
+      scheduler iterations (so the database is only accessed by the daemon
+      connection)
+    - a result is rejected if the lease has been lost meanwhile (as the
+      transfer may have been handed to another worker)
+    - leases are extended when the service starts, so workers have time to
+      renew their leases after a daemon restart
+"""
+
+import os
+import time
+import base64
+import argparse
+import BaseHTTPServer
+import pyjsonrpc
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdtime
+import sddb
+import sdfiledao
+import sddatasetdao
+import sdleasedao
+import sdtask
+import sddmdefault
+import sdexception
+from sdexception import SDException
+
+TRANSFER_KEYS=['file_id','file_functional_id','url','local_path','size','checksum','checksum_type','start_date']
+RESULT_KEYS=['status','error_msg','sdget_status','sdget_error_msg','end_date','duration','rate']
+
+REQUEST_TIMEOUT=30 # seconds (so a stalled client cannot block the daemon)
+
+def claim(worker,count):
+    """Hand at most 'count' transfers to the worker."""
+    transfers=sdtask.get_transfers(count) # note: transfers status is set to 'running'
+
+    try:
+        expiry_date=get_expiry_date()
+        for tr in transfers:
+            sdleasedao.add_lease(tr.file_id,worker,expiry_date,commit=False)
+        sddb.conn.commit()
+    except Exception,e:
+        sddb.conn.rollback()
+
+        # transfers return to the queue
+        for tr in transfers:
+            tr.status=sdconst.TRANSFER_STATUS_WAITING
+            sdfiledao.update_file(tr)
+
+        raise
+
+    if len(transfers)>0:
+        sdlog.info("SDQUEUES-001","%i transfer(s) handed to worker (worker=%s)"%(len(transfers),worker))
+
+    return {'transfers':[dict((k,getattr(tr,k)) for k in TRANSFER_KEYS) for tr in transfers],
+            'lease_duration':lease_duration}
+
+def renew(worker,file_ids):
+    """Extend worker's leases.
+
+    Returns
+        dict with 'lost' key (list of file_id not leased to the worker
+        anymore)
+    """
+    lost=sdleasedao.renew_leases(file_ids,worker,get_expiry_date())
+
+    if len(lost)>0:
+        sdlog.info("SDQUEUES-002","Lease(s) lost (worker=%s,file_ids=%s)"%(worker,lost))
+
+    return {'lost':lost}
+
+def complete(worker,results):
+    """Store transfers results reported by the worker.
+
+    Returns
+        dict with 'rejected' key (list of file_id which results have been
+        discarded)
+    """
+    rejected=[]
+
+    try:
+        for result in results:
+            tr=get_leased_transfer(result['file_id'],worker)
+            if tr is None:
+                rejected.append(result['file_id'])
+                continue
+
+            for k in RESULT_KEYS:
+                setattr(tr,k,result[k])
+
+            tr.dataset=sddatasetdao.get_dataset(dataset_id=tr.dataset_id)
+
+            if tr.status==sdconst.TRANSFER_STATUS_ERROR and tr.sdget_status!=0 and not result['killed']:
+                if sdconfig.next_url_on_error:
+                    sddmdefault.next_url(tr)
+
+            sdleasedao.delete_lease(tr.file_id,commit=False)
+
+            try:
+                sddmdefault.end_of_transfer(tr,commit=False)
+            except sdexception.FatalException,e:
+                pass # sdget fatal error only stops the worker (see sdqueueworker)
+
+        sddb.conn.commit()
+    except Exception,e:
+        sddb.conn.rollback()
+        raise
+
+    return {'rejected':rejected}
+
+def get_leased_transfer(file_id,worker):
+    """Return the transfer if it is still leased to the worker, else None."""
+
+    lease=sdleasedao.get_lease(file_id)
+    if lease is None or lease['worker']!=worker:
+        sdlog.info("SDQUEUES-003","Result rejected as lease has been lost (worker=%s,file_id=%i)"%(worker,file_id))
+        return None
+
+    li=sdfiledao.get_files(file_id=file_id)
+    if len(li)==0 or li[0].status!=sdconst.TRANSFER_STATUS_RUNNING:
+        # transfer has been removed or modified meanwhile (e.g. 'synda remove')
+
+        sdlog.info("SDQUEUES-004","Result rejected as transfer is not running anymore (worker=%s,file_id=%i)"%(worker,file_id))
+        sdleasedao.delete_lease(file_id,commit=False)
+        return None
+
+    return li[0]
+
+def release_expired_leases():
+    """Move transfers with an expired lease back to the queue."""
+
+    for lease in sdleasedao.get_expired_leases(sdtime.now()):
+        li=sdfiledao.get_files(file_id=lease['file_id'])
+
+        if len(li)>0 and li[0].status==sdconst.TRANSFER_STATUS_RUNNING:
+            tr=li[0]
+
+            sdlog.info("SDQUEUES-005","Lease expired: transfer returns to the queue (worker=%s,file_id=%i)"%(lease['worker'],tr.file_id))
+
+            # remove file chunk (same as for zombie transfers, see sdtaskscheduler)
+            if os.path.isfile(tr.get_full_local_path()):
+                os.remove(tr.get_full_local_path())
+
+            tr.status=sdconst.TRANSFER_STATUS_WAITING
+            sdfiledao.update_file(tr,commit=False)
+
+        sdleasedao.delete_lease(lease['file_id'],commit=False)
+
+    sddb.conn.commit()
+
+def get_expiry_date():
+    return sdtime.add_second(sdtime.now(),lease_duration)
+
+class QueueServiceRequestHandler(pyjsonrpc.HttpRequestHandler):
+    methods={'claim':claim,
+             'renew':renew,
+             'complete':complete}
+
+    timeout=REQUEST_TIMEOUT
+
+    def parse_request(self):
+        if not BaseHTTPServer.BaseHTTPRequestHandler.parse_request(self):
+            return False
+
+        if self.headers.get('Authorization','')!=authorization:
+            sdlog.info("SDQUEUES-006","Authentication failed (client=%s)"%self.client_address[0])
+            self.send_error(401,"Authorization Required")
+            return False
+
+        return True
+
+    def log_message(self,format,*args):
+        sdlog.debug("SDQUEUES-007",format%args)
+
+def start():
+    """Start listening (must be called once, before serve())."""
+    global http_server
+
+    if password=='foobar':
+        raise SDException('SDQUEUES-010','Incorrect password (default password need to be changed)')
+
+    http_server=BaseHTTPServer.HTTPServer((host,port),QueueServiceRequestHandler)
+
+    sdleasedao.renew_all_leases(get_expiry_date())
+
+    sdlog.info("SDQUEUES-008","Queue service listening on %s:%i"%(host,port))
+
+def serve(duration):
+    """Process incoming requests during 'duration' seconds (this func replaces the scheduler sleep)."""
+
+    release_expired_leases()
+
+    end=time.time()+duration
+    while True:
+        remaining=end-time.time()
+        if remaining<=0:
+            break
+
+        http_server.timeout=remaining
+        http_server.handle_request() # returns after one request, or on timeout
+
+def stop():
+    if http_server is not None:
+        http_server.server_close()
+        sdlog.info("SDQUEUES-009","Queue service stopped")
+
+# init.
+
+host=sdconfig.config.get('queue_service','host')
+port=sdconfig.config.getint('queue_service','port')
+username=sdconfig.config.get('queue_service','username')
+password=sdconfig.config.get('queue_service','password')
+lease_duration=sdconfig.config.getint('queue_service','lease_duration')
+
+authorization='Basic %s'%base64.b64encode('%s:%s'%(username,password))
+http_server=None
+
+if lease_duration<1:
+    raise SDException("SDQUEUES-011","Incorrect value for 'queue_service.lease_duration' parameter (%i)"%lease_duration)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r','--release',action='store_true',help='Release expired leases')
+    args = parser.parse_args()
+
+    if args.release:
+        release_expired_leases()
+
+    for l in sdleasedao.get_leases():
+        print "file_id=%i,worker=%s,expiry_date=%s"%(l['file_id'],l['worker'],l['expiry_date'])
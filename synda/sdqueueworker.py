@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the remote download worker.
+
+The worker claims transfers from the queue service (see sdqueueservice),
+downloads files to the shared storage, then reports results.
+
+Notes
+    - the worker doesn't access the database, so it can run on any host
+      which mounts the shared storage (as 'core.data_path')
+    - many workers can run on the same host (e.g. to test the service
+      locally), as long as each worker has a different name
+    - parallel downloads count is set by 'download.max_parallel_download'
+    - leases are renewed every third of the lease duration
+    - if the queue service cannot be reached, results are kept and sent
+      again later (e.g. during a daemon restart)
+"""
+
+import os
+import time
+import socket
+import signal
+import Queue
+import argparse
+import pyjsonrpc
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdlogon
+import sddownload
+import sdworkerutils
+from sdtypes import File
+from sdexception import SDException
+
+LOOP_SLEEP=2              # seconds
+RPC_TIMEOUT=60            # seconds
+LEASE_RENEWAL_RATIO=3     # leases are renewed 3 times per lease duration
+
+class Download():
+    exception_occurs=False # this flag is used to stop the worker if exception occurs in thread
+
+    @classmethod
+    def run(cls,tr):
+        try:
+            tr.killed=sddownload.run(tr)
+        except Exception,e:
+            # the transfer is reported anyway (else its lease would be renewed forever)
+
+            sdlog.error("SDQWORKE-001","Error occurs during download (file_id=%i,%s)"%(tr.file_id,str(e)))
+
+            tr.status=sdconst.TRANSFER_STATUS_ERROR
+            tr.error_msg='Error occurs during download.'
+            tr.killed=False
+
+        # unset metrics fields if transfer did not complete successfully
+        if tr.status!=sdconst.TRANSFER_STATUS_DONE:
+            tr.duration=None
+            tr.rate=None
+
+def run(name,slots,exit_when_empty=False):
+    """Process transfers until the worker is stopped.
+
+    Args
+        exit_when_empty: if True, stop once no more transfer is waiting
+    """
+    global quit
+
+    if slots<1:
+        raise SDException("SDQWORKE-010","Incorrect slots count (%i)"%slots)
+
+    sdlog.info("SDQWORKE-002","Worker started (name=%s,slots=%i,service=%s)"%(name,slots,url))
+
+    running={} # file_id => transfer
+    results=[] # results not sent yet
+    lease_duration=None
+    last_renewal=time.time()
+
+    while True:
+
+        # collect finished transfers
+        while True:
+            try:
+                tr=eot_queue.get_nowait()
+            except Queue.Empty, e:
+                break
+
+            del running[tr.file_id]
+            results.append(get_result(tr))
+
+            if getattr(tr,'sdget_status',None)==4:
+                sdlog.info("SDQWORKE-003","Stopping worker as sdget.download() returned fatal error.")
+                quit=1
+
+        # report results
+        if len(results)>0:
+            response=call('complete',name,results)
+            if response is not None:
+                for file_id in response['rejected']:
+                    sdlog.info("SDQWORKE-004","Result rejected by the queue service (file_id=%i)"%file_id)
+                results=[]
+
+        # renew leases
+        if len(running)>0 and lease_duration is not None:
+            if time.time()-last_renewal>float(lease_duration)/LEASE_RENEWAL_RATIO:
+                response=call('renew',name,running.keys())
+                if response is not None:
+                    for file_id in response['lost']:
+                        sdlog.info("SDQWORKE-005","Lease lost, result will be rejected (file_id=%i)"%file_id)
+                    last_renewal=time.time()
+
+        if Download.exception_occurs:
+            quit=1
+
+        if quit==1:
+            if len(running)==0 and len(results)==0:
+                break
+        else:
+
+            # claim new transfers
+            count=slots-len(running)
+            if count>0:
+                response=call('claim',name,count)
+                if response is not None:
+                    lease_duration=response['lease_duration']
+
+                    if len(running)==0:
+                        last_renewal=time.time()
+
+                    transfers=[File(**t) for t in response['transfers']]
+                    if len(transfers)>0:
+                        start_transfers(transfers)
+                        for tr in transfers:
+                            running[tr.file_id]=tr
+                    elif exit_when_empty and len(running)==0 and len(results)==0:
+                        break
+
+        time.sleep(LOOP_SLEEP)
+
+    sdlog.info("SDQWORKE-006","Worker stopped (name=%s)"%name)
+
+def start_transfers(transfers):
+
+    # renew certificate if needed
+    try:
+        sdlogon.renew_certificate(sdconfig.openid,sdconfig.password,force_renew_certificate=False)
+    except Exception,e:
+        sdlog.error("SDQWORKE-007","Exception occured while retrieving certificate (%s)"%str(e))
+        raise
+
+    for tr in transfers:
+        th=sdworkerutils.WorkerThread(tr,eot_queue,Download)
+        th.setDaemon(True)
+        th.start()
+
+def get_result(tr):
+    return {'file_id':tr.file_id,
+            'status':tr.status,
+            'error_msg':tr.error_msg,
+            'sdget_status':getattr(tr,'sdget_status',None),
+            'sdget_error_msg':getattr(tr,'sdget_error_msg',None),
+            'end_date':getattr(tr,'end_date',None),
+            'duration':getattr(tr,'duration',None),
+            'rate':getattr(tr,'rate',None),
+            'killed':tr.killed}
+
+def call(method,*args):
+    """Call queue service method.
+
+    Returns
+        method response, or None if the service cannot be reached
+    """
+    try:
+        return service.call(method,*args)
+    except Exception,e:
+        sdlog.error("SDQWORKE-008","Queue service error (method=%s,%s,%s)"%(method,e.__class__.__name__,str(e)))
+        return None
+
+def terminate(signum,frame):
+    global quit
+
+    sdlog.info("SDQWORKE-009","Shutdown in progress (waiting for running transfers)..",stderr=True)
+    quit=1
+
+def get_default_name():
+    return '%s:%i'%(socket.gethostname(),os.getpid())
+
+# init.
+
+host=sdconfig.config.get('queue_service','host')
+port=sdconfig.config.getint('queue_service','port')
+username=sdconfig.config.get('queue_service','username')
+password=sdconfig.config.get('queue_service','password')
+
+url='http://%s:%i'%(host,port)
+service=pyjsonrpc.HttpClient(url=url,username=username,password=password,timeout=RPC_TIMEOUT)
+eot_queue=Queue.Queue()
+quit=0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n','--name',default=get_default_name(),help='Worker name (must be unique)')
+    parser.add_argument('-s','--slots',type=int,default=sdconfig.config.getint('download','max_parallel_download'),help='Parallel downloads count')
+    parser.add_argument('-e','--exit_when_empty',action='store_true',help='Stop once no more transfer is waiting')
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT,terminate)
+    signal.signal(signal.SIGTERM,terminate)
+
+    run(args.name,args.slots,args.exit_when_empty)
@@ -17,7 +17,7 @@ import sddb
 import sdrebuildquery
 import sddatasetdao
 import sdfiledao
-import sdtimestamp
+import sdbatchtimestamp
 import sdfields
 import sdlog
 import sddump
@@ -124,18 +124,7 @@ def set_timestamp_when_empty__BATCH_MODE_2(project='CMIP5'):
     """
     datasets_without_timestamp=sddatasetdao.get_datasets(project=project,timestamp=None) # retrieve datasets with timestamp not set
     sdlog.info("SDREBUIL-004","Updating %i dataset(s) timestamp."%len(datasets_without_timestamp))
-    for dataset_without_timestamp in datasets_without_timestamp:
-        try:
-            sdtimestamp.fill_missing_dataset_timestamp(dataset_without_timestamp)
-        except SDException, e:
-            if e.code in ['SDTIMEST-011','SDTIMEST-008','SDTIMEST-800']:
-                sdlog.info("SDREBUIL-694","Timestamp not set for dataset (reason=%s,dataset=%s)"%(e.code,dataset_without_timestamp.dataset_functional_id))
-            else:
-                # fatal error come here
-
-                raise
-
-    sddb.conn.commit()
+    sdbatchtimestamp.fill_missing_dataset_timestamps(datasets_without_timestamp) # note: commit is done after each batch
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -63,7 +63,7 @@ def run(pname=None,host=None,facets_group=None,dry_run=False):
     facets_group['fields']=['*'] # TODO: maybe this is not needed to retrieve parameter (maybe we can set 'fields' only to 'id', or something like that)
 
     # set index host
-    host=sdindex.get_default_index() if host is None else host
+    host=sdindex.get_best_index() if host is None else host
 
     # build url
     url=sdremotequtils.build_url(facets_group,host)
@@ -28,6 +28,7 @@ import sdapp
 import sdconst
 import sdlog
 import sddquery
+import sdfields
 import sdpipelineutils
 import sdremotequtils
 import sdconfig
@@ -54,9 +55,9 @@ def build_query(facets_group):
     if 'type' not in facets_group:
         facets_group['type']=['File'] # set as list (all Search-API facets are list at this point)
 
-    # if 'fields' not set, we retrieve all attributes
+    # if 'fields' not set, we only retrieve attributes used downstream (see sdfields)
     if 'fields' not in facets_group:
-        facets_group['fields']=['*']
+        facets_group['fields']=get_fields(facets_group)
 
 
     searchapi_host=facets_group.get('searchapi_host',None)
@@ -84,13 +85,26 @@ def build_query(facets_group):
     if sdconfig.copy_ds_attrs:
         if action is not None:
             if action=='install':
-                ds_attrs_facets=transform_facets_for_dataset_attrs_retrieval(facets)
+                ds_attrs_facets=transform_facets_for_dataset_attrs_retrieval(facets,facets_group)
                 query['dataset_attrs_url']=sdremotequtils.build_url(ds_attrs_facets,searchapi_host) # TAG3JKWW93K4J4JKDZS
 
 
 
     return query
 
+def get_fields(facets_group):
+    """Return the fields needed downstream (all fields if the query cannot be planned)."""
+
+    if len(facets_group['type'])!=1:
+        return ['*']
+
+    type_=facets_group['type'][0]
+    action=sddquery.get_scalar(facets_group,'action')
+    local_path_format=sddquery.get_scalar(facets_group,'local_path_format')
+    local_path_drs_template=sddquery.get_scalar(facets_group,'local_path_drs_template')
+
+    return sdfields.get_fields(type_,action,local_path_format,local_path_drs_template)
+
 def transform_facets_for_dataset_timestamp_retrieval(facets):
     """Force attributes for dataset timestamp retrieval."""
 
@@ -129,14 +143,18 @@ def transform_facets_for_dataset_timestamp_retrieval(facets):
 
     return facets_cpy
 
-def transform_facets_for_dataset_attrs_retrieval(facets):
+def transform_facets_for_dataset_attrs_retrieval(facets,facets_group):
     """Force attributes for dataset attrs retrieval."""
 
     # do not alter original facets object
     facets_cpy=copy.deepcopy(facets)
 
     facets_cpy['type']=['Dataset']
-    facets_cpy['fields']=['*']
+
+    # only retrieve attributes used in 'local_path_drs_template' (TAGJ43JK55J8K78)
+    local_path_format=sddquery.get_scalar(facets_group,'local_path_format')
+    local_path_drs_template=sddquery.get_scalar(facets_group,'local_path_drs_template')
+    facets_cpy['fields']=sdfields.get_dataset_attrs_fields(local_path_format,local_path_drs_template)
 
     return facets_cpy
 
@@ -16,11 +16,9 @@ import sys
 import argparse
 from sdtools import print_stderr,print_stdout
 import sdexception
-import sdmdcommon
 import sddelete
 import sddeletefile
 import sddeletedataset
-import sdcleanup
 import sdtypes
 import syndautils
 import sdearlystreamutils
@@ -57,7 +55,7 @@ def run_local(args,stream):
                 print_stdout(buf)
 
         # transform object to dict (needed as remove_helper() expect list of dict, not list of File)
-        files=[f.__dict__ for f in files]
+        files=[f.to_dict() for f in files]
 
         metadata=sdtypes.Metadata(files=files)
     except sdexception.EmptySelectionException, e:
@@ -135,27 +133,14 @@ def remove(metadata,remove_all=True):
     # corresponding line in sdtask. Note that a code review is needed if both
     # are enabled simultaneously (e.g. see TAGKRE45343J54K5JK))
     #
-    sddeletefile.delete_transfers_lowmem(remove_all)
-
-    if remove_all:
-        print_stderr("Remove empty folders and files.. (may take some time)")
+    # Note
+    #     Empty files and folders (DATA) are also removed during this step.
+    #
+    sddeletefile.delete_transfers_lowmem(remove_all,verbose=True)
 
     # Third step is to remove orphan dataset (METADATA)
     sddeletedataset.purge_orphan_datasets()
 
-    # Fourth step is to remove orphan folder (DATA)
-    if remove_all:
-
-        # part
-        paths=sdmdcommon.get_attributes(metadata,'local_path')  # retrieve paths
-        paths=[os.path.dirname(p) for p in paths]               # remove filenames
-        paths=[sdtypes.build_full_local_path(p) for p in paths] # switch to full path
-        paths=[os.path.realpath(p) for p in paths]              # follow symlink
-        sdcleanup.part_cleanup(paths)                           # remove paths
-
-        # full
-        #sdcleanup.full_cleanup()
-
 # init.
 
 if __name__ == '__main__':
@@ -85,7 +85,7 @@ def sequential_exec(queries):
     metadata=sdtypes.Metadata()
     for i,q in enumerate(queries):
         sdlog.info("SYNDARUN-001","Process query %d"%i)
-        result=search.run(url=q['url'],attached_parameters=q.get('attached_parameters'))
+        result=search.run_with_failover(url=q['url'],attached_parameters=q.get('attached_parameters'))
         metadata.slurp(result)
     return metadata
 
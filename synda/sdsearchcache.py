@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains the search-API response cache.
+
+Notes
+    - paginated search results are stored on disk (see sdsqlitedict), keyed
+      by the normalized query url (parameters sorted, index host removed as
+      the result is checked against the index anyway)
+    - before a cached result is used, it is revalidated with two count
+      queries (limit=0): the total match count ('numFound') must be
+      unchanged, and no record must have a '_timestamp' later than the
+      latest cached '_timestamp' (added or modified records get a new
+      '_timestamp')
+    - entries older than 'index.search_cache_ttl' seconds are refetched
+    - results without '_timestamp' attribute are not cached (as they cannot
+      be revalidated)
+    - cache errors are not fatal (search-API is called instead)
+"""
+
+import os
+import time
+import datetime
+import urllib
+import urlparse
+import threading
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdtypes
+import sdnetutils
+import sdsqlitedict
+
+IGNORED_PARAMETERS=['limit','offset'] # pagination parameters
+TIMESTAMP_FORMAT='%Y-%m-%dT%H:%M:%SZ'
+
+def get(url):
+    """Return cached result as Metadata object (None if not cached or outdated)."""
+
+    try:
+        key=get_key(url)
+
+        with lock:
+            entry=get_cache().get(key)
+
+        if entry is None:
+            return None
+
+        if time.time()-entry['date']>ttl:
+            sdlog.debug("SDSCACHE-001","Cache entry expired (%s)"%key)
+            delete(key)
+            return None
+
+        if not revalidate(url,entry):
+            sdlog.info("SDSCACHE-002","Cache entry outdated (%s)"%key)
+            delete(key)
+            return None
+
+        metadata=sdtypes.Metadata()
+        with lock:
+            cache=get_cache()
+            for i in range(entry['chunks']):
+                metadata.add_files(cache[get_chunk_key(key,i)])
+
+        sdlog.info("SDSCACHE-003","Result retrieved from cache (files-count=%i,%s)"%(metadata.count(),key))
+
+        return metadata
+
+    except Exception,e:
+        sdlog.warning("SDSCACHE-004","Error occurs while reading cache (%s,%s)"%(url,str(e)))
+        return None
+
+def put(url,metadata):
+    """Store result (Metadata object)."""
+
+    try:
+        key=get_key(url)
+
+        with lock:
+            cache=get_cache()
+
+            remove_entry(cache,key)
+
+            latest_timestamp=None # latest '_timestamp' (second precision)
+            count=0
+            i=0
+            for chunk in metadata.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+                for f in chunk:
+                    if '_timestamp' not in f:
+                        sdlog.debug("SDSCACHE-005","Result not cached as '_timestamp' attribute is missing (%s)"%key)
+                        remove_entry(cache,key,i)
+                        return
+
+                    timestamp=truncate_timestamp(f['_timestamp'])
+                    if latest_timestamp is None or timestamp>latest_timestamp:
+                        latest_timestamp=timestamp
+
+                cache[get_chunk_key(key,i)]=chunk
+                count+=len(chunk)
+                i+=1
+
+            # entry is written last, so an incomplete entry is never used
+            cache[key]={'date':time.time(),
+                        'chunks':i,
+                        'num_found':count,
+                        'latest_timestamp':latest_timestamp}
+
+    except Exception,e:
+        sdlog.warning("SDSCACHE-006","Error occurs while writing cache (%s,%s)"%(url,str(e)))
+
+def revalidate(url,entry):
+    """Return True if the index still returns the cached result."""
+
+    if get_count(url)!=entry['num_found']:
+        return False
+
+    if entry['latest_timestamp'] is not None:
+        if get_count("%s&from=%s"%(url,get_next_second(entry['latest_timestamp'])))>0:
+            return False
+
+    return True
+
+def get_count(url):
+    request=sdtypes.Request(url=url,pagination=False,limit=0)
+    response=sdnetutils.call_web_service(request.get_url(),timeout=sdconst.SEARCH_API_HTTP_TIMEOUT)
+    return response.num_found
+
+def delete(key):
+    with lock:
+        remove_entry(get_cache(),key)
+
+def remove_entry(cache,key,chunks=None):
+    """Remove entry and its chunks (if 'chunks' is set, remove those chunks even if entry doesn't exist)."""
+
+    if chunks is None:
+        entry=cache.get(key)
+        chunks=entry['chunks'] if entry is not None else 0
+
+    if key in cache:
+        del cache[key]
+
+    for i in range(chunks):
+        chunk_key=get_chunk_key(key,i)
+        if chunk_key in cache:
+            del cache[chunk_key]
+
+def purge():
+    """Remove expired entries."""
+
+    with lock:
+        cache=get_cache()
+
+        keys=[key for key,entry in cache.iteritems() if isinstance(entry,dict) and time.time()-entry['date']>ttl]
+        for key in keys:
+            remove_entry(cache,key)
+
+    return len(keys)
+
+def get_key(url):
+    """Return normalized url."""
+
+    (scheme,netloc,path,query,fragment)=urlparse.urlsplit(url)
+
+    parameters=[(name,value) for (name,value) in urlparse.parse_qsl(query,keep_blank_values=True) if name not in IGNORED_PARAMETERS]
+
+    return "%s?%s"%(path,urllib.urlencode(sorted(parameters)))
+
+def get_chunk_key(key,i):
+    return "%s#%i"%(key,i)
+
+def truncate_timestamp(timestamp):
+    """Remove fractional seconds (e.g. '2016-05-11T12:00:00.123Z' => '2016-05-11T12:00:00Z')."""
+    return "%sZ"%timestamp[:19]
+
+def get_next_second(timestamp):
+    date=datetime.datetime.strptime(timestamp,TIMESTAMP_FORMAT)+datetime.timedelta(seconds=1)
+    return date.strftime(TIMESTAMP_FORMAT)
+
+def get_cache():
+    """Return cache (sqlite connection can only be used in the thread which created it, so there is one connection per thread)."""
+
+    if not hasattr(local,'cache'):
+        local.cache=sdsqlitedict.SqliteDict(path=cache_file,table='search_cache')
+
+    return local.cache
+
+# init.
+
+enabled=sdconfig.config.getboolean('index','search_cache')
+ttl=sdconfig.config.getint('index','search_cache_ttl')
+cache_file=sdconfig.search_cache_file
+
+lock=threading.Lock()
+local=threading.local()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p','--purge',action='store_true',help='Remove expired entries')
+    parser.add_argument('-c','--clear',action='store_true',help='Remove all entries')
+    args = parser.parse_args()
+
+    if args.clear:
+        if os.path.isfile(cache_file):
+            os.remove(cache_file)
+    elif args.purge:
+        print "%i entrie(s) removed"%purge()
+    else:
+        for key,entry in get_cache().iteritems():
+            if isinstance(entry,dict):
+                print "%s (files=%i,age=%is)"%(key,entry['num_found'],time.time()-entry['date'])
@@ -17,6 +17,8 @@ import sdapp
 from sdexception import SDException
 import sddb
 
+DEFAULT_ARRAYSIZE=1000
+
 def sql_injection_safe(s):
     regex=r'[^a-zA-Z0-9_]'
     match=re.search(regex,s)
@@ -29,8 +31,29 @@ def get_object_from_resultset(rs,class_):
     kw=resultset_to_dict(rs)
     return class_(**kw)
 
+def fetch_rows(c,arraysize=DEFAULT_ARRAYSIZE):
+    """Yield rows from an executed cursor, fetching them by blocks.
+
+    Note
+        The cursor is closed once all rows have been fetched (or when the
+        generator is garbage collected).
+    """
+    try:
+        while True:
+            results=c.fetchmany(arraysize)
+            if not results:
+                break
+            for rs in results:
+                yield rs
+    finally:
+        c.close()
+
 def get_tablename(o):
     # beware: this method works only if the object name is the same as the table name (case excluded)
+    # (or if the class explicitly sets the table name (e.g. FileRow))
+
+    if hasattr(o.__class__,'tablename'):
+        return o.__class__.tablename
 
     return o.__class__.__name__.lower() # (e.g. File gives "file")
 
@@ -78,10 +101,10 @@ def insert(instance,columns_subset,commit,conn):
     def get_dict(instance,keys):
         d={}
         if keys is None:
-            d=instance.__dict__
+            d=instance.to_dict() if hasattr(instance,'to_dict') else instance.__dict__
         else:
             for k in keys:
-                d[k]=instance.__dict__[k]
+                d[k]=getattr(instance,k) # not '__dict__' here, as row based instances (e.g. FileRow) load columns lazily
 
         return d
 
@@ -105,27 +128,31 @@ def insert(instance,columns_subset,commit,conn):
 
     return id_
 
-def update(instance,columns_subset_without_pk,commit,conn):
+def update(instance,columns_subset_without_pk,commit,conn,tablename=None):
     """This func update data in table using placeholders.
 
     Note:
         - If 'columns_subset_without_pk' is None, all instance members are updated.
+        - 'tablename' can be used to update another table than the instance
+          table (e.g. 'file_data' for 'file'), but the primary key name is still
+          deduced from the instance table.
     """
 
     def get_dict(instance,keys,pkname):
         d_without_pk={}
 
         for k in keys:
-            d_without_pk[k]=instance.__dict__[k]
+            d_without_pk[k]=getattr(instance,k)
 
-        d_with_pk={pkname:instance.__dict__[pkname]}
+        d_with_pk={pkname:getattr(instance,pkname)}
         d_with_pk.update(d_without_pk)
 
         return (d_with_pk,d_without_pk)
 
 
-    tablename=get_tablename(instance)
-    pk=tablename+'_id'
+    pk=get_tablename(instance)+'_id'
+    if tablename is None:
+        tablename=get_tablename(instance)
 
     # create dict containing key/val list to be updated
     (d_with_pk,d_without_pk)=get_dict(instance,columns_subset_without_pk,pk)
@@ -157,6 +157,10 @@ def run(subparsers):
     subparser=create_subparser(subparsers,'daemon',common_option=False,help='Daemon management',note=sdi18n.m0023)
     add_action_argument(subparser,choices=['start','stop','status'])
 
+    subparser=create_subparser(subparsers,'db',common_option=False,help='Database maintenance',note=sdi18n.m0028)
+    add_action_argument(subparser,choices=['maintain','vacuum'])
+    subparser.add_argument('-f','--full_check',action='store_true',help="Also check indexes content during integrity check (slow)")
+
     subparser=create_subparser(subparsers,'dump',help='Display raw metadata',example=sdcliex.dump())
     add_parameter_argument(subparser)
     sdcommonarg.add_type_grp(subparser)
@@ -222,6 +226,7 @@ def run(subparsers):
 
     subparser=create_subparser(subparsers,'queue',common_option=False,help='Display download queue status',example=sdcliex.queue())
     subparser.add_argument('project',nargs='?',default=None,help='ESGF project (e.g. CMIP5)')
+    subparser.add_argument('-j','--json',action='store_true',help='Print completion time forecast (ETA) in JSON format')
 
     subparser=create_subparser(subparsers,'remove',help='Remove dataset',example=sdcliex.remove())
     add_parameter_argument(subparser)
@@ -279,3 +284,9 @@ def run(subparsers):
     #sdcommonarg.add_type_grp(subparser) # disabled as type depend on user input (e.g. file_functional_id, dataset_functional_id, etc..)
 
     subparser=create_subparser(subparsers,'watch',common_option=False,help='Display running transfer')
+    subparser.add_argument('-j','--json',action='store_true',help='Print completion time forecast (ETA) in JSON format')
+
+    subparser=create_subparser(subparsers,'worker',common_option=False,help='Run remote download worker',note=sdi18n.m0029)
+    subparser.add_argument('-n','--name',default=None,help='Worker name (default is <hostname>:<pid>)')
+    subparser.add_argument('-s','--slots',type=int,default=None,help="Parallel downloads count (default is 'download.max_parallel_download')")
+    subparser.add_argument('-e','--exit_when_empty',action='store_true',help='Stop once no more transfer is waiting')
@@ -27,6 +27,8 @@ import sdlog
 import sddb
 import sddeletefile
 import sdtrace
+import sdfairshare
+import sdlocality
 from sdexception import NoTransferWaitingException,FatalException,RemoteException
 from sdtypes import File
 
@@ -129,23 +131,43 @@ def pre_transfer_check_list(tr):
 
 @sdprofiler.timeit
 def transfers_begin():
-    transfers=[]
-
     new_transfer_count=max_transfer - sdfilequery.transfer_running_count() # compute how many new transfer can be started
     if new_transfer_count>0:
-        for i in range(new_transfer_count):
-            try:
+        transfers=get_transfers(new_transfer_count)
+    else:
+        transfers=[]
+
+    dmngr.transfers_begin(transfers)
+
+def get_transfers(count):
+    """Return at most 'count' transfers ready to start (status is set to 'running').
+
+    Note
+        also used by the queue service to hand transfers to remote workers
+    """
+    transfers=[]
+
+    for i in range(count):
+        try:
+            if fairshare:
+                tr=sdfairshare.get_one_waiting_transfer()
+            elif locality_ordering:
+                tr=sdlocality.get_one_waiting_transfer()
+            else:
                 tr=sddao.get_one_waiting_transfer()
 
-                prepare_transfer(tr)
+            prepare_transfer(tr)
 
-                if pre_transfer_check_list(tr):
-                    sdfiledao.update_file(tr)
-                    transfers.append(tr)
-            except NoTransferWaitingException, e:
-                pass
+            if pre_transfer_check_list(tr):
+                sdfiledao.update_file(tr)
+                transfers.append(tr)
+        except NoTransferWaitingException, e:
+            pass
 
-    dmngr.transfers_begin(transfers)
+    if locality_ordering and len(transfers)>0:
+        sdlocality.create_directories(transfers)
+
+    return transfers
 
 def get_download_manager():
     download_manager='globustransfer_dm' if sdconfig.config.getboolean('module','globustransfer') else 'default_dm'
@@ -167,7 +189,12 @@ def fatal_exception():
 
 # init.
 
-max_transfer=sdconfig.config.getint('download','max_parallel_download')
+if sdconfig.config.getboolean('module','globustransfer'):
+    max_transfer=sdconfig.config.getint('globustransfer','max_running_files') # Globus transfers are done server side, so many files are submitted at once (i.e. in a few large Globus tasks)
+else:
+    max_transfer=sdconfig.config.getint('download','max_parallel_download')
 lfae_mode=sdconfig.config.get('behaviour','lfae_mode')
+fairshare=sdconfig.config.getboolean('download','fairshare')
+locality_ordering=sdconfig.config.getboolean('download','locality_ordering') and not fairshare
 
 dmngr=get_download_manager()
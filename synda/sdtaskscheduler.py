@@ -30,6 +30,8 @@ import sdlogon
 import sdtask
 import sdprofiler
 import sdfilequery
+import sdleasedao
+import sdindex
 from sdexception import FatalException,SDException,OpenIDNotSetException
 
 def terminate(signal,frame):
@@ -76,9 +78,12 @@ def cleanup_running_transfer():
         - remaining "running" transfers exist if the daemon has been killed or if the server rebooted when the daemon was running)
         - if there are still transfers in running state, we switch them to waiting and remove file chunk
     """
-    transfer_list=sdfiledao.get_files(status=sdconst.TRANSFER_STATUS_RUNNING)
+    for t in sdfiledao.get_files_pagination(status=sdconst.TRANSFER_STATUS_RUNNING):
+
+        if sdconfig.queue_service:
+            if sdleasedao.get_lease(t.file_id) is not None:
+                continue # transfer is running on a remote worker (see sdqueueservice)
 
-    for t in transfer_list:
         sdlog.info("SDTSCHED-023","fixing transfer status (%s)"%t.get_full_local_path())
 
         if os.path.isfile(t.get_full_local_path()):
@@ -129,7 +134,7 @@ def run_hard_tasks():
 def run_soft_tasks():
     """Soft tasks are not executed during application shutdown."""
 
-    if sdconfig.download:
+    if sdconfig.download and not sdconfig.queue_service:
         sdtask.transfers_begin()
 
     # disabled for now (deletion occurs in realtime in interactive code)
@@ -140,6 +145,9 @@ def run_soft_tasks():
 
 @sdprofiler.timeit
 def can_leave():
+    if sdconfig.queue_service:
+        return sdtask.can_leave() # remote transfers are not waited for (leases are kept, so workers report results once the daemon is restarted)
+
     return sdfilequery.transfer_running_count()==0 and sdtask.can_leave()
 
 def event_loop():
@@ -149,6 +157,7 @@ def event_loop():
 
     scheduler_state=2
     start_watchdog()
+    sdindex.start_probe()
     cleanup_running_transfer()
     scheduler_state=1
 
@@ -184,6 +193,10 @@ def event_loop():
             sdlog.error("SDTSCHED-920","Error occured while retrieving ESGF certificate",stderr=True)
             raise
 
+    if sdconfig.queue_service:
+        import sdqueueservice
+        sdqueueservice.start()
+
     sdlog.info("SDTSCHED-902","Transfer daemon is now up and running",stderr=True)
 
     while True:
@@ -204,10 +217,16 @@ def event_loop():
                 sdlog.info("SDTSCHED-003","Running transfer processing completed",stderr=False)
                 break
 
-        time.sleep(main_loop_sleep)
+        if sdconfig.queue_service:
+            sdqueueservice.serve(main_loop_sleep) # process workers requests while waiting
+        else:
+            time.sleep(main_loop_sleep)
 
         sdlog.debug("SDTSCHED-400","end of event loop")
 
+    if sdconfig.queue_service:
+        sdqueueservice.stop()
+
     print
     sdlog.info("SDTSCHED-901","Scheduler successfully stopped",stderr=True)
 
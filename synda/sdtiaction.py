@@ -170,6 +170,21 @@ def daemon(args):
         elif args.action=="status":
             sddaemon.print_daemon_status()
 
+def db(args):
+    import sddbmaintenance,sddaemon
+
+    if args.action is None:
+        sddbmaintenance.print_stats('current',sddbmaintenance.get_stats())
+    elif args.action=="maintain":
+        ok=sddbmaintenance.maintain(args.full_check,sddaemon.is_running())
+        return 0 if ok else 1
+    elif args.action=="vacuum":
+        if sddaemon.is_running():
+            print_stderr("Daemon must be stopped before running 'vacuum' action (use 'maintain' action while the daemon is running)")
+            return 1
+
+        sddbmaintenance.vacuum()
+
 def facet(args):
     import sdparam,sdremoteparam,syndautils,sdinference,sdignorecase
 
@@ -658,15 +673,23 @@ def pexec(args):
     return 0
 
 def queue(args):
-    import sdfilequery
+    import sdfilequery, sdeta
     from tabulate import tabulate
     from sdprogress import ProgressThread
 
+    if args.json:
+        sdeta.print_json(sdeta.get_eta())
+        return
+
     ProgressThread.start(sleep=0.1,running_message='Collecting status information.. ',end_message='') # spinner start
     li=sdfilequery.get_download_status(args.project)
+    eta=sdeta.get_eta() if args.project is None else None # forecast is computed for all projects
     ProgressThread.stop() # spinner stop
 
     print tabulate(li,headers=['status','count','size'],tablefmt="plain")
+
+    if eta is not None:
+        sdeta.print_eta(eta)
     #sddaemon.print_daemon_status()
 
 def update(args):
@@ -742,13 +765,29 @@ def variable(args):
                 print 'unit:             ',file_['variable_units'][0]
 
 def watch(args):
-    import sdreport, sddaemon
+    import sdreport, sddaemon, sdeta
+
+    if args.json:
+        sdeta.print_json(sdeta.get_eta())
+        return
 
     if sddaemon.is_running():
         sdreport.print_running_transfers()
+        sdeta.print_eta(sdeta.get_eta(),selections=False)
     else:
         print_stderr('Daemon not running')
 
+def worker(args):
+    import signal,sdconfig,sdqueueworker
+
+    name=args.name if args.name is not None else sdqueueworker.get_default_name()
+    slots=args.slots if args.slots is not None else sdconfig.config.getint('download','max_parallel_download')
+
+    signal.signal(signal.SIGINT,sdqueueworker.terminate)
+    signal.signal(signal.SIGTERM,sdqueueworker.terminate)
+
+    sdqueueworker.run(name,slots,args.exit_when_empty)
+
 # init.
 
 # TODO: rename as subcommands
@@ -759,6 +798,7 @@ actions={
     'config':config,
     'contact':contact,
     'daemon':daemon, 
+    'db':db,
     'facet':facet,
     'get':get,
     'history':history, 
@@ -778,5 +818,6 @@ actions={
     'update':update,
     'upgrade':upgrade,
     'variable':variable,
-    'watch':watch
+    'watch':watch,
+    'worker':worker
 }
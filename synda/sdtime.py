@@ -61,6 +61,14 @@ def substract_hour(s,count):
     dt=datetime.datetime.strptime(s,format) - datetime.timedelta(hours=count)
     return datetime_to_isoformat_FIXED(dt)
 
+def add_second(s,count):
+    """
+    Input format example: 2016-11-12 15:59:15.981983
+    """
+    format = '%Y-%m-%d %H:%M:%S.%f'
+    dt=datetime.datetime.strptime(s,format) + datetime.timedelta(seconds=count)
+    return datetime_to_isoformat_FIXED(dt)
+
 def datetime_to_isoformat_FIXED(dt):
     """
     Original datetime isoformat method returns
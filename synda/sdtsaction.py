@@ -199,13 +199,11 @@ def file_list(args):
 # o-------------------------------------------------------o
 
 def dataset_search(args):
-    import sddeferredafter, sdrdataset, sdstream, sdfields, sdearlystreamutils
+    import sddeferredafter, sdrdataset, sdstream
 
     sddeferredafter.add_default_parameter(args.stream,'limit',args.limit)
 
-    lpcme=sdearlystreamutils.test_facet_value_early(args.stream,'local_path_format','custom') # lpcme means 'Local Path Custom Mode Enabled'
-    fields_=sdfields.get_all_dataset_fields() if lpcme else sdfields.get_dataset_light_fields()
-    sddeferredafter.add_forced_parameter(args.stream,'fields',fields_)
+    # note: search-API 'fields' are set by the query planner (see sdfields)
 
     datasets=sdrdataset.get_datasets(stream=args.stream,dry_run=args.dry_run)
 
@@ -219,13 +217,11 @@ def dataset_search(args):
                 sdrdataset.print_list(datasets)
 
 def variable_search(args):
-    import sddeferredafter, sdrdataset, sdrvariable, sdfields, sdearlystreamutils
+    import sddeferredafter, sdrdataset, sdrvariable
 
     sddeferredafter.add_default_parameter(args.stream,'limit',args.limit) # TAGJ43JK3J43
 
-    lpcme=sdearlystreamutils.test_facet_value_early(args.stream,'local_path_format','custom') # lpcme means 'Local Path Custom Mode Enabled'
-    fields_=sdfields.get_all_variable_fields() if lpcme else sdfields.get_variable_light_fields()
-    sddeferredafter.add_forced_parameter(args.stream,'fields',fields_)
+    # note: search-API 'fields' are set by the query planner (see sdfields)
 
     datasets=sdrdataset.get_datasets(stream=args.stream,dry_run=args.dry_run)
 
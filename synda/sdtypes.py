@@ -151,6 +151,10 @@ class BaseType():
     def get_full_local_path(self,prefix=sdconfig.data_folder):
         return build_full_local_path(self.local_path,prefix)
 
+    def to_dict(self):
+        """Return instance attributes as a new dict."""
+        return dict(self.__dict__)
+
 class File(BaseType):
     def __init__(self,**kwargs):
         self.__dict__.update( kwargs )
@@ -171,7 +175,59 @@ class Dataset(BaseType):
         return re.sub('/[^/]+$','',self.get_full_local_path())
 
     def __str__(self):
-            return "".join(['%s=%s\n'%(k,v) for (k,v) in self.__dict__.iteritems()])
+            return "".join(['%s=%s\n'%(k,v) for (k,v) in self.to_dict().iteritems()])
+
+class RowProxy():
+    """Abstract.
+
+    This class is used to build File/Dataset instances directly from a
+    database row, without copying the row into the instance dict.
+
+    Notes
+        - the row (sqlite3.Row) is a compact tuple-like object, and columns
+          are only read when the corresponding attribute is accessed
+        - attributes set on the instance (e.g. 'status', 'dataset') are stored
+          in the instance dict and hide the row value
+        - use 'getattr' or 'to_dict()' to access attributes (the instance dict
+          only contains modified attributes)
+    """
+
+    def __getattr__(self,name):
+        # this method is only called when 'name' is not in the instance dict
+
+        if not name.startswith('__'): # speed-up special methods lookup for old-style class
+            row=self.__dict__.get('_row')
+            if row is not None:
+                try:
+                    return row[name]
+                except IndexError:
+                    pass
+
+        raise AttributeError(name)
+
+    def to_dict(self):
+        row=self._row
+        d=dict(zip(row.keys(),row))
+        for k,v in self.__dict__.iteritems():
+            if k!='_row':
+                d[k]=v
+        return d
+
+class FileRow(RowProxy,File):
+    """Compact File (used by DAO)."""
+
+    tablename='file'
+
+    def __init__(self,row):
+        self._row=row
+
+class DatasetRow(RowProxy,Dataset):
+    """Compact Dataset (used by DAO)."""
+
+    tablename='dataset'
+
+    def __init__(self,row):
+        self._row=row
 
 class SessionParam():
     def __init__(self,name,type_=str,default_value=None,search_api_facet=True,value=None,removable=True,option=True):
@@ -14,6 +14,8 @@
 import os
 import sdsearch
 import sdinstall
+import sdstream
+import sdwatermark
 import sdexception
 import sdlog
 from sdtools import print_stderr
@@ -56,10 +58,17 @@ def install(args,selection):
     # TODO: maybe force type=file here, in case the selection file have 'type=Dataset'
 
     if not args.dry_run:
+        discovery=sdwatermark.Discovery(selection.path,args.incremental)
+
+        stream=selection.merge_facets()
+        sdstream.set_scalar(stream,'action',args.subcommand) # needed to compute minimal search-API fields (see sdfields), same as in syndautils.get_stream()
+        if not discovery.is_full():
+            sdstream.set_scalar(stream,'from',discovery.left_boundary)
+
         sdlog.info("SDUPGRAD-001","Retrieve metadata from ESGF..")
-        metadata=sdsearch.run(selection=selection)
+        metadata=sdsearch.run(stream=stream)
         sdlog.info("SDUPGRAD-002","Install files..")
-        (status,newly_installed_files_count)=sdinstall.run(args,metadata)
+        (status,newly_installed_files_count)=sdinstall.run(args,metadata,discovery)
 
 def get_exclude(args):
     li=[]
@@ -66,9 +66,9 @@ def get_variables_files_count_by_status(dataset_id,variable=None):
     c = sddb.conn.cursor()
 
     if variable is None:
-        c.execute("select variable,status,count(*) from file where dataset_id=? group by variable,status",(dataset_id,))
+        c.execute("select v.value,f.status,count(*) from file_data f left join dictionary v on v.id=f.variable_id where f.dataset_id=? group by f.variable_id,f.status",(dataset_id,))
     else:
-        c.execute("select variable,status,count(*) from file where dataset_id=? and variable=? group by variable,status",(dataset_id,variable))
+        c.execute("select v.value,f.status,count(*) from file_data f join dictionary v on v.id=f.variable_id where f.dataset_id=? and v.value=? group by f.variable_id,f.status",(dataset_id,variable))
 
     """
     The query returns something like:
@@ -110,7 +110,7 @@ def get_variables_files_count(d):
 
 
     c = sddb.conn.cursor()
-    c.execute("select variable,count(*) from file where dataset_id=? group by variable",(d.dataset_id,))
+    c.execute("select v.value,count(*) from file_data f left join dictionary v on v.id=f.variable_id where f.dataset_id=? group by f.variable_id",(d.dataset_id,))
 
 
     """
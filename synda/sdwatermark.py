@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""This module contains incremental discovery routines.
+
+Overview
+    - after each discovery of a selection file, the latest search-API
+      '_timestamp' found (aka watermark) is stored in 'watermark' table
+    - in incremental mode, the next discovery only retrieves records with a
+      '_timestamp' later than the watermark (using 'from' search-API filter)
+    - a full discovery is done instead when the selection file has changed,
+      when no previous discovery exists, or when the latest full discovery is
+      older than 'behaviour.full_discovery_interval' days (so records
+      published with an older '_timestamp' are retrieved)
+    - after a full discovery, local files of the selection which have not
+      been returned (i.e. removed from the index, retracted, or no longer
+      matching the selection) are reported (see reconcile())
+
+Notes
+    - the watermark is only updated once the discovery result has been
+      processed (e.g. not when installation is aborted)
+    - the 'from' filter is set some hours before the watermark, as records are
+      not always available in the index as soon as their '_timestamp' is set
+      (e.g. replication delay between index nodes)
+    - '_timestamp' is in UTC time (i.e. no localtime conversion is needed)
+"""
+
+import os
+import datetime
+import argparse
+import sdapp
+import sdconfig
+import sdconst
+import sdlog
+import sdtime
+import sdutils
+import sdselectionfileutils
+import sdfilequery
+import sdwatermarkdao
+
+SEARCH_API_DATETIME_FORMAT='%Y-%m-%dT%H:%M:%SZ'
+WATERMARK_MARGIN=24 # hours
+
+class Discovery():
+    """Discovery of one selection file.
+
+    Attributes
+        left_boundary: 'from' filter value (None for full discovery)
+    """
+
+    def __init__(self,selection_file,incremental):
+        self.selection_file=selection_file
+        self.selection_filename=os.path.basename(selection_file)
+        self.selection_file_checksum=sdutils.compute_checksum(selection_file)
+        self.left_boundary=get_left_boundary(self.selection_filename,self.selection_file_checksum) if incremental else None
+
+    def is_full(self):
+        return self.left_boundary is None
+
+    def complete(self,metadata):
+        """Store watermark (must be called once discovery result has been processed)."""
+
+        latest_timestamp=get_latest_timestamp(metadata)
+
+        if self.is_full():
+            reconcile(self.selection_filename,metadata)
+
+            timestamp=latest_timestamp
+            full_discovery_date=sdtime.now()
+        else:
+            previous=sdwatermarkdao.get_watermark(self.selection_filename)
+            timestamp=max_timestamp(previous['timestamp'],latest_timestamp)
+            full_discovery_date=previous['full_discovery_date']
+
+        sdwatermarkdao.add_watermark(self.selection_filename,self.selection_file_checksum,timestamp,full_discovery_date)
+
+        sdlog.info("SDWATERM-001","Watermark stored (selection=%s,timestamp=%s,full=%s)"%(self.selection_filename,timestamp,self.is_full()))
+
+def get_discovery(selection_file,incremental):
+    """Return Discovery object (None if selection doesn't come from a file)."""
+
+    if selection_file is None or selection_file=='-':
+        return None
+
+    selection_file=sdselectionfileutils.find_selection_file(selection_file)
+
+    if not os.path.isfile(selection_file):
+        return None # error is reported by the search routine
+
+    return Discovery(selection_file,incremental)
+
+def get_left_boundary(selection_filename,selection_file_checksum):
+    """Return 'from' filter value (None if full discovery is needed)."""
+
+    watermark=sdwatermarkdao.get_watermark(selection_filename)
+
+    if watermark is None:
+        sdlog.info('SDWATERM-002','No previous discovery found (full discovery)')
+        return None
+
+    if watermark['selection_file_checksum']!=selection_file_checksum:
+        sdlog.info('SDWATERM-003',"Selection file has changed since last discovery (full discovery)")
+        return None
+
+    if watermark['timestamp'] is None:
+        sdlog.info('SDWATERM-004','Previous discovery found no file (full discovery)')
+        return None
+
+    if sdtime.compute_time_delta(watermark['full_discovery_date'],sdtime.now())>full_discovery_interval*24*3600:
+        sdlog.info('SDWATERM-005','Latest full discovery is older than %i day(s) (full discovery)'%full_discovery_interval)
+        return None
+
+    dt=datetime.datetime.strptime(watermark['timestamp'],SEARCH_API_DATETIME_FORMAT)-datetime.timedelta(hours=WATERMARK_MARGIN)
+    left_boundary=dt.strftime(SEARCH_API_DATETIME_FORMAT)
+
+    sdlog.info('SDWATERM-006','Incremental discovery (watermark=%s,from=%s)'%(watermark['timestamp'],left_boundary))
+
+    return left_boundary
+
+def reconcile(selection_filename,metadata):
+    """Report local files of the selection which have not been returned by the full discovery.
+
+    Returns
+        number of files not found
+
+    Note
+        those files are only reported (not removed), as the index may be
+        temporarily incomplete (e.g. index node partially replicated)
+    """
+    discovered=set()
+    for chunk in metadata.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+        for f in chunk:
+            discovered.add(f['file_functional_id'])
+
+    count=0
+    for (file_functional_id,status) in sdfilequery.get_selection_files(selection_filename):
+        if file_functional_id not in discovered:
+            sdlog.info("SDWATERM-007","File not found during full discovery (selection=%s,status=%s,file_functional_id=%s)"%(selection_filename,status,file_functional_id))
+            count+=1
+
+    if count>0:
+        sdlog.warning("SDWATERM-008","%i local file(s) of '%s' selection not found during full discovery (removed from the index, retracted or no longer matching the selection, see log file for the list)"%(count,selection_filename),stderr=True)
+
+    return count
+
+def get_latest_timestamp(metadata):
+    """Return the latest '_timestamp' (second precision), or None if no file has this attribute."""
+
+    latest_timestamp=None
+
+    for chunk in metadata.get_chunks(sdconst.PROCESSING_FETCH_MODE_GENERATOR):
+        for f in chunk:
+            if '_timestamp' in f:
+                latest_timestamp=max_timestamp(latest_timestamp,truncate_timestamp(f['_timestamp']))
+
+    return latest_timestamp
+
+def max_timestamp(t1,t2):
+    """Return the latest timestamp (None is ignored)."""
+
+    if t1 is None:
+        return t2
+    if t2 is None:
+        return t1
+
+    return max(t1,t2) # lexicographical order is chronological order with this format
+
+def truncate_timestamp(timestamp):
+    """Remove fractional seconds (e.g. '2016-05-11T12:00:00.123Z' => '2016-05-11T12:00:00Z')."""
+    return "%sZ"%timestamp[:19]
+
+# init.
+
+full_discovery_interval=sdconfig.config.getint('behaviour','full_discovery_interval')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d','--delete',help='Remove watermark (next discovery will be a full discovery)',metavar='SELECTION_FILENAME')
+    args = parser.parse_args()
+
+    if args.delete is not None:
+        sdwatermarkdao.delete_watermark(args.delete)
+    else:
+        for w in sdwatermarkdao.get_watermarks():
+            print "%s (timestamp=%s,full_discovery_date=%s)"%(w['selection_filename'],w['timestamp'],w['full_discovery_date'])
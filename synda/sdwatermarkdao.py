@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: ISO-8859-1 -*-
+
+##################################
+#  @program        synda
+#  @description    climate models data transfer program
+#  @copyright      Copyright “(c)2009 Centre National de la Recherche Scientifique CNRS. 
+#                             All Rights Reserved”
+#  @license        CeCILL (https://raw.githubusercontent.com/Prodiguer/synda/master/sdt/doc/LICENSE)
+##################################
+
+"""Contains watermark DAO SQL queries.
+
+Note
+    a watermark is the latest search-API '_timestamp' discovered for a
+    selection file (see sdwatermark)
+"""
+
+import argparse
+import sdapp
+import sddb
+
+def add_watermark(selection_filename,selection_file_checksum,timestamp,full_discovery_date,commit=True,conn=sddb.conn):
+    conn.execute("insert or replace into watermark (selection_filename,selection_file_checksum,timestamp,full_discovery_date) values (?,?,?,?)",(selection_filename,selection_file_checksum,timestamp,full_discovery_date))
+
+    if commit:
+        conn.commit()
+
+def get_watermark(selection_filename,conn=sddb.conn):
+    """Return watermark as a row (None if not found)."""
+    return conn.execute("select * from watermark where selection_filename=?",(selection_filename,)).fetchone()
+
+def get_watermarks(conn=sddb.conn):
+    return conn.execute("select * from watermark order by selection_filename").fetchall()
+
+def delete_watermark(selection_filename,commit=True,conn=sddb.conn):
+    conn.execute("delete from watermark where selection_filename=?",(selection_filename,))
+
+    if commit:
+        conn.commit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    args = parser.parse_args()
+
+    for w in get_watermarks():
+        print "selection_filename=%s,timestamp=%s,full_discovery_date=%s"%(w['selection_filename'],w['timestamp'],w['full_discovery_date'])
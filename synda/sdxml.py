@@ -41,219 +41,252 @@ def parse_parameters(buffer):
 
 def parse_metadata(buffer):
     """Parse result for both type (Dataset and File)."""
-    xmldoc=None
-    l__files=[] # can be real file or dataset, depending on "type" input facet
 
     if buffer is None:
         raise SDException("SYNDAXML-001","Buffer is empty")
 
-    try:
-        xmldoc = etree.fromstring(buffer) # in our case, xmldoc is the top level response element/tag
-    except Exception, e:
-        raise
+    info={}
+    l__files=list(parse_metadata_stream([buffer],info)) # can be real file or dataset, depending on "type" input facet
 
+    sdlog.debug("SYNDAXML-014","files-count=%d"%len(l__files))
 
-    # --- parse header and footer nodes (header name is "responseHeader" and footer name is "facet_counts") --- #
+    return {'files':l__files,'num_found':info['num_found'],'num_result':len(l__files)}
 
-    # retrieve header & footer (those nodes always exist)
-    header_node=xmldoc.xpath("./lst[@name='responseHeader']")[0]
-    footer_node=xmldoc.xpath("./lst[@name='facet_counts']")[0]
+def parse_metadata_stream(chunks,info):
+    """Parse result for both type (Dataset and File) as bytes arrive.
 
-    # parse footer
-    fields_node=xmldoc.xpath("./lst[@name='facet_counts']/lst[@name='facet_fields']")[0]
+    Args
+        chunks: response buffer pieces (iterable)
+        info: dict, which 'num_found' key is set during parsing
 
-    # --- parse body node --- #
+    Returns
+        files/datasets generator
 
-    body_node=xmldoc.xpath("./result")[0]
+    Note
+        each 'doc' node is discarded once parsed, so the whole document tree
+        is never held in memory
+    """
+    parser=etree.XMLPullParser(events=('start','end'))
+    state={'depth':0,'in_body':False}
 
-    # retrieve "numFound" attribute
-    l__num_found=int(body_node.attrib["numFound"]) # int/unicode conversion
+    for chunk in chunks:
+        parser.feed(chunk)
+        for l__dict in read_doc_events(parser,state,info):
+            yield l__dict
 
-    doc_nodes=xmldoc.xpath("./result/doc")
+    parser.close()
+    for l__dict in read_doc_events(parser,state,info):
+        yield l__dict
 
-    for doc_node in doc_nodes: # file/dataset loop
-        l__dict={}
+    if 'num_found' not in info:
+        raise SDException("SYNDAXML-002","Body node not found")
 
-        # process fields (list of 'str' and 'arr' tags)
-        for n in doc_node.getchildren():
-            l__name=n.attrib["name"]
+def read_doc_events(parser,state,info):
 
-            # top level type switch
-            if n.tag=="str":
+    # document structure: response / result (body) / doc (file or dataset)
 
-                """
-                top level str tags samples:
+    for event,node in parser.read_events():
+        if event=='start':
+            state['depth']+=1
 
-                <str name="title">tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc</str>
-                <str name="type">File</str>
-                <str name="index_node">pcmdi11.llnl.gov</str>
-                <str name="instance_id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930.tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc_0</str>
-                <str name="master_id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc_0</str>
-                <str name="metadata_format">THREDDS</str>
-                <str name="metadata_url">http://cmip-dn.badc.rl.ac.uk/thredds/catalog.xml</str>
+            if state['depth']==2 and node.tag=='result':
+                state['in_body']=True
 
-                when using "Dataset" type, functional dataset id is returned in "id" attribute, not in dataset_id attribute
-                (with "File" type, it's the contrary)
-                <str name="id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930.tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc_0|cmip-dn.badc.rl.ac.uk</str>
+                # retrieve "numFound" attribute
+                info['num_found']=int(node.attrib["numFound"]) # int/unicode conversion
+        else:
+            state['depth']-=1
 
-                <str name="version">1</str>
-                <str name="data_node">cmip-dn.badc.rl.ac.uk</str>
-                <str name="dataset_id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930|cmip-dn.badc.rl.ac.uk</str>
-                """
+            if state['depth']==1 and node.tag=='result':
+                state['in_body']=False
+            elif state['depth']==2 and state['in_body'] and node.tag=='doc':
+                yield parse_doc(node)
 
-                l__value=n.text
+                # free memory
+                node.clear()
+                while node.getprevious() is not None:
+                    del node.getparent()[0]
 
-                if l__name=="id":
-                    # note: used for file AND dataset
+def parse_doc(doc_node):
+    """Parse one file/dataset node."""
+    l__dict={}
 
-                    # sample for the file case:    cmip5.output1.MOHC.HadCM3.historical.mon.atmos.Amon.r1i1p1.v20110823.tas_Amon_HadCM3_historical_r1i1p1_188412-190911.nc_0|cmip-dn.badc.rl.ac.uk
-                    # sample for the dataset case: cmip5.output1.NCAR.CCSM4.abrupt4xCO2.fx.atmos.fx.r0i0p0.v20120413|pcmdi9.llnl.gov
-                    #
-                    l__dict[l__name]=l__value
+    # process fields (list of 'str' and 'arr' tags)
+    for n in doc_node.getchildren():
+        l__name=n.attrib["name"]
 
-                elif l__name=="dataset_id":
-                    # note: only used as input facet parameter (not as part of output "fields" member)
+        # top level type switch
+        if n.tag=="str":
 
-                    # sample: cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930|cmip-dn.badc.rl.ac.uk
-                    #
-                    l__dict[l__name]=l__value
+            """
+            top level str tags samples:
 
-                else:
+            <str name="title">tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc</str>
+            <str name="type">File</str>
+            <str name="index_node">pcmdi11.llnl.gov</str>
+            <str name="instance_id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930.tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc_0</str>
+            <str name="master_id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc_0</str>
+            <str name="metadata_format">THREDDS</str>
+            <str name="metadata_url">http://cmip-dn.badc.rl.ac.uk/thredds/catalog.xml</str>
 
-                    l__dict[l__name]=l__value
+            when using "Dataset" type, functional dataset id is returned in "id" attribute, not in dataset_id attribute
+            (with "File" type, it's the contrary)
+            <str name="id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930.tas_Amon_HadGEM2-ES_rcp60_r1i1p1_203612-206111.nc_0|cmip-dn.badc.rl.ac.uk</str>
 
-            elif n.tag=="date":
+            <str name="version">1</str>
+            <str name="data_node">cmip-dn.badc.rl.ac.uk</str>
+            <str name="dataset_id">cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930|cmip-dn.badc.rl.ac.uk</str>
+            """
 
-                """
-                top level date tag samples:
+            l__value=n.text
 
-                <date name="timestamp">2011-06-03T22:45:27Z</date>
-                """
+            if l__name=="id":
+                # note: used for file AND dataset
 
-                l__value=n.text
+                # sample for the file case:    cmip5.output1.MOHC.HadCM3.historical.mon.atmos.Amon.r1i1p1.v20110823.tas_Amon_HadCM3_historical_r1i1p1_188412-190911.nc_0|cmip-dn.badc.rl.ac.uk
+                # sample for the dataset case: cmip5.output1.NCAR.CCSM4.abrupt4xCO2.fx.atmos.fx.r0i0p0.v20120413|pcmdi9.llnl.gov
+                #
                 l__dict[l__name]=l__value
 
-            elif n.tag=="bool":
+            elif l__name=="dataset_id":
+                # note: only used as input facet parameter (not as part of output "fields" member)
 
-                """
-                samples:
+                # sample: cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1.v20110930|cmip-dn.badc.rl.ac.uk
+                #
+                l__dict[l__name]=l__value
 
-                <bool name="replica">false</bool>
-                <bool name="latest">true</bool>
-                """
+            else:
 
-                l__value=n.text
                 l__dict[l__name]=l__value
 
-            elif n.tag=="long":
-                """
-                top level long tag samples:
+        elif n.tag=="date":
 
-                <long name="size">33432404</long>
-                """
+            """
+            top level date tag samples:
 
-                l__value=n.text
-                l__dict[l__name]=l__value
+            <date name="timestamp">2011-06-03T22:45:27Z</date>
+            """
 
-            elif n.tag=="arr":
+            l__value=n.text
+            l__dict[l__name]=l__value
 
-                for arr_n in n.getchildren():
+        elif n.tag=="bool":
 
-                    # array child type switch
-                    if arr_n.tag=="str":
+            """
+            samples:
 
-                        """
-                        array / str tag samples:
-
-                        <arr name="checksum"> <str>ddbecc65df76b4b713b686974fe7153a</str> </arr>
-                        <arr name="checksum_type"> <str>MD5</str> </arr>
-                        <arr name="cmor_table"> <str>Amon</str> </arr>
-                        <arr name="dataset_id_template_"> <str>cmip5.%(product)s.%(institute)s.%(model)s.%(experiment)s.%(time_frequency)s.%(realm)s.%(cmor_table)s.%(ensemble)s</str> </arr>
-                        <arr name="description"> <str>HadGEM2-ES model output prepared for CMIP5 RCP6</str> </arr>
-                        <arr name="drs_id"> <str>cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1</str> </arr>
-                        <arr name="ensemble"> <str>r1i1p1</str> </arr>
-                        <arr name="experiment"> <str>rcp60</str> </arr>
-                        <arr name="cf_standard_name"> <str>air_temperature</str> </arr>
-                        <arr name="forcing"> <str>GHG, Oz, SA, LU, Sl, Vl, BC, OC, (GHG = CO2, N2O, CH4, CFCs)</str> </arr>
-                        <arr name="format"> <str>netCDF, CF-1.4</str> </arr>
-                        <arr name="institute"> <str>MOHC</str> </arr>
-                        <arr name="model"> <str>HadGEM2-ES</str> </arr>
-                        <arr name="product"> <str>output1</str> </arr>
-                        <arr name="project"> <str>CMIP5</str> </arr>
-                        <arr name="realm"> <str>atmos</str> </arr>
-                        <arr name="tracking_id"> <str>900265d1-f002-4ad8-8be0-04149277c3e7</str> </arr>
-                        <arr name="time_frequency"> <str>mon</str> </arr>
-                        <arr name="variable"> <str>tas</str> </arr>
-                        <arr name="variable_long_name"> <str>Near-Surface Air Temperature</str> </arr>
-                        """
+            <bool name="replica">false</bool>
+            <bool name="latest">true</bool>
+            """
 
-                        l__value=arr_n.text
-
-                        # TODO: maybe move transformation below in a downstream
-                        #       step (e.g. in the generic pipeline) so to keep
-                        #       original xml stream not altered when using dump
-                        #       action in raw mode.
-
-                        # WARNING
-                        #
-                        # this switch is a bit tricky.
-                        #
-                        # we pass here for all subitems of all arrays.
-                        # 'l__name' keep the same value for all the subitems of one array.
-                        # 
-                        #
-                        if l__name=="url":
-                            # url array have three subitems (GRIDFTP, HTTPServer and openDAP), so we pass here three times
-                            # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
-
-                            url=l__value.split('|')[0] # keep only first field (i.e. keep only the file url)
-                            protocol=l__value.split('|')[-1]
-
-                            if protocol.upper()=="HTTPSERVER":
-                                l__dict['url_http']=url
-                            elif protocol.upper()=="GRIDFTP":
-                                l__dict['url_gridftp']=url
-                            elif protocol.upper()=="OPENDAP":
-                                l__dict['url_opendap']=url
-
-                        elif l__name=="experiment_family":
-                            # not used
-
-                            """
-                            sample
-                            <arr name="experiment_family">
-                              <str>All</str>
-                              <str>RCP</str>
-                            </arr>
-                            """
-
-                            pass
+            l__value=n.text
+            l__dict[l__name]=l__value
 
+        elif n.tag=="long":
+            """
+            top level long tag samples:
 
-                        else:
-                            # we now use 'list' type here (needed for dataset type (e.g. variable))
+            <long name="size">33432404</long>
+            """
 
-                            if l__name not in l__dict:
-                                l__dict[l__name]=[l__value]
-                            else:
-                                l__dict[l__name].append(l__value)
+            l__value=n.text
+            l__dict[l__name]=l__value
 
-                    elif arr_n.tag=="float":
-                        # type not used for now
+        elif n.tag=="arr":
 
-                        """
-                        sample:
+            for arr_n in n.getchildren():
+
+                # array child type switch
+                if arr_n.tag=="str":
+
+                    """
+                    array / str tag samples:
+
+                    <arr name="checksum"> <str>ddbecc65df76b4b713b686974fe7153a</str> </arr>
+                    <arr name="checksum_type"> <str>MD5</str> </arr>
+                    <arr name="cmor_table"> <str>Amon</str> </arr>
+                    <arr name="dataset_id_template_"> <str>cmip5.%(product)s.%(institute)s.%(model)s.%(experiment)s.%(time_frequency)s.%(realm)s.%(cmor_table)s.%(ensemble)s</str> </arr>
+                    <arr name="description"> <str>HadGEM2-ES model output prepared for CMIP5 RCP6</str> </arr>
+                    <arr name="drs_id"> <str>cmip5.output1.MOHC.HadGEM2-ES.rcp60.mon.atmos.Amon.r1i1p1</str> </arr>
+                    <arr name="ensemble"> <str>r1i1p1</str> </arr>
+                    <arr name="experiment"> <str>rcp60</str> </arr>
+                    <arr name="cf_standard_name"> <str>air_temperature</str> </arr>
+                    <arr name="forcing"> <str>GHG, Oz, SA, LU, Sl, Vl, BC, OC, (GHG = CO2, N2O, CH4, CFCs)</str> </arr>
+                    <arr name="format"> <str>netCDF, CF-1.4</str> </arr>
+                    <arr name="institute"> <str>MOHC</str> </arr>
+                    <arr name="model"> <str>HadGEM2-ES</str> </arr>
+                    <arr name="product"> <str>output1</str> </arr>
+                    <arr name="project"> <str>CMIP5</str> </arr>
+                    <arr name="realm"> <str>atmos</str> </arr>
+                    <arr name="tracking_id"> <str>900265d1-f002-4ad8-8be0-04149277c3e7</str> </arr>
+                    <arr name="time_frequency"> <str>mon</str> </arr>
+                    <arr name="variable"> <str>tas</str> </arr>
+                    <arr name="variable_long_name"> <str>Near-Surface Air Temperature</str> </arr>
+                    """
+
+                    l__value=arr_n.text
+
+                    # TODO: maybe move transformation below in a downstream
+                    #       step (e.g. in the generic pipeline) so to keep
+                    #       original xml stream not altered when using dump
+                    #       action in raw mode.
+
+                    # WARNING
+                    #
+                    # this switch is a bit tricky.
+                    #
+                    # we pass here for all subitems of all arrays.
+                    # 'l__name' keep the same value for all the subitems of one array.
+                    # 
+                    #
+                    if l__name=="url":
+                        # url array have three subitems (GRIDFTP, HTTPServer and openDAP), so we pass here three times
+                        # url array entry sample => http://bmbf-ipcc-ar5.dkrz.de/thredds/fileServer/cmip5/output1/MPI-M/MPI-ESM-P/historical/mon/atmos/Amon/r1i1p1/v20120315/tasmin/tasmin_Amon_MPI-ESM-P_historical_r1i1p1_185001-200512.nc|application/netcdf|HTTPServer
+
+                        url=l__value.split('|')[0] # keep only first field (i.e. keep only the file url)
+                        protocol=l__value.split('|')[-1]
+
+                        if protocol.upper()=="HTTPSERVER":
+                            l__dict['url_http']=url
+                        elif protocol.upper()=="GRIDFTP":
+                            l__dict['url_gridftp']=url
+                        elif protocol.upper()=="OPENDAP":
+                            l__dict['url_opendap']=url
+
+                    elif l__name=="experiment_family":
+                        # not used
 
-                        <arr name="score"><float name="score">1.9600565</float></arr>
+                        """
+                        sample
+                        <arr name="experiment_family">
+                          <str>All</str>
+                          <str>RCP</str>
+                        </arr>
                         """
 
                         pass
 
-        l__files.append(l__dict)
 
-    sdlog.debug("SYNDAXML-014","files-count=%d"%len(l__files))
+                    else:
+                        # we now use 'list' type here (needed for dataset type (e.g. variable))
+
+                        if l__name not in l__dict:
+                            l__dict[l__name]=[l__value]
+                        else:
+                            l__dict[l__name].append(l__value)
+
+                elif arr_n.tag=="float":
+                    # type not used for now
+
+                    """
+                    sample:
+
+                    <arr name="score"><float name="score">1.9600565</float></arr>
+                    """
+
+                    pass
 
-    return {'files':l__files,'num_found':l__num_found,'num_result':len(l__files)}
+    return l__dict
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -65,15 +65,18 @@ def get_stream(subcommand=None,parameter=None,selection_file=None,no_default=Tru
 
     return stream # aka facets_groups
 
-def file_full_search(args,stream=None):
+def file_full_search(args,stream=None,discovery=None):
     """This func systematically triggers full search (i.e. limit keyword cannot be used here).
 
     This func is currently being used in the following modules:
         - sdinstall
         - sdremove
         - sdstat
+
+    Args
+        discovery: sdwatermark.Discovery object (used in incremental mode)
     """
-    import sdsearch,sdlog,sdhistory,sdstream,sdtime,sdselectionfileutils
+    import sdsearch,sdlog,sdstream,sdwatermark,sdselectionfileutils
 
     if stream is None:
         stream=get_stream(subcommand=args.subcommand,parameter=args.parameter,selection_file=args.selection_file,no_default=args.no_default,raise_exception_if_empty=True)
@@ -100,49 +103,23 @@ def file_full_search(args,stream=None):
 
             sdlog.info('SYNUTILS-002','Starting file discovery (incremental mode enabled)')
 
-            selection_file=sdselectionfileutils.find_selection_file(args.selection_file)
-
-            selection_filename=os.path.basename(selection_file)
-
-            if sdhistory.previous_run_exists(selection_filename,'add'):
-                sdlog.info('SYNUTILS-004','Previous run exists')
-
-                if not sdhistory.file_changed_since_last_run(selection_file,sdconst.ACTION_ADD):
-                    sdlog.info('SYNUTILS-006',"Selection file hasn't changed since last run")
-
-                    previous_run=sdhistory.get_previous_run(selection_filename,'add')
-                    dt=previous_run['crea_date']
-
-
-                    # to prevent UTC vs localtime time issue
-                    # (history.crea_date is in localtime while search-api timestamp is in UTC time)
-                    # we systematically substract 72 hours to the left boundary
-                    #
-                    dt=sdtime.substract_hour(dt,72)
-
-
-                    # convert datetime format
-                    search_api_datetime=sdtime.sqlite_datetime_format_to_search_api_datetime_format(dt)
-
-
-                    # add incremental mode filters
-                    #
-                    # sample
-                    #     from='2015-10-19T22:00:00Z'
-                    #
-                    # note
-                    #     'from' and 'to' filters refer to 'timestamp' attribute
-                    #
-                    # more info
-                    #     https://github.com/ESGF/esgf.github.io/wiki/ESGF_Search_REST_API
-                    #
-                    sdstream.set_scalar(stream,'from',search_api_datetime)
-
-                else:
-                    sdlog.info('SYNUTILS-007',"Selection file has changed since last run")
-
-            else:
-                sdlog.info('SYNUTILS-008','No previous run found')
+            if discovery is None:
+                discovery=sdwatermark.Discovery(sdselectionfileutils.find_selection_file(args.selection_file),True)
+
+            if not discovery.is_full():
+
+                # add incremental mode filters
+                #
+                # sample
+                #     from='2015-10-19T22:00:00Z'
+                #
+                # note
+                #     'from' and 'to' filters refer to 'timestamp' attribute
+                #
+                # more info
+                #     https://github.com/ESGF/esgf.github.io/wiki/ESGF_Search_REST_API
+                #
+                sdstream.set_scalar(stream,'from',discovery.left_boundary)
 
 
 